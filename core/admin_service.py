@@ -2,9 +2,19 @@
 Admin Service - User management and analytics
 Built with Kiro - comprehensive admin operations
 """
-from typing import List, Dict, Optional
+import bisect
+import time
+from collections import Counter
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
+from core.auth import token_cache
+from core.config import INDEX_TYPE, USER_LIST_CACHE_SECONDS
+from core.embedding_cache import embedding_cache
+from core.query_cache import query_cache
+from core.rate_limiter import rate_limiter
+from storage.metadata_store import decode_cursor, encode_cursor, micros_to_timestamp
+
 
 class AdminService:
     """
@@ -14,6 +24,8 @@ class AdminService:
     def __init__(self, chat_service):
         self.chat_service = chat_service
         self.store = chat_service.store
+        # sort_by -> (metadata, version, built at, sort keys, stats)
+        self._user_orders: Dict[str, tuple] = {}
     
     def get_dashboard_stats(self) -> dict:
         """
@@ -24,50 +36,105 @@ class AdminService:
         """
         stats = self.store.get_stats()
         
-        # Calculate additional metrics
-        users = self._get_all_users()
-        total_users = len(users)
-        
         return {
             "system": {
-                "total_users": total_users,
+                "total_users": stats["total_users"],
                 "total_memories": stats["total_memories"],
                 "total_vectors": stats["total_vectors"],
                 "storage_type": stats.get("storage_type", "Local"),
+                "snapshot_generation": stats.get("snapshot_generation"),
                 "health_score": 100 if stats["total_vectors"] == stats["total_memories"] else 90
             },
             "usage": {
-                "api_calls_today": 0,  # Would query from usage_tracking
-                "memories_stored_today": 0,
-                "active_users_today": 0
+                **rate_limiter.calls_today(),
+                "memories_stored_today": stats["memories_stored_today"],
+                "active_users_today": stats["active_users_today"]
             },
+            "embedding_cache": embedding_cache.stats(),
+            "query_cache": query_cache.stats(),
+            "jwt_cache": token_cache.stats(),
             "timestamp": datetime.now().isoformat()
         }
     
-    def get_users_list(self, sort_by: str = "memories", limit: Optional[int] = None) -> List[dict]:
+    def get_users_page(self, sort_by: str = "memories", limit: int = 100,
+                       cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
         """
-        Get list of all users with their stats
+        Get one page of users with their stats
+        
+        Pages are sliced from a sorted snapshot of every user's stats, so a
+        page costs O(log users + limit) once the snapshot is built.
         
         Args:
-            sort_by: Sort by 'memories', 'last_active', or 'tier'
-            limit: Maximum number of users to return
+            sort_by: Sort by 'memories' or 'last_active'; anything else sorts by user ID
+            limit: Page size
+            cursor: next_cursor from the previous page
             
         Returns:
-            List of users with stats
+            Tuple of (users with stats, cursor for the next page - None on the last)
+            
+        Raises:
+            ValueError: If the cursor is malformed
         """
-        users = self._get_all_users()
+        keys, ordered = self._sorted_users(sort_by)
+        start = 0
+        if cursor:
+            try:
+                start = bisect.bisect_right(keys, tuple(decode_cursor(cursor)))
+            except TypeError:
+                raise ValueError("Invalid cursor")
+        
+        end = start + limit
+        next_cursor = encode_cursor(keys[end - 1]) if end < len(ordered) else None
+        return [self._user_row(stats) for stats in ordered[start:end]], next_cursor
+    
+    def iter_users(self, sort_by: str = "memories") -> Iterator[dict]:
+        """Yield every user in sort order from one sorted snapshot"""
+        _, ordered = self._sorted_users(sort_by)
+        for stats in ordered:
+            yield self._user_row(stats)
+    
+    def _sorted_users(self, sort_by: str) -> Tuple[List[tuple], List[Tuple[str, int, int]]]:
+        """
+        Every user's stats in sort order, with their sort keys
         
-        # Sort users
+        The snapshot is sorted once and reused until memories change, and
+        for up to USER_LIST_CACHE_SECONDS while they do, so paging through
+        a busy store does not re-sort every user per page.
+        """
+        if sort_by not in ("memories", "last_active"):
+            sort_by = "user_id"
+        metadata = self.store.metadata
+        cached = self._user_orders.get(sort_by)
+        if cached is not None and cached[0] is metadata and (
+                cached[1] == metadata.version or time.monotonic() - cached[2] < USER_LIST_CACHE_SECONDS):
+            return cached[3], cached[4]
+        
+        # Read the version first, so a change during the walk forces a re-sort
+        version = metadata.version
+        sort_key = self._user_sort_key(sort_by)
+        ordered = sorted(metadata.iter_user_stats(), key=sort_key)
+        keys = [sort_key(stats) for stats in ordered]
+        self._user_orders[sort_by] = (metadata, version, time.monotonic(), keys, ordered)
+        return keys, ordered
+    
+    @staticmethod
+    def _user_row(stats: Tuple[str, int, int]) -> dict:
+        user_id, count, last_active = stats
+        return {
+            "user_id": user_id,
+            "memory_count": count,
+            "last_active": micros_to_timestamp(last_active),
+            "tier": "free"  # Would query from Supabase
+        }
+    
+    @staticmethod
+    def _user_sort_key(sort_by: str):
+        """Total-order key over (user_id, count, last_active) stats"""
         if sort_by == "memories":
-            users.sort(key=lambda x: x["memory_count"], reverse=True)
-        elif sort_by == "last_active":
-            users.sort(key=lambda x: x.get("last_active", ""), reverse=True)
-        
-        # Apply limit
-        if limit:
-            users = users[:limit]
-        
-        return users
+            return lambda stats: (-stats[1], stats[0])
+        if sort_by == "last_active":
+            return lambda stats: (-stats[2], stats[0])
+        return lambda stats: (stats[0],)
     
     def get_user_details(self, user_id: str) -> Optional[dict]:
         """
@@ -79,21 +146,21 @@ class AdminService:
         Returns:
             User details with memories and stats
         """
-        memories = self.store.get_user_memories(user_id)
+        total_memories = self.store.count_user_memories(user_id)
         
-        if not memories:
+        if not total_memories:
             return None
         
-        # Calculate stats
-        total_memories = len(memories)
-        recent_memories = sorted(memories, key=lambda x: x.get("timestamp", ""), reverse=True)[:10]
+        # Only the memories shown are loaded, via the per-user timestamp index
+        recent_memories = self.store.get_recent_memories(user_id, limit=10)
+        oldest = self.store.get_recent_memories(user_id, limit=1, oldest_first=True)
         
         return {
             "user_id": user_id,
             "memory_count": total_memories,
             "recent_memories": recent_memories,
-            "first_memory": memories[0].get("timestamp") if memories else None,
-            "last_memory": memories[-1].get("timestamp") if memories else None
+            "first_memory": oldest[0].get("timestamp") if oldest else None,
+            "last_memory": recent_memories[0].get("timestamp") if recent_memories else None
         }
     
     def clear_user_data(self, user_id: str) -> dict:
@@ -117,6 +184,29 @@ class AdminService:
             "timestamp": datetime.now().isoformat()
         }
     
+    def rebuild_index(self, index_factory: str = INDEX_TYPE, reembed_missing: bool = False) -> dict:
+        """
+        Rebuild the vector index from stored embeddings
+        
+        Args:
+            index_factory: FAISS index_factory description, or "auto"
+            reembed_missing: Batch re-embed memories with no stored vector
+            
+        Returns:
+            Result with vector and memory counts
+        """
+        vectors = self.store.rebuild_index(index_factory, reembed_missing=reembed_missing)
+        stats = self.store.get_stats()
+        
+        return {
+            "success": True,
+            "index_factory": index_factory,
+            "partition_types": dict(Counter(self.store.index.partition_factories.values())),
+            "total_vectors": vectors,
+            "total_memories": stats["total_memories"],
+            "timestamp": datetime.now().isoformat()
+        }
+    
     def get_system_health(self) -> dict:
         """
         Get detailed system health metrics
@@ -161,27 +251,3 @@ class AdminService:
             "metrics": stats,
             "timestamp": datetime.now().isoformat()
         }
-    
-    def _get_all_users(self) -> List[dict]:
-        """Get all users from memory store"""
-        user_memories = {}
-        
-        # Group memories by user
-        for memory in self.store.memory_store:
-            user_id = memory.get("user_id")
-            if user_id:
-                if user_id not in user_memories:
-                    user_memories[user_id] = []
-                user_memories[user_id].append(memory)
-        
-        # Create user list
-        users = []
-        for user_id, memories in user_memories.items():
-            users.append({
-                "user_id": user_id,
-                "memory_count": len(memories),
-                "last_active": memories[-1].get("timestamp") if memories else None,
-                "tier": "free"  # Would query from Supabase
-            })
-        
-        return users
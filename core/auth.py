@@ -2,22 +2,129 @@
 Supabase JWT Authentication
 Built with Kiro - secure authentication middleware
 """
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
-from fastapi import HTTPException, Depends, Header
-from typing import Optional
-from core.config import SUPABASE_JWT_SECRET, SUPABASE_JWT_ISSUER, SUPABASE_JWT_AUDIENCE
+from fastapi import HTTPException, Depends, Header, Request
+from typing import Optional, Tuple
+from core.config import (
+    SUPABASE_JWT_SECRET, SUPABASE_JWT_ISSUER, SUPABASE_JWT_AUDIENCE,
+    JWT_CACHE_MAX_ENTRIES, JWT_CACHE_MAX_TTL_SECONDS
+)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified JWT claims keyed by token hash
+    
+    Entries expire at the token's exp (capped at max_ttl seconds), so a
+    cached token is never honoured past the point jwt.decode would reject
+    it. Only successfully verified tokens are stored.
+    """
+    
+    def __init__(self, max_entries: int, max_ttl: float):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def get(self, token: str) -> Optional[dict]:
+        """Return cached claims for a token that has not yet expired"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, token: str, claims: dict):
+        """Cache verified claims until the token's exp"""
+        expires_at = time.time() + self.max_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(claims), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, token: str):
+        """Drop a single token (e.g. on logout)"""
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+    
+    def clear(self):
+        """Drop every cached token (e.g. after a secret rotation)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+# Global verified-token cache
+token_cache = VerifiedTokenCache(JWT_CACHE_MAX_ENTRIES, JWT_CACHE_MAX_TTL_SECONDS)
 
 
-def verify_supabase_token(authorization: Optional[str] = Header(None)) -> dict:
+def verify_supabase_token(request: Request, authorization: Optional[str] = Header(None)) -> dict:
     """
     FastAPI dependency to verify Supabase JWT token
     
+    Reuses the claims the rate-limit middleware already verified for this
+    request, if any.
+    
     Args:
+        request: Current request
         authorization: Authorization header value (Bearer <token>)
         
     Returns:
         Decoded JWT payload with user information
         
+    Raises:
+        HTTPException(401): If token is missing, invalid, or expired
+    """
+    token_payload = getattr(request.state, "token_payload", None)
+    if token_payload is not None:
+        return token_payload
+    
+    return verify_bearer_token(authorization)
+
+
+def verify_bearer_token(authorization: Optional[str]) -> dict:
+    """
+    Verify a "Bearer <token>" Authorization header value
+    
+    Args:
+        authorization: Authorization header value
+        
+    Returns:
+        Decoded JWT payload with user information
+        
     Raises:
         HTTPException(401): If token is missing, invalid, or expired
     """
@@ -41,6 +148,11 @@ def verify_supabase_token(authorization: Optional[str] = Header(None)) -> dict:
             detail="JWT secret not configured"
         )
     
+    # Hot path: a token verified earlier and not yet expired
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    
     try:
         # Verify and decode token
         decoded = jwt.decode(
@@ -51,6 +163,7 @@ def verify_supabase_token(authorization: Optional[str] = Header(None)) -> dict:
             audience=SUPABASE_JWT_AUDIENCE
         )
         
+        token_cache.put(token, decoded)
         return decoded
         
     except jwt.ExpiredSignatureError:
@@ -0,0 +1,226 @@
+"""
+Bulk Import - NDJSON conversation history into the memory store
+Built with Kiro - onboard 100k past chats in minutes, not days
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import IMPORT_BATCH_SIZE
+from core.llm import get_embeddings_async
+from storage.memory_store import MemoryStore
+
+
+async def ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream (e.g. a request body) into lines as it arrives"""
+    buffer = bytearray()
+    async for chunk in chunks:
+        # The buffer only ever holds a partial line, so just the new chunk
+        # needs scanning - a long line arriving in many chunks stays linear
+        start = len(buffer)
+        buffer += chunk
+        end = buffer.rfind(b"\n", start)
+        if end < 0:
+            continue
+        for line in bytes(buffer[:end]).split(b"\n"):
+            yield line.decode('utf-8')
+        del buffer[:end + 1]
+    if buffer:
+        yield buffer.decode('utf-8')
+
+
+async def file_lines(path: str) -> AsyncIterator[str]:
+    """Lines of an NDJSON file, read lazily"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line
+
+
+class BulkImporter:
+    """
+    Streams NDJSON conversations into a MemoryStore in large batches
+
+    Each line is one conversation turn:
+        {"user_id": "...", "user_message": "...", "llm_response": "...",
+         "provider": "openai", "timestamp": "2025-01-31T09:15:00"}
+    ("prompt" / "response" are accepted for the message fields, and
+    user_id may come from the importer's default.)
+
+    Lines are parsed as they arrive. Each batch gets one multi-input
+    embedding call - the next batch is embedded while the current one is
+    indexed - one index add per user and one WAL fsync, after which the
+    checkpoint records how many input lines are durable. A rerun with the
+    same checkpoint skips those lines. One snapshot is written at the end.
+    """
+
+    def __init__(self, store: MemoryStore, batch_size: int = IMPORT_BATCH_SIZE,
+                 default_user_id: Optional[str] = None):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.default_user_id = default_user_id
+
+    def parse(self, line: str) -> List[Dict]:
+        """
+        Build the segment entries of one NDJSON line
+
+        Raises:
+            ValueError: If the line is not a valid conversation record
+        """
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("record must be a JSON object")
+
+        user_id = record.get("user_id") or self.default_user_id
+        user_message = record.get("user_message", record.get("prompt"))
+        llm_response = record.get("llm_response", record.get("response"))
+        if not user_id or not user_message or not llm_response:
+            raise ValueError("user_id, user_message and llm_response are required")
+
+        entries = MemoryStore.conversation_entries(
+            user_id, user_message, llm_response,
+            record.get("priority", "high"),
+            record.get("provider", "import")
+        )
+        if record.get("timestamp"):
+            # Keep the original time so timelines and "today" counters stay true
+            timestamp = datetime.fromisoformat(record["timestamp"]).isoformat()
+            for entry in entries:
+                entry["timestamp"] = timestamp
+        return entries
+
+    @staticmethod
+    def read_checkpoint(path: Optional[str]) -> Dict:
+        """Progress recorded by an earlier run: lines, imported and failed"""
+        progress = {"lines": 0, "imported": 0, "failed": 0}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            progress.update({key: int(saved.get(key, 0)) for key in progress})
+        return progress
+
+    @staticmethod
+    def write_checkpoint(path: Optional[str], lines: int, imported: int, failed: int):
+        """Atomically record progress"""
+        if not path:
+            return
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"lines": lines, "imported": imported, "failed": failed,
+                       "updated": datetime.now().isoformat()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    async def _batches(self, lines: AsyncIterable[str], skip: int,
+                       stats: Dict) -> AsyncIterator[Tuple[List[Dict], int, int]]:
+        """Yield (entries, input lines consumed so far, invalid lines) per batch"""
+        entries: List[Dict] = []
+        invalid = 0
+        line_no = 0
+        async for line in lines:
+            line_no += 1
+            if line_no <= skip:
+                stats["skipped"] += 1
+                continue
+            if not line.strip():
+                continue
+            try:
+                # A turn's segments stay in one batch so they get consecutive IDs
+                entries.extend(self.parse(line))
+            except (ValueError, TypeError) as e:
+                invalid += 1
+                if stats["failed"] + invalid <= 10:
+                    print(f"⚠️ Import line {line_no}: {e}")
+                continue
+
+            if len(entries) >= self.batch_size:
+                yield entries, line_no, invalid
+                entries, invalid = [], 0
+
+        yield entries, line_no, invalid
+
+    async def _embed(self, entries: List[Dict]) -> np.ndarray:
+        if not entries:
+            return np.empty((0, 0), dtype='float32')
+        vectors = await get_embeddings_async([entry["chunk_text"] for entry in entries])
+        return np.array(vectors, dtype='float32')
+
+    def _commit(self, entries: List[Dict], vectors: np.ndarray):
+        """Index a batch and make it durable"""
+        if entries:
+            self.store.add_memories(entries, vectors)
+        self.store.sync()
+
+    async def run(self, lines: AsyncIterable[str], checkpoint_path: Optional[str] = None) -> Dict:
+        """
+        Import every conversation from an NDJSON line stream
+
+        Args:
+            lines: NDJSON lines, e.g. from file_lines or ndjson_lines
+            checkpoint_path: Progress file; lines it records are skipped
+
+        Returns:
+            Summary for this run: imported / failed / skipped counts, lines
+            read, elapsed seconds and memories per second
+        """
+        resumed = self.read_checkpoint(checkpoint_path)
+        if resumed["lines"]:
+            print(f"⏩ Resuming import after line {resumed['lines']}")
+
+        stats = {"imported": 0, "failed": 0, "skipped": 0, "lines": resumed["lines"]}
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        error = None
+
+        # Batch N is indexed and synced while batch N+1 is being embedded
+        batches: List[Tuple[List[Dict], int, int, asyncio.Task]] = []
+        try:
+            async for entries, line_no, invalid in self._batches(lines, resumed["lines"], stats):
+                batches.append((entries, line_no, invalid, asyncio.create_task(self._embed(entries))))
+                if len(batches) > 1:
+                    await self._finish(batches.pop(0), stats, resumed, checkpoint_path, started, loop)
+            while batches:
+                await self._finish(batches.pop(0), stats, resumed, checkpoint_path, started, loop)
+        except Exception as e:
+            error = str(e)
+            print(f"❌ Import stopped after line {stats['lines']}: {e}")
+            for *_, embedding in batches:
+                embedding.cancel()
+
+        # Fold the imported batches into one snapshot
+        await loop.run_in_executor(None, self.store.snapshot)
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            **stats,
+            "completed": error is None,
+            "seconds": round(elapsed, 2),
+            "per_second": round(stats["imported"] / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        if error:
+            summary["error"] = error
+        print(f"{'✅' if error is None else '⚠️'} Import finished: {stats['imported']} imported, {stats['failed']} failed, "
+              f"{stats['skipped']} skipped in {summary['seconds']}s ({summary['per_second']}/s)")
+        return summary
+
+    async def _finish(self, batch: Tuple[List[Dict], int, int, asyncio.Task], stats: Dict, resumed: Dict,
+                      checkpoint_path: Optional[str], started: float, loop):
+        """Commit an embedded batch, then advance the checkpoint"""
+        entries, line_no, invalid, embedding = batch
+        vectors = await embedding
+        await loop.run_in_executor(None, self._commit, entries, vectors)
+
+        stats["imported"] += len(entries)
+        stats["failed"] += invalid
+        stats["lines"] = line_no
+        self.write_checkpoint(checkpoint_path, line_no, resumed["imported"] + stats["imported"],
+                              resumed["failed"] + stats["failed"])
+
+        elapsed = time.perf_counter() - started
+        print(f"📥 Imported {stats['imported']} memories ({stats['imported'] / elapsed:.0f}/s, "
+              f"{stats['failed']} failed)")
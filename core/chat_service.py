@@ -2,22 +2,47 @@
 Chat Service - Main orchestration layer
 Built with Kiro - handles memory-enhanced conversations
 """
+import asyncio
+import time
 from datetime import datetime
-from typing import List, Dict
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 
 from storage.memory_store import MemoryStore
-from core.llm import ask_llm
+from storage.replica_store import ReplicaMemoryStore
+from core.config import SERVING_ROLE
+from core.llm import ask_llm_async, stream_llm_async
+from core.timing import format_timings, timed_stage
+
+
+CHAT_SYSTEM_PROMPT = """You are a helpful AI assistant.
+
+Answer the user's question naturally and conversationally.
+
+If the question includes memories/context at the beginning, use that information to give a personalized answer, but don't mention that you're using memories."""
 
 
 class ChatService:
     """
     Orchestrates the RAG pipeline with memory enhancement
+    
+    The request-path methods are coroutines: OpenAI calls use the async
+    client and FAISS searches run on the store's search thread pool.
+    
+    A chat turn is a staged pipeline. Only embed -> search -> generate is
+    awaited by the caller; persisting the turn (embedding the response and
+    the durable write) runs as a background stage that overlaps the next
+    request, and usage accounting happens in the rate-limit middleware
+    after the response is sent. Stage timings are logged and returned.
+    
+    Reader workers (SERVING_ROLE=reader) serve the writer's published
+    snapshots and forward the persist stage to the writer.
     """
     
     def __init__(self):
-        self.store = MemoryStore()
+        self.store = ReplicaMemoryStore() if SERVING_ROLE == "reader" else MemoryStore()
+        self._background_tasks = set()
     
-    def chat(self, user_id: str, message: str, llm_provider: str = "openai", top_k: int = 20) -> dict:
+    async def chat(self, user_id: str, message: str, llm_provider: str = "openai", top_k: int = 20) -> dict:
         """Main chat function with memory enhancement"""
         
         print(f"\n{'='*60}")
@@ -25,121 +50,173 @@ class ChatService:
         print(f"📝 Message: {message}")
         print(f"{'='*60}\n")
         
-        # Retrieve relevant contexts
-        print(f"🔍 Retrieving contexts (top_k={top_k})...")
-        contexts = self.store.retrieve(user_id, message, top_k)
-        print(f"✅ Retrieved {len(contexts)} contexts")
-        
-        # Enhance prompt with memory
-        enhanced_prompt = message
-        has_memory = len(contexts) > 0
-        
-        if has_memory:
-            memory_context = "\n\n".join([f"- {ctx}" for ctx in contexts[:3]])
-            enhanced_prompt = f"Relevant memories:\n{memory_context}\n\nUser question: {message}"
-            print(f"✅ Enhanced with {len(contexts)} memories")
-        else:
-            print("ℹ️  No relevant memory found")
-        
-        # Generate response
-        print(f"🤖 Generating response with {llm_provider}...")
-        response = self._generate_response(
-            message=enhanced_prompt,
-            contexts=contexts,
-            provider=llm_provider
-        )
-        
-        print(f"✅ Response generated: {response[:100]}...")
+        timings: Dict[str, float] = {}
+        with timed_stage(timings, "total"):
+            # Stages 1-2: embed the query and search (cached queries skip both)
+            results, enhanced_prompt = await self._prepare_prompt(user_id, message, top_k, timings)
+            contexts = [result["text"] for result in results]
+            
+            # Stage 3: generate
+            print(f"🤖 Generating response with {llm_provider}...")
+            with timed_stage(timings, "generate"):
+                response = await self._generate_response(
+                    message=enhanced_prompt,
+                    contexts=contexts,
+                    provider=llm_provider
+                )
+            
+            print(f"✅ Response generated: {response[:100]}...")
         
-        # Store conversation
-        print("💾 Storing conversation...")
-        self._store_conversation(user_id, message, response, llm_provider)
+        # Stage 4: persist - overlaps whatever the caller does next
+        self._store_in_background(user_id, message, response, llm_provider)
         
         print(f"\n{'='*60}")
-        print("✅ Chat complete!")
+        print(f"✅ Chat complete! ⏱️ {format_timings(timings)}")
         print(f"{'='*60}\n")
         
         return {
             "response": response,
             "context_used": contexts,
-            "has_memory": has_memory,
+            "has_memory": len(contexts) > 0,
+            "timings_ms": timings,
             "timestamp": datetime.now().isoformat()
         }
     
-    def _generate_response(self, message: str, contexts: List[str], provider: str) -> str:
-        """Generate LLM response"""
+    async def chat_stream(self, user_id: str, message: str, llm_provider: str = "openai",
+                          top_k: int = 20) -> AsyncIterator[dict]:
+        """
+        Streaming chat - yields events as the response is generated
         
-        task = """You are a helpful AI assistant.
-
-Answer the user's question naturally and conversationally.
-
-If the question includes memories/context at the beginning, use that information to give a personalized answer, but don't mention that you're using memories."""
+        Events are dicts with "event" and "data" keys: one "context" event,
+        a "token" event per streamed delta, then "done" with the stage
+        timings. The conversation is stored in the background once the
+        stream completes.
+        """
+        print(f"💬 Streaming chat request: {user_id}")
         
-        response = ask_llm(
-            task_description=task,
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        
+        results, enhanced_prompt = await self._prepare_prompt(user_id, message, top_k, timings)
+        contexts = [result["text"] for result in results]
+        yield {
+            "event": "context",
+            "data": {"context_used": contexts, "memories": results, "has_memory": len(contexts) > 0}
+        }
+        
+        tokens = []
+        with timed_stage(timings, "generate"):
+            async for token in stream_llm_async(
+                task_description=CHAT_SYSTEM_PROMPT,
+                input_data=enhanced_prompt,
+                temperature=0.7
+            ):
+                if not tokens:
+                    timings["first_token"] = round((time.perf_counter() - started) * 1000, 2)
+                tokens.append(token)
+                yield {"event": "token", "data": {"token": token}}
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        
+        response = "".join(tokens).strip()
+        self._store_in_background(user_id, message, response, llm_provider)
+        print(f"✅ Stream complete ⏱️ {format_timings(timings)}")
+        
+        yield {"event": "done", "data": {"timings_ms": timings, "timestamp": datetime.now().isoformat()}}
+    
+    async def _prepare_prompt(self, user_id: str, message: str, top_k: int,
+                              timings: Optional[Dict[str, float]] = None) -> Tuple[List[Dict], str]:
+        """Retrieve scored memories and build the memory-enhanced prompt"""
+        
+        # Retrieve relevant contexts
+        print(f"🔍 Retrieving contexts (top_k={top_k})...")
+        results = await self.store.retrieve_scored_async(user_id, message, top_k, timings)
+        print(f"✅ Retrieved {len(results)} contexts")
+        
+        # Enhance prompt with memory - the best-scoring distinct memories
+        enhanced_prompt = message
+        
+        prompt_texts = list(dict.fromkeys(result["text"] for result in results))[:3]
+        if prompt_texts:
+            memory_context = "\n\n".join([f"- {text}" for text in prompt_texts])
+            enhanced_prompt = f"Relevant memories:\n{memory_context}\n\nUser question: {message}"
+            print(f"✅ Enhanced with {len(prompt_texts)} memories")
+        else:
+            print("ℹ️  No relevant memory found")
+        
+        return results, enhanced_prompt
+    
+    async def _generate_response(self, message: str, contexts: List[str], provider: str) -> str:
+        """Generate LLM response"""
+        
+        response = await ask_llm_async(
+            task_description=CHAT_SYSTEM_PROMPT,
             input_data=message,
             temperature=0.7
         )
         
         return response.strip()
     
-    def _store_conversation(self, user_id: str, user_message: str, llm_response: str, provider: str):
+    def _store_in_background(self, user_id: str, user_message: str, llm_response: str, provider: str):
+        """Schedule conversation storage without waiting for it"""
+        print("💾 Storing conversation in background...")
+        task = asyncio.create_task(
+            self._store_conversation(user_id, user_message, llm_response, provider)
+        )
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def drain(self):
+        """Wait for background storage tasks to finish"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+    
+    async def _store_conversation(self, user_id: str, user_message: str, llm_response: str, provider: str):
         """Store conversation in memory"""
         
         try:
-            # Create simple chunk
-            chunk_text = f"User: {user_message}\nAssistant: {llm_response}"
+            started = time.perf_counter()
             
-            # Store in memory
-            self.store.add_memory(
+            # Token-bounded segments, embedded together - resolves once durable
+            memory_ids = await self.store.submit_conversation_async(
                 user_id=user_id,
-                user_msg=user_message,
+                user_message=user_message,
                 llm_response=llm_response,
-                chunk_text=chunk_text,
-                chunk_type="conversation",
                 priority="high",
                 provider=provider
             )
             
-            print("   ✅ Conversation stored")
-            
-            # Save to disk/S3
-            self.store.save()
+            print(f"   ✅ Conversation stored ({len(memory_ids)} segments) "
+                  f"⏱️ persist {(time.perf_counter() - started) * 1000:.1f}ms")
             
         except Exception as e:
             print(f"   ⚠️ Storage failed: {e}")
     
-    def retrieve_context(self, user_id: str, query: str, top_k: int = 5) -> List[str]:
+    async def retrieve_context(self, user_id: str, query: str, top_k: int = 5) -> List[Dict]:
         """
         Retrieve context for Chrome extension
-        Returns relevant memory snippets
+        Returns relevant memories with id, text, score, priority and timestamp
         """
-        contexts = self.store.retrieve(user_id, query, top_k)
-        return contexts[:top_k]
+        results = await self.store.retrieve_scored_async(user_id, query, top_k)
+        return results[:top_k]
     
-    def save_conversation(self, user_id: str, user_message: str, llm_response: str, provider: str = "openai") -> dict:
+    async def save_conversation(self, user_id: str, user_message: str, llm_response: str, provider: str = "openai") -> dict:
         """
         Save conversation (called by /save-response endpoint)
         """
         print(f"\n💾 Saving conversation for {user_id}")
         
         try:
-            chunk_text = f"User: {user_message}\nAssistant: {llm_response}"
-            
-            self.store.add_memory(
+            # Group-committed with concurrent saves; acknowledged once durable
+            memory_ids = await self.store.submit_conversation_async(
                 user_id=user_id,
-                user_msg=user_message,
+                user_message=user_message,
                 llm_response=llm_response,
-                chunk_text=chunk_text,
-                chunk_type="conversation",
                 priority="high",
                 provider=provider
             )
             
-            self.store.save()
-            
             return {
-                "chunks_stored": 1,
+                "chunks_stored": len(memory_ids),
                 "success": True
             }
             
@@ -158,9 +235,24 @@ If the question includes memories/context at the beginning, use that information
         """Get user memories"""
         return self.store.get_user_memories(user_id)
     
-    def clear_user_data(self, user_id: str) -> int:
+    def count_user_memories(self, user_id: str) -> int:
+        """Number of memories stored for a user"""
+        return self.store.count_user_memories(user_id)
+    
+    def get_memories_page(self, user_id: str, limit: int = 100, cursor: Optional[str] = None,
+                          newest_first: bool = False,
+                          fields: Optional[List[str]] = None) -> Tuple[List[dict], Optional[str]]:
+        """Get one page of user memories and the next cursor"""
+        return self.store.get_memories_page(user_id, limit, cursor, newest_first, fields)
+    
+    def iter_user_memories(self, user_id: str, newest_first: bool = False,
+                           fields: Optional[List[str]] = None) -> Iterator[dict]:
+        """Yield all user memories a page at a time"""
+        return self.store.iter_user_memories(user_id, newest_first, fields)
+    
+    async def clear_user_data(self, user_id: str) -> int:
         """Clear user data"""
-        return self.store.clear_user_memory(user_id)
+        return await self.store.clear_user_memory_async(user_id)
     
     def get_stats(self) -> dict:
         """Get system stats"""
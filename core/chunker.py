@@ -0,0 +1,67 @@
+"""
+Conversation Chunker - overlapping, token-bounded segments of a turn
+Built with Kiro - long answers become several focused vectors
+"""
+from typing import List, Tuple
+
+from core.config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+# Same conservative estimate as the embedding batcher (~3 characters per token)
+_CHARS_PER_TOKEN = 3
+
+
+def conversation_chunk(user_message: str, llm_response: str) -> str:
+    """Memory text for one conversation turn"""
+    return f"User: {user_message}\nAssistant: {llm_response}"
+
+
+def _boundary_before(text: str, start: int, end: int) -> int:
+    """Latest line or word break in the second half of text[start:end]"""
+    floor = start + (end - start) // 2
+    for separator in ("\n", " "):
+        position = text.rfind(separator, floor, end)
+        if position > start:
+            return position + 1
+    return end
+
+
+def _boundary_after(text: str, start: int, end: int) -> int:
+    """First word start at or after `start`, before `end`"""
+    if start == 0 or text[start - 1].isspace():
+        return start
+    position = text.find(" ", start, end)
+    return position + 1 if position != -1 else start
+
+
+def split_segments(text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Tuple[int, int]]:
+    """
+    Split text into overlapping segments within an estimated token budget
+
+    Segments end on a line or word break where one falls in their second
+    half, and each one after the first starts about overlap_tokens before
+    the previous end so that no sentence is only ever seen cut in two.
+
+    Args:
+        text: Text to split
+        max_tokens: Estimated tokens per segment
+        overlap_tokens: Estimated tokens shared by consecutive segments
+
+    Returns:
+        (start, end) character offsets into text, in order
+    """
+    budget = max(1, max_tokens) * _CHARS_PER_TOKEN
+    overlap = min(max(0, overlap_tokens) * _CHARS_PER_TOKEN, budget // 4)
+    if len(text) <= budget:
+        return [(0, len(text))]
+
+    segments = []
+    start = 0
+    while True:
+        end = min(start + budget, len(text))
+        if end < len(text):
+            end = _boundary_before(text, start, end)
+        segments.append((start, end))
+        if end >= len(text):
+            return segments
+        start = _boundary_after(text, max(end - overlap, start + 1), end)
@@ -3,34 +3,103 @@ Configuration and Constants
 Built with Kiro - centralized configuration management
 """
 import os
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 
 # Embedding settings
 EMBEDDING_DIM = 1536
 EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_BATCH_MAX_ITEMS = 2048
+EMBEDDING_BATCH_MAX_TOKENS = 250000
+EMBEDDING_MAX_RETRIES = 3
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_MAX_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", "1000000"))
 
 # Storage paths
 MEMORY_FILE = "memory_store.json"
+METADATA_FILE = "memory_store.db"
 INDEX_FILE = "faiss_index.bin"
+EMBEDDINGS_FILE = "embeddings.npy"
+WAL_FILE = "memory_store.wal"
+EMBEDDING_CACHE_FILE = "embedding_cache.db"
 ENTITIES_FILE = "user_entities.json"
 
+# Persistence settings
+COMPACTION_INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", "300"))
+WRITE_BATCH_MAX_SIZE = int(os.getenv("WRITE_BATCH_MAX_SIZE", "64"))
+WRITE_BATCH_MAX_LATENCY_MS = int(os.getenv("WRITE_BATCH_MAX_LATENCY_MS", "20"))
+SEARCH_THREADS = int(os.getenv("SEARCH_THREADS", "4"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "512"))
+IMPORT_CHECKPOINT_DIR = os.getenv("IMPORT_CHECKPOINT_DIR", "import_checkpoints")
+
+# Multi-process serving: "standalone" (one process does everything), "writer"
+# (owns mutations and publishes index snapshots) or "reader" (serves
+# memory-mapped snapshots and forwards writes to WRITER_URL)
+SERVING_ROLE = os.getenv("SERVING_ROLE", "standalone")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "index_snapshots")
+SNAPSHOT_PUBLISH_SECONDS = float(os.getenv("SNAPSHOT_PUBLISH_SECONDS", "2"))
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "1"))
+SNAPSHOT_KEEP_GENERATIONS = int(os.getenv("SNAPSHOT_KEEP_GENERATIONS", "10"))
+WRITER_URL = os.getenv("WRITER_URL", "http://127.0.0.1:8001")
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "admin-key-2025")
+
+# Vector index settings ("auto" picks Flat / HNSW / IVF-PQ per partition size)
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")
+HNSW_MIN_VECTORS = int(os.getenv("HNSW_MIN_VECTORS", "10000"))
+IVFPQ_MIN_VECTORS = int(os.getenv("IVFPQ_MIN_VECTORS", "500000"))
+HNSW_M = 32
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVFPQ_M = 96
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+# Threshold (range) searches return every hit above SIMILARITY_THRESHOLD, so
+# they explore more of an approximate partition than a top-k search
+HNSW_RANGE_EF_SEARCH = int(os.getenv("HNSW_RANGE_EF_SEARCH", "512"))
+IVF_RANGE_NPROBE = int(os.getenv("IVF_RANGE_NPROBE", "64"))
+
+# Vector compression for Flat/HNSW partitions ("none", "fp16", "sq8" or "pq" - IVF-PQ replaces HNSW)
+INDEX_COMPRESSION = os.getenv("INDEX_COMPRESSION", "none")
+RERANK_EXACT = os.getenv("RERANK_EXACT", "true").lower() == "true"
+RERANK_MARGIN = float(os.getenv("RERANK_MARGIN", "0.05"))
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "1000"))
+
 # LLM settings
 CHEAP_LLM_MODEL = "gpt-4o-mini"
 EXTRACTION_TEMPERATURE = 0.1
 EXPANSION_TEMPERATURE = 0.3
 CHAT_TEMPERATURE = 0.7
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
 
 # Retrieval settings
 DEFAULT_TOP_K = 5
 SIMILARITY_THRESHOLD = 0.5
 
+# Conversation chunking (estimated tokens per embedded segment)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+# Query result cache for repeated context lookups
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.97"))
+
+# Admin user listing: the sorted user order is reused this long while memories change
+USER_LIST_CACHE_SECONDS = float(os.getenv("USER_LIST_CACHE_SECONDS", "5"))
+
 # Supabase JWT Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://your-project.supabase.co")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 SUPABASE_JWT_ISSUER = f"{SUPABASE_URL}/auth/v1"
 SUPABASE_JWT_AUDIENCE = "authenticated"
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+JWT_CACHE_MAX_TTL_SECONDS = float(os.getenv("JWT_CACHE_MAX_TTL_SECONDS", "300"))
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+# Rate limiting
+RATE_LIMIT_FLUSH_SECONDS = float(os.getenv("RATE_LIMIT_FLUSH_SECONDS", "5"))
+RATE_LIMIT_TIER_TTL_SECONDS = float(os.getenv("RATE_LIMIT_TIER_TTL_SECONDS", "300"))
+RATE_LIMIT_MAX_ANONYMOUS = int(os.getenv("RATE_LIMIT_MAX_ANONYMOUS", "100000"))
+
 # Stripe Configuration
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
@@ -54,3 +123,25 @@ def get_openai_client():
 
 # Global OpenAI client
 openai_client = get_openai_client()
+
+def get_async_openai_client():
+    """Initialize and return an AsyncOpenAI client with a pooled HTTP client"""
+    try:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not set")
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE
+            )
+        )
+        client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        print("✅ Async OpenAI initialized")
+        return client
+    except Exception as e:
+        print(f"❌ Async OpenAI failed: {e}")
+        return None
+
+# Global async OpenAI client
+async_openai_client = get_async_openai_client()
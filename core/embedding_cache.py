@@ -0,0 +1,183 @@
+"""
+Embedding Cache - content-addressed LRU + SQLite tiers
+Built with Kiro - repeated texts skip the embeddings API entirely
+"""
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import EMBEDDING_CACHE_FILE, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MAX_DISK_ENTRIES
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by hash(model, text)
+
+    The memory tier is a bounded LRU of float32 vectors; the disk tier is a
+    SQLite table that survives restarts, capped at max_disk_entries rows
+    with the oldest written evicted first. Disk hits are promoted to memory.
+
+    Entries written on behalf of a user (e.g. their search queries) record
+    it, so purge can drop them when that user's data is deleted.
+    """
+
+    def __init__(self, path: str, max_entries: int,
+                 max_disk_entries: int = EMBEDDING_CACHE_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        # key -> (vector, owning user or None)
+        self._memory: "OrderedDict[str, Tuple[np.ndarray, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, user_id TEXT)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(embeddings)")]
+        if "user_id" not in columns:
+            self._db.execute("ALTER TABLE embeddings ADD COLUMN user_id TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_user ON embeddings (user_id)")
+        self._db.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """Content address for a (model, text) pair"""
+        return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray, user_id: Optional[str]):
+        """Insert into the memory tier, evicting the least recently used"""
+        self._memory[key] = (vector, user_id)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached embeddings
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Mapping of found keys to embedding vectors
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            disk_keys = []
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+                    self.memory_hits += 1
+                elif key not in found:
+                    disk_keys.append(key)
+
+            for key in dict.fromkeys(disk_keys):
+                row = self._db.execute(
+                    "SELECT vector, user_id FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    continue
+                vector = np.frombuffer(row[0], dtype='float32')
+                self._remember(key, vector, row[1])
+                found[key] = vector
+                self.disk_hits += 1
+
+        return {key: vector.tolist() for key, vector in found.items()}
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Look up a single cached embedding"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, List[float]], user_id: Optional[str] = None):
+        """
+        Store embeddings in both tiers
+
+        Args:
+            items: Embeddings by cache key
+            user_id: User the texts belong to, if they are private to one
+        """
+        if not items:
+            return
+
+        with self._lock:
+            rows = []
+            for key, embedding in items.items():
+                vector = np.asarray(embedding, dtype='float32')
+                self._remember(key, vector, user_id)
+                rows.append((key, vector.tobytes(), user_id))
+
+            # A replaced row gets the next rowid, so the lowest rowids are
+            # the oldest writes and the cap is a cheap range delete
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, user_id) VALUES (?, ?, ?)", rows
+            )
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?",
+                (self.max_disk_entries,)
+            )
+            self._db.commit()
+
+    def put(self, key: str, embedding: List[float], user_id: Optional[str] = None):
+        """Store a single embedding"""
+        self.put_many({key: embedding}, user_id)
+
+    def purge(self, keys: Iterable[str], user_id: Optional[str] = None) -> int:
+        """
+        Drop entries from both tiers, e.g. when a user's data is deleted
+
+        Args:
+            keys: Cache keys to drop
+            user_id: Also drop every entry stored on behalf of this user
+
+        Returns:
+            Number of disk rows deleted
+        """
+        keys = set(keys)
+        with self._lock:
+            for key in [
+                key for key, (_, owner) in self._memory.items()
+                if key in keys or (user_id is not None and owner == user_id)
+            ]:
+                del self._memory[key]
+
+            deleted = 0
+            if user_id is not None:
+                deleted += self._db.execute("DELETE FROM embeddings WHERE user_id = ?", (user_id,)).rowcount
+            key_list = list(keys)
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                deleted += self._db.execute(
+                    f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).rowcount
+            self._db.commit()
+            return deleted
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_entries,
+                "max_disk_entries": self.max_disk_entries
+            }
+
+
+# Global embedding cache instance
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_FILE, EMBEDDING_CACHE_MAX_ENTRIES)
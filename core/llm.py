@@ -2,12 +2,22 @@
 LLM Provider Abstraction
 Built with Kiro - unified interface for OpenAI
 """
-from core.config import openai_client, EMBEDDING_MODEL, CHEAP_LLM_MODEL
+import asyncio
+import time
+from typing import AsyncIterator
+
+from openai import BadRequestError
+
+from core.config import (
+    openai_client, async_openai_client, EMBEDDING_MODEL, CHEAP_LLM_MODEL,
+    EMBEDDING_BATCH_MAX_ITEMS, EMBEDDING_BATCH_MAX_TOKENS, EMBEDDING_MAX_RETRIES
+)
+from core.embedding_cache import embedding_cache
 
 
 def get_embedding(text: str, user_id: str = None) -> list[float]:
     """
-    Generate embedding for text using OpenAI
+    Generate embedding for text using OpenAI, served from cache when possible
     
     Args:
         text: Text to embed
@@ -16,17 +26,125 @@ def get_embedding(text: str, user_id: str = None) -> list[float]:
     Returns:
         List of floats representing the embedding vector
     """
+    cache_key = embedding_cache.key(EMBEDDING_MODEL, text)
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         response = openai_client.embeddings.create(
             model=EMBEDDING_MODEL,
             input=text
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        embedding_cache.put(cache_key, embedding, user_id)
+        return embedding
     except Exception as e:
         print(f"❌ Embedding error: {e}")
         raise
 
 
+def forget_embeddings(texts: list[str], user_id: str = None) -> int:
+    """
+    Drop cached embeddings of texts (and of anything embedded for user_id)
+    
+    Args:
+        texts: Texts whose embeddings should no longer be cached
+        user_id: User whose privately cached embeddings should go too
+        
+    Returns:
+        Number of disk cache rows deleted
+    """
+    return embedding_cache.purge(
+        (embedding_cache.key(EMBEDDING_MODEL, text) for text in texts), user_id
+    )
+
+
+def _estimate_tokens(text: str) -> int:
+    """Conservative token estimate (~3 characters per token)"""
+    return len(text) // 3 + 1
+
+
+def _embedding_batches(texts: list[str], max_items: int, max_tokens: int) -> list[tuple[int, int]]:
+    """Split texts into contiguous (start, end) ranges within item and token limits"""
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = _estimate_tokens(text)
+        if i > start and (i - start >= max_items or tokens + cost > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _split_cached(texts: list[str]) -> tuple[list[str], dict, list[str], list[str]]:
+    """
+    Resolve texts against the embedding cache
+    
+    Returns:
+        Tuple of (keys per text, cached vectors by key, unique uncached keys,
+        their texts in first-seen order)
+    """
+    keys = [embedding_cache.key(EMBEDDING_MODEL, text) for text in texts]
+    cached = embedding_cache.get_many(keys)
+    pending = {key: text for key, text in zip(keys, texts) if key not in cached}
+    return keys, cached, list(pending), list(pending.values())
+
+
+def get_embeddings(texts: list[str], user_id: str = None, client=None,
+                   max_items: int = EMBEDDING_BATCH_MAX_ITEMS,
+                   max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+                   max_retries: int = EMBEDDING_MAX_RETRIES) -> list[list[float]]:
+    """
+    Generate embeddings for many texts with multi-input requests
+    
+    Cached texts are served locally and duplicates are sent once. The rest
+    are split into sub-batches within the item and token limits. A failed
+    sub-batch is retried with backoff on its own; sub-batches that already
+    succeeded are not re-sent. Rejected inputs (400) are not retried.
+    
+    Args:
+        texts: Texts to embed
+        user_id: Optional user ID for usage tracking
+        client: OpenAI-compatible client (defaults to the global client)
+        max_items: Maximum inputs per request
+        max_tokens: Maximum estimated tokens per request
+        max_retries: Retries per sub-batch before giving up
+        
+    Returns:
+        Embedding vectors in the same order as texts
+    """
+    client = client or openai_client
+    keys, cached, pending_keys, pending_texts = _split_cached(texts)
+    fetched: dict = {}
+    
+    for start, end in _embedding_batches(pending_texts, max_items, max_tokens):
+        for attempt in range(max_retries + 1):
+            try:
+                response = client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=pending_texts[start:end]
+                )
+                batch = {
+                    pending_keys[start + item.index]: item.embedding
+                    for item in response.data
+                }
+                embedding_cache.put_many(batch, user_id)
+                fetched.update(batch)
+                break
+            except Exception as e:
+                if attempt == max_retries or isinstance(e, BadRequestError):
+                    print(f"❌ Embedding error (items {start}-{end}): {e}")
+                    raise
+                print(f"⚠️ Embedding retry {attempt + 1} (items {start}-{end}): {e}")
+                time.sleep(0.5 * 2 ** attempt)
+    
+    return [cached.get(key) or fetched[key] for key in keys]
+
+
 def ask_llm(task_description: str, input_data: str, temperature: float = 0.7) -> str:
     """
     Ask LLM to perform a task
@@ -52,3 +170,144 @@ def ask_llm(task_description: str, input_data: str, temperature: float = 0.7) ->
     except Exception as e:
         print(f"❌ LLM error: {e}")
         raise
+
+
+async def get_embedding_async(text: str, user_id: str = None) -> list[float]:
+    """
+    Generate embedding for text without blocking the event loop
+    
+    Cache lookups and writes hit SQLite, so they run on a worker thread.
+    
+    Args:
+        text: Text to embed
+        user_id: Optional user ID for usage tracking
+        
+    Returns:
+        List of floats representing the embedding vector
+    """
+    loop = asyncio.get_running_loop()
+    cache_key = embedding_cache.key(EMBEDDING_MODEL, text)
+    cached = await loop.run_in_executor(None, embedding_cache.get, cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        response = await async_openai_client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=text
+        )
+        embedding = response.data[0].embedding
+        await loop.run_in_executor(None, embedding_cache.put, cache_key, embedding, user_id)
+        return embedding
+    except Exception as e:
+        print(f"❌ Embedding error: {e}")
+        raise
+
+
+async def get_embeddings_async(texts: list[str], user_id: str = None, client=None,
+                               max_items: int = EMBEDDING_BATCH_MAX_ITEMS,
+                               max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+                               max_retries: int = EMBEDDING_MAX_RETRIES) -> list[list[float]]:
+    """
+    Async counterpart of get_embeddings; sub-batches are sent concurrently
+    and cache I/O runs on worker threads
+    
+    Args:
+        texts: Texts to embed
+        user_id: Optional user ID for usage tracking
+        client: AsyncOpenAI-compatible client (defaults to the global client)
+        max_items: Maximum inputs per request
+        max_tokens: Maximum estimated tokens per request
+        max_retries: Retries per sub-batch before giving up
+        
+    Returns:
+        Embedding vectors in the same order as texts
+    """
+    client = client or async_openai_client
+    loop = asyncio.get_running_loop()
+    keys, cached, pending_keys, pending_texts = await loop.run_in_executor(None, _split_cached, texts)
+    
+    async def embed_batch(start: int, end: int) -> dict:
+        for attempt in range(max_retries + 1):
+            try:
+                response = await client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=pending_texts[start:end]
+                )
+                batch = {
+                    pending_keys[start + item.index]: item.embedding
+                    for item in response.data
+                }
+                await loop.run_in_executor(None, embedding_cache.put_many, batch, user_id)
+                return batch
+            except Exception as e:
+                if attempt == max_retries or isinstance(e, BadRequestError):
+                    print(f"❌ Embedding error (items {start}-{end}): {e}")
+                    raise
+                print(f"⚠️ Embedding retry {attempt + 1} (items {start}-{end}): {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    
+    fetched: dict = {}
+    batches = _embedding_batches(pending_texts, max_items, max_tokens)
+    for batch in await asyncio.gather(*(embed_batch(start, end) for start, end in batches)):
+        fetched.update(batch)
+    
+    return [cached.get(key) or fetched[key] for key in keys]
+
+
+async def ask_llm_async(task_description: str, input_data: str, temperature: float = 0.7) -> str:
+    """
+    Ask LLM to perform a task without blocking the event loop
+    
+    Args:
+        task_description: Description of the task
+        input_data: Input data for the task
+        temperature: Sampling temperature (0-1)
+        
+    Returns:
+        LLM response as string
+    """
+    try:
+        response = await async_openai_client.chat.completions.create(
+            model=CHEAP_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": task_description},
+                {"role": "user", "content": input_data}
+            ],
+            temperature=temperature
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        print(f"❌ LLM error: {e}")
+        raise
+
+
+async def stream_llm_async(task_description: str, input_data: str,
+                           temperature: float = 0.7) -> AsyncIterator[str]:
+    """
+    Ask LLM to perform a task, yielding response text as it is generated
+    
+    Args:
+        task_description: Description of the task
+        input_data: Input data for the task
+        temperature: Sampling temperature (0-1)
+        
+    Yields:
+        Response text deltas
+    """
+    try:
+        stream = await async_openai_client.chat.completions.create(
+            model=CHEAP_LLM_MODEL,
+            messages=[
+                {"role": "system", "content": task_description},
+                {"role": "user", "content": input_data}
+            ],
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        print(f"❌ LLM stream error: {e}")
+        raise
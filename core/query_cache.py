@@ -0,0 +1,181 @@
+"""
+Query Cache - per-user retrieval results keyed by query text and embedding
+Built with Kiro - repeated context lookups skip embedding and search
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_SIMILARITY, QUERY_CACHE_TTL_SECONDS
+
+
+class QueryResultCache:
+    """
+    Bounded LRU of retrieval results per (user, query)
+
+    An identical query (ignoring case and whitespace) is answered before it
+    is embedded; a query whose embedding is within `similarity` of a cached
+    one is answered without searching. Entries expire after `ttl` seconds
+    and every write to a user's memories invalidates that user's entries.
+    A per-user generation counter stops a search that raced a write from
+    caching its stale results.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, similarity: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        # (user_id, query key) -> (query vector, results, top_k, expires_at, exhaustive)
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._user_keys: Dict[str, Dict[str, None]] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.text_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _answer(entry: tuple, top_k: int) -> Optional[List[Dict]]:
+        """Cached results for top_k, if the entry holds enough of them"""
+        _, results, cached_k, _, exhaustive = entry
+        # Fewer results than asked for means every match was returned, but
+        # only if the search could not have missed any
+        if top_k <= cached_k or (exhaustive and len(results) < cached_k):
+            return [dict(result) for result in results[:top_k]]
+        return None
+
+    def _drop(self, user_id: str, key: str):
+        self._entries.pop((user_id, key), None)
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def generation(self, user_id: str) -> Tuple[int, int]:
+        """Current write generation of a user, to pass back to put"""
+        with self._lock:
+            return self._epoch, self._generations.get(user_id, 0)
+
+    def get(self, user_id: str, query: str, top_k: int) -> Optional[List[Dict]]:
+        """Results cached for the same query text"""
+        key = self._key(query)
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[3] <= time.time():
+                self._drop(user_id, key)
+                entry = None
+            if entry is not None:
+                results = self._answer(entry, top_k)
+                if results is not None:
+                    self._entries.move_to_end((user_id, key))
+                    self.text_hits += 1
+                    return results
+            return None
+
+    def get_similar(self, user_id: str, query_vector: np.ndarray, top_k: int) -> Optional[List[Dict]]:
+        """
+        Results cached for the most similar earlier query
+
+        Args:
+            user_id: User identifier
+            query_vector: Normalized query embedding, shape (dim,)
+            top_k: Number of results wanted
+
+        Returns:
+            Cached results, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for key in list(self._user_keys.get(user_id, ())):
+                entry = self._entries[(user_id, key)]
+                if entry[3] <= now:
+                    self._drop(user_id, key)
+                elif entry[0] is not None:
+                    candidates.append((key, entry))
+
+            if candidates:
+                scores = np.stack([entry[0] for _, entry in candidates]) @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    key, entry = candidates[best]
+                    results = self._answer(entry, top_k)
+                    if results is not None:
+                        self._entries.move_to_end((user_id, key))
+                        self.semantic_hits += 1
+                        return results
+
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, query: str, query_vector: Optional[np.ndarray],
+            top_k: int, results: List[Dict], generation: Tuple[int, int],
+            exhaustive: bool = True):
+        """
+        Cache search results unless the user has been written since `generation`
+
+        Args:
+            user_id: User identifier
+            query: Query text
+            query_vector: Normalized query embedding
+            top_k: Number of results requested
+            results: Search results
+            generation: Value of generation() taken before the search
+            exhaustive: Whether the search returned every match it could
+                (False for approximate indexes), so a short result also
+                answers larger top_k
+        """
+        key = self._key(query)
+        with self._lock:
+            if (self._epoch, self._generations.get(user_id, 0)) != generation:
+                return
+            self._entries[(user_id, key)] = (
+                query_vector, [dict(result) for result in results], top_k, time.time() + self.ttl,
+                exhaustive
+            )
+            self._entries.move_to_end((user_id, key))
+            self._user_keys.setdefault(user_id, {})[key] = None
+            while len(self._entries) > self.max_entries:
+                (old_user, old_key), _ = self._entries.popitem(last=False)
+                self._drop(old_user, old_key)
+
+    def invalidate(self, user_id: str):
+        """Drop a user's entries after their memories changed"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in list(self._user_keys.pop(user_id, ())):
+                self._entries.pop((user_id, key), None)
+
+    def clear(self):
+        """Drop every entry (e.g. after an index rebuild)"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and size"""
+        with self._lock:
+            hits = self.text_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "text_hits": self.text_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+# Global query result cache
+query_cache = QueryResultCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_SIMILARITY)
@@ -2,10 +2,16 @@
 Rate Limiter - Supabase-based tier limits
 Built with Kiro - enforces subscription tier limits
 """
+import asyncio
 import os
+import threading
+import time
 from datetime import datetime, date
+from typing import Dict, List, Set, Tuple
 from supabase import create_client, Client
 
+from core.config import RATE_LIMIT_FLUSH_SECONDS, RATE_LIMIT_TIER_TTL_SECONDS, RATE_LIMIT_MAX_ANONYMOUS
+
 
 class RateLimiter:
     """
@@ -16,8 +22,30 @@ class RateLimiter:
     - pro: 1000 requests/day
     - enterprise: unlimited
     - admin: unlimited
+    
+    Counters live in process, keyed by (user_id, day). Supabase is read once
+    per user/day (and per tier TTL) and increments are flushed every
+    RATE_LIMIT_FLUSH_SECONDS through the `increment_usage` database function
+    (see DEPLOYMENT.md), which adds them server-side so concurrent workers
+    never overwrite each other. The request path does no network I/O once a
+    user is warm, and limits are accurate to within one flush interval of
+    traffic from other workers.
+    
+    Only a user's first request (tier and usage not yet loaded) waits on
+    Supabase, and check_limit_async runs that lookup in a worker thread.
+    Expired tiers keep being served while the flusher reloads them. The
+    flusher also forgets users idle for a tier TTL and past days' counters,
+    so in-process state is bounded by recently active users.
+    
+    Anonymous callers (IDs starting with ANONYMOUS_PREFIX, e.g. a client IP)
+    get the free tier and are counted in process only: they have no users
+    row and usage_tracking is keyed by user UUID. Their counters cannot be
+    reloaded, so they are kept for the day, up to RATE_LIMIT_MAX_ANONYMOUS
+    callers; beyond that the least recently seen are dropped.
     """
     
+    ANONYMOUS_PREFIX = "ip:"
+    
     # Tier limits
     TIER_LIMITS = {
         "free": 100,
@@ -31,13 +59,88 @@ class RateLimiter:
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
         
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Tuple[str, float]] = {}
+        self._used: Dict[Tuple[str, str], int] = {}
+        self._pending: Dict[Tuple[str, str], Dict[str, int]] = {}
+        # Users whose tier expired while in use, for the flusher to reload
+        self._stale_tiers: Set[str] = set()
+        self._last_seen: Dict[str, float] = {}
+        self._calls_today: Tuple[str, int] = (date.today().isoformat(), 0)
+        self._closed = threading.Event()
+        
         if not supabase_url or not supabase_key:
             print("⚠️ Supabase not configured, rate limiting disabled")
             self.supabase = None
         else:
             self.supabase = create_client(supabase_url, supabase_key)
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
             print("✅ Rate limiter initialized")
     
+    def _get_tier(self, user_id: str) -> str:
+        """Return the user's tier, refreshing from Supabase after the TTL"""
+        if user_id.startswith(self.ANONYMOUS_PREFIX):
+            return "free"
+        
+        cached = self._tiers.get(user_id)
+        if cached is not None:
+            if cached[1] <= time.monotonic():
+                # Serve the old tier; the flusher reloads it off the request path
+                with self._lock:
+                    self._stale_tiers.add(user_id)
+            return cached[0]
+        
+        return self._load_tiers([user_id])[user_id]
+    
+    def _load_tiers(self, user_ids: List[str]) -> Dict[str, str]:
+        """Fetch tiers from Supabase in one query and cache them for the TTL"""
+        user_result = self.supabase.table('users').select('id, tier').in_('id', user_ids).execute()
+        
+        # New users have no row yet and default to the free tier
+        tiers = dict.fromkeys(user_ids, "free")
+        for row in user_result.data or []:
+            tiers[row['id']] = row.get('tier') or 'free'
+        
+        expires_at = time.monotonic() + RATE_LIMIT_TIER_TTL_SECONDS
+        for user_id, tier in tiers.items():
+            self._tiers[user_id] = (tier, expires_at)
+        return tiers
+    
+    def _get_used(self, user_id: str, today: str) -> int:
+        """Return today's usage, loading the Supabase count on first sight"""
+        key = (user_id, today)
+        with self._lock:
+            if key in self._used or user_id.startswith(self.ANONYMOUS_PREFIX):
+                return self._used.get(key, 0)
+        
+        usage_result = self.supabase.table('usage_tracking') \
+            .select('api_calls') \
+            .eq('user_id', user_id) \
+            .eq('date', today) \
+            .execute()
+        
+        remote = usage_result.data[0].get('api_calls', 0) if usage_result.data else 0
+        
+        with self._lock:
+            # Local increments may have landed while we were fetching
+            local = self._pending.get(key, {}).get('api_calls', 0)
+            self._used.setdefault(key, remote + local)
+            return self._used[key]
+    
+    def _is_warm(self, user_id: str, today: str) -> bool:
+        """Whether check_limit can answer without a Supabase round-trip"""
+        return user_id.startswith(self.ANONYMOUS_PREFIX) or (
+            user_id in self._tiers and (user_id, today) in self._used
+        )
+    
+    async def check_limit_async(self, user_id: str) -> tuple[bool, dict]:
+        """check_limit for the event loop: a cold user's lookups run in a worker thread"""
+        if not self.supabase or self._is_warm(user_id, date.today().isoformat()):
+            return self.check_limit(user_id)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.check_limit, user_id)
+    
     def check_limit(self, user_id: str) -> tuple[bool, dict]:
         """
         Check if user is within rate limit
@@ -53,30 +156,17 @@ class RateLimiter:
             return True, {"tier": "free", "limit": 100, "used": 0, "remaining": 100}
         
         try:
-            # Get user tier
-            user_result = self.supabase.table('users').select('tier').eq('id', user_id).execute()
+            self._last_seen[user_id] = time.monotonic()
             
-            if not user_result.data:
-                # New user, default to free tier
-                tier = "free"
-            else:
-                tier = user_result.data[0].get('tier', 'free')
+            # Get user tier
+            tier = self._get_tier(user_id)
             
             # Get limit for tier
             limit = self.TIER_LIMITS.get(tier, 100)
             
             # Get today's usage
             today = date.today().isoformat()
-            usage_result = self.supabase.table('usage_tracking') \
-                .select('api_calls') \
-                .eq('user_id', user_id) \
-                .eq('date', today) \
-                .execute()
-            
-            if not usage_result.data:
-                used = 0
-            else:
-                used = usage_result.data[0].get('api_calls', 0)
+            used = self._get_used(user_id, today)
             
             # Check if within limit
             allowed = used < limit
@@ -100,46 +190,165 @@ class RateLimiter:
     
     def increment_usage(self, user_id: str, endpoint_type: str = "api_call"):
         """
-        Increment usage counter for user
+        Increment usage counter for user (flushed to Supabase in batches)
         
         Args:
             user_id: User identifier
             endpoint_type: Type of endpoint (api_call, save_prompt, save_response, context)
         """
+        today = date.today().isoformat()
+        with self._lock:
+            day, calls = self._calls_today
+            self._calls_today = (today, calls + 1 if day == today else 1)
+        
         if not self.supabase:
             return
         
+        key = (user_id, today)
+        with self._lock:
+            self._used[key] = self._used.get(key, 0) + 1
+            if user_id.startswith(self.ANONYMOUS_PREFIX):
+                return
+            pending = self._pending.setdefault(key, {})
+            pending['api_calls'] = pending.get('api_calls', 0) + 1
+            column = f'{endpoint_type}_calls'
+            pending[column] = pending.get(column, 0) + 1
+    
+    def calls_today(self) -> Dict[str, object]:
+        """
+        Today's API calls across every worker
+        
+        Sums today's usage_tracking rows with the `usage_total` database
+        function (see DEPLOYMENT.md), then adds this process's increments
+        not yet flushed and its anonymous calls, which never reach
+        usage_tracking. Anonymous calls served by other workers are not
+        included. Without Supabase, or if the lookup fails, falls back to
+        the calls this process has seen.
+        
+        Returns:
+            Dictionary with api_calls_today and api_calls_scope
+            ("all_workers" or "this_process")
+        """
+        today = date.today().isoformat()
+        with self._lock:
+            day, calls = self._calls_today
+            local = calls if day == today else 0
+        
+        if not self.supabase:
+            return {"api_calls_today": local, "api_calls_scope": "this_process"}
+        
         try:
-            today = date.today().isoformat()
+            result = self.supabase.rpc('usage_total', {'day': today}).execute()
+        except Exception as e:
+            print(f"⚠️ Usage total lookup failed: {e}")
+            return {"api_calls_today": local, "api_calls_scope": "this_process"}
+        
+        with self._lock:
+            unflushed = sum(
+                counts.get('api_calls', 0)
+                for (user_id, day), counts in self._pending.items() if day == today
+            )
+            anonymous = sum(
+                used for (user_id, day), used in self._used.items()
+                if day == today and user_id.startswith(self.ANONYMOUS_PREFIX)
+            )
+        return {
+            "api_calls_today": int(result.data or 0) + unflushed + anonymous,
+            "api_calls_scope": "all_workers"
+        }
+    
+    def flush(self) -> int:
+        """
+        Add aggregated increments to Supabase
+        
+        One `increment_usage` RPC for every pending (user, day): the database
+        adds each delta to the stored counter in a single upsert, so
+        increments from other workers are never lost. The totals it returns
+        are folded back into the local counters.
+        
+        Returns:
+            Number of (user, day) rows written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        
+        deltas = [
+            {'user_id': user_id, 'date': day, **counts}
+            for (user_id, day), counts in pending.items()
+        ]
+        try:
+            result = self.supabase.rpc('increment_usage', {'deltas': deltas}).execute()
+        except Exception as e:
+            print(f"⚠️ Usage flush failed: {e}")
+            # Keep the deltas for the next flush
+            with self._lock:
+                for key, counts in pending.items():
+                    merged = self._pending.setdefault(key, {})
+                    for column, delta in counts.items():
+                        merged[column] = merged.get(column, 0) + delta
+            return 0
+        
+        with self._lock:
+            for row in result.data or []:
+                key = (row['user_id'], row['date'])
+                unflushed = self._pending.get(key, {}).get('api_calls', 0)
+                self._used[key] = row['api_calls'] + unflushed
+        
+        return len(deltas)
+    
+    def _refresh_tiers(self):
+        """Reload tiers that expired while their users were active"""
+        with self._lock:
+            stale, self._stale_tiers = list(self._stale_tiers), set()
+        for start in range(0, len(stale), 100):
+            batch = stale[start:start + 100]
+            try:
+                self._load_tiers(batch)
+            except Exception as e:
+                print(f"⚠️ Tier refresh failed: {e}")
+                # Still expired, so the next request marks them again
+    
+    def _prune(self):
+        """Forget idle users' tiers and counters, and past days' counters"""
+        today = date.today().isoformat()
+        idle_before = time.monotonic() - RATE_LIMIT_TIER_TTL_SECONDS
+        with self._lock:
+            idle = {user_id for user_id, seen in self._last_seen.items() if seen < idle_before}
+            for user_id in idle:
+                del self._last_seen[user_id]
+                self._tiers.pop(user_id, None)
             
-            # Check if record exists
-            result = self.supabase.table('usage_tracking') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .eq('date', today) \
-                .execute()
+            # Signed-in users' counts are reloaded from Supabase if they return;
+            # anyone's count is kept while increments for it are pending
+            for key in list(self._used):
+                if key in self._pending:
+                    continue
+                user_id, day = key
+                if day != today or (user_id in idle and not user_id.startswith(self.ANONYMOUS_PREFIX)):
+                    del self._used[key]
             
-            if not result.data:
-                # Create new record
-                self.supabase.table('usage_tracking').insert({
-                    'user_id': user_id,
-                    'date': today,
-                    'api_calls': 1,
-                    f'{endpoint_type}_calls': 1
-                }).execute()
-            else:
-                # Update existing record
-                record_id = result.data[0]['id']
-                current_calls = result.data[0].get('api_calls', 0)
-                endpoint_calls = result.data[0].get(f'{endpoint_type}_calls', 0)
-                
-                self.supabase.table('usage_tracking').update({
-                    'api_calls': current_calls + 1,
-                    f'{endpoint_type}_calls': endpoint_calls + 1
-                }).eq('id', record_id).execute()
-                
-        except Exception as e:
-            print(f"⚠️ Usage increment failed: {e}")
+            anonymous = [key for key in self._used if key[0].startswith(self.ANONYMOUS_PREFIX)]
+            excess = len(anonymous) - RATE_LIMIT_MAX_ANONYMOUS
+            if excess > 0:
+                anonymous.sort(key=lambda key: self._last_seen.get(key[0], 0.0))
+                for key in anonymous[:excess]:
+                    del self._used[key]
+                    self._last_seen.pop(key[0], None)
+    
+    def _flush_loop(self):
+        """Flush increments every RATE_LIMIT_FLUSH_SECONDS"""
+        while not self._closed.wait(RATE_LIMIT_FLUSH_SECONDS):
+            self.flush()
+            self._refresh_tiers()
+            self._prune()
+    
+    def close(self):
+        """Stop the flusher and write any remaining increments"""
+        self._closed.set()
+        if self.supabase:
+            self.flush()
 
 
 # Global rate limiter instance
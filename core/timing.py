@@ -0,0 +1,32 @@
+"""
+Stage Timing - wall-clock timings for request pipeline stages
+Built with Kiro - see where a chat request spends its time
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+@contextmanager
+def timed_stage(timings: Optional[Dict[str, float]], name: str) -> Iterator[None]:
+    """
+    Record how long the block takes, in milliseconds, as timings[name]
+
+    Args:
+        timings: Dict collecting stage timings; None disables timing
+        name: Stage name
+    """
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    """One-line summary such as "embed 12.1ms, search 3.4ms" """
+    return ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings.items())
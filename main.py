@@ -9,17 +9,25 @@ load_dotenv()
 
 from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+import asyncio
+import json
+import os
 
 # Core imports
 from core.chat_service import ChatService
-from core.auth import get_verified_user_id, validate_path_user_id
+from core.auth import get_verified_user_id, validate_path_user_id, verify_bearer_token
 from core.admin_service import AdminService
-from core.rate_limiter import rate_limiter
-from core.config import STRIPE_WEBHOOK_SECRET
+from core.rate_limiter import RateLimiter, rate_limiter
+from core.bulk_import import BulkImporter, ndjson_lines
+from core.config import (
+    STRIPE_WEBHOOK_SECRET, INDEX_TYPE, IMPORT_CHECKPOINT_DIR, ADMIN_API_KEY, async_openai_client
+)
+from storage.metadata_store import MEMORY_FIELDS
 
 # Initialize FastAPI
 app = FastAPI(
@@ -51,108 +59,138 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     )
 
 # Rate limiting middleware
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
+class RateLimitMiddleware:
     """
-    Rate limiting middleware - checks Supabase for tier-based limits
+    Rate limiting middleware - checks tier-based limits
+    
+    Pure ASGI: the caller is identified by the verified JWT `sub` (or the
+    /context/{user_id} path), so request bodies are never read or buffered
+    here. Verified claims are left in request state for the auth dependency.
+    Unauthenticated /chat requests are counted against the client IP.
     
-    Protected endpoints: /save-prompt, /save-response, /context/{user_id}
+    Protected endpoints: /save-prompt, /save-response, /context/{user_id}, /chat
     Skipped: /admin/*, /stripe/*, /health, /
     """
-    # Skip rate limiting for certain endpoints
-    if (request.method == "OPTIONS" or
-        request.url.path.startswith("/admin") or
-        request.url.path.startswith("/stripe") or
-        request.url.path in ["/health", "/"]):
-        return await call_next(request)
     
-    # Extract user_id from request
-    user_id = None
+    def __init__(self, app):
+        self.app = app
     
-    try:
-        # Try to get from request body (POST requests)
-        if request.method == "POST":
-            body = await request.body()
-            async def receive():
-                return {"type": "http.request", "body": body}
-            request._receive = receive
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        
+        # Skip rate limiting for certain endpoints
+        if (scope["type"] != "http" or
+            scope["method"] == "OPTIONS" or
+            path.startswith("/admin") or
+            path.startswith("/stripe") or
+            path in ["/health", "/"]):
+            return await self.app(scope, receive, send)
+        
+        user_id = self._identify(scope, path)
+        
+        # If no user_id found, allow request (fail open)
+        if not user_id:
+            return await self.app(scope, receive, send)
+        
+        # Check rate limit
+        allowed, info = await rate_limiter.check_limit_async(user_id)
+        
+        if not allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "error": "Rate limit exceeded",
+                    "message": f"You've reached your daily limit of {info.get('limit')} requests",
+                    "tier": info.get("tier"),
+                    "limit": info.get("limit"),
+                    "used": info.get("used"),
+                    "remaining": 0,
+                    "reset_at": info.get("reset_at"),
+                    "upgrade_url": "https://yoursaas.com/pricing"
+                },
+                headers={
+                    "X-RateLimit-Limit": str(info.get("limit", 0)),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(info.get("reset_at", "")),
+                    "Retry-After": "3600",
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Methods": "*",
+                    "Access-Control-Allow-Headers": "*"
+                }
+            )
+            return await response(scope, receive, send)
+        
+        status = {"code": 500}
+        
+        async def send_with_headers(message):
+            # Add rate limit headers
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(info.get("limit", 0))
+                headers["X-RateLimit-Remaining"] = str(info.get("remaining", 0))
+                headers["X-RateLimit-Reset"] = str(info.get("reset_at", ""))
+            await send(message)
+        
+        # Process request
+        await self.app(scope, receive, send_with_headers)
+        
+        # Increment usage after successful request
+        if status["code"] < 400:
+            endpoint_type = "api_call"
+            if "/save-prompt" in path:
+                endpoint_type = "save_prompt"
+            elif "/save-response" in path:
+                endpoint_type = "save_response"
+            elif "/context" in path:
+                endpoint_type = "context"
             
             try:
-                import json
-                data = json.loads(body.decode())
-                user_id = data.get("user_id")
-            except:
-                pass
+                rate_limiter.increment_usage(user_id, endpoint_type)
+            except Exception as e:
+                print(f"WARNING: Failed to increment usage: {e}")
+    
+    @staticmethod
+    def _identify(scope, path: str) -> Optional[str]:
+        """Resolve the caller from the verified token, falling back to the path or client IP"""
+        authorization = Headers(scope=scope).get("authorization")
+        if authorization:
+            try:
+                claims = verify_bearer_token(authorization)
+                scope.setdefault("state", {})["token_payload"] = claims
+                if claims.get("sub"):
+                    return claims["sub"]
+            except HTTPException:
+                pass  # The endpoint's auth dependency reports the error
         
         # Get from path parameter (GET requests like /context/{user_id})
-        elif "/context/" in request.url.path:
-            parts = request.url.path.split("/")
-            if len(parts) >= 3 and parts[1] == "context":
-                user_id = parts[2]
-    
-    except Exception as e:
-        print(f"WARNING: Failed to extract user_id: {e}")
-    
-    # If no user_id found, allow request (fail open)
-    if not user_id:
-        return await call_next(request)
-    
-    # Check rate limit
-    allowed, info = rate_limiter.check_limit(user_id)
-    
-    if not allowed:
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "Rate limit exceeded",
-                "message": f"You've reached your daily limit of {info.get('limit')} requests",
-                "tier": info.get("tier"),
-                "limit": info.get("limit"),
-                "used": info.get("used"),
-                "remaining": 0,
-                "reset_at": info.get("reset_at"),
-                "upgrade_url": "https://yoursaas.com/pricing"
-            },
-            headers={
-                "X-RateLimit-Limit": str(info.get("limit", 0)),
-                "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": str(info.get("reset_at", "")),
-                "Retry-After": "3600",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*"
-            }
-        )
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Add rate limit headers
-    response.headers["X-RateLimit-Limit"] = str(info.get("limit", 0))
-    response.headers["X-RateLimit-Remaining"] = str(info.get("remaining", 0))
-    response.headers["X-RateLimit-Reset"] = str(info.get("reset_at", ""))
-    
-    # Increment usage after successful request
-    if response.status_code < 400:
-        endpoint_type = "api_call"
-        if "/save-prompt" in request.url.path:
-            endpoint_type = "save_prompt"
-        elif "/save-response" in request.url.path:
-            endpoint_type = "save_response"
-        elif "/context" in request.url.path:
-            endpoint_type = "context"
+        parts = path.split("/")
+        if len(parts) >= 3 and parts[1] == "context":
+            return parts[2]
         
-        try:
-            rate_limiter.increment_usage(user_id, endpoint_type)
-        except Exception as e:
-            print(f"WARNING: Failed to increment usage: {e}")
-    
-    return response
+        # /chat takes user_id in the body - meter anonymous callers by address
+        # (behind a proxy, run uvicorn with --proxy-headers / --forwarded-allow-ips)
+        client = scope.get("client")
+        if path == "/chat" and client:
+            return f"{RateLimiter.ANONYMOUS_PREFIX}{client[0]}"
+        
+        return None
+
+app.add_middleware(RateLimitMiddleware)
 
 # Initialize services
 chat_service = ChatService()
 admin_service = AdminService(chat_service)
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush pending writes and usage counters, then close pooled connections"""
+    await chat_service.drain()
+    chat_service.store.close()
+    rate_limiter.close()
+    if async_openai_client:
+        await async_openai_client.close()
+
 # ============================================================================
 # REQUEST/RESPONSE MODELS
 # ============================================================================
@@ -173,10 +211,19 @@ class ChatRequest(BaseModel):
     message: str
     llm_provider: str = "openai"
     top_k: int = 20
+    stream: bool = False
+
+class ConversationWriteRequest(BaseModel):
+    user_id: str
+    user_message: str
+    llm_response: str
+    priority: str = "high"
+    provider: str = "openai"
 
 class ChatResponse(BaseModel):
     response: str
     context_used: List[str]
+    timings_ms: Dict[str, float] = {}
     timestamp: str
 
 # ============================================================================
@@ -201,7 +248,7 @@ async def root():
         ],
         "endpoints": {
             "memory": ["/save-prompt", "/save-response", "/context/{user_id}"],
-            "admin": ["/admin/dashboard", "/admin/users"],
+            "admin": ["/admin/dashboard", "/admin/users", "/admin/import"],
             "health": ["/health"]
         }
     }
@@ -286,8 +333,8 @@ async def save_response(
                 detail="User ID mismatch"
             )
         
-        # Store complete conversation
-        result = chat_service.save_conversation(
+        # Store complete conversation - concurrent saves share a write batch
+        result = await chat_service.save_conversation(
             user_id=verified_user_id,
             user_message=request.prompt,
             llm_response=request.response,
@@ -324,11 +371,12 @@ async def get_context(
             raise HTTPException(status_code=400, detail="Query is required")
         
         # Use verified user_id for security
-        contexts = chat_service.retrieve_context(verified_user_id, query, top_k)
+        results = await chat_service.retrieve_context(verified_user_id, query, top_k)
         
         return {
-            "contexts": contexts,
-            "count": len(contexts)
+            "contexts": [result["text"] for result in results],
+            "results": results,
+            "count": len(results)
         }
     
     except HTTPException:
@@ -344,7 +392,14 @@ async def chat(request: ChatRequest):
         if not request.user_id or not request.message:
             raise HTTPException(status_code=400, detail="Invalid input")
         
-        result = chat_service.chat(
+        if request.stream:
+            return StreamingResponse(
+                _chat_events(request),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        result = await chat_service.chat(
             user_id=request.user_id,
             message=request.message,
             llm_provider=request.llm_provider,
@@ -359,20 +414,78 @@ async def chat(request: ChatRequest):
         print(f"❌ Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _chat_events(request: ChatRequest):
+    """Format streamed chat events as Server-Sent Events"""
+    try:
+        async for event in chat_service.chat_stream(
+            user_id=request.user_id,
+            message=request.message,
+            llm_provider=request.llm_provider,
+            top_k=request.top_k
+        ):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    except Exception as e:
+        print(f"❌ Chat stream error: {e}")
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+def _projection(fields: Optional[str], exclude: Optional[str]) -> Optional[List[str]]:
+    """Memory keys to return from comma-separated fields / exclude params"""
+    if not fields and not exclude:
+        return None
+    
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(MEMORY_FIELDS)
+    excluded = {f.strip() for f in exclude.split(",")} if exclude else set()
+    return [f for f in selected if f not in excluded]
+
+def _ndjson(rows):
+    """Encode an iterable of dicts as newline-delimited JSON, one row at a time"""
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
 @app.get("/memory/{user_id}")
-async def get_memory(user_id: str):
-    """Get user memories"""
-    memories = chat_service.get_user_memories(user_id)
+async def get_memory(
+    user_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """
+    Get user memories in timeline order
+    
+    JSON responses are paginated with `limit` and `cursor`; `format=ndjson`
+    streams every memory, one per line. `fields` / `exclude` project keys.
+    """
+    newest_first = order == "desc"
+    projection = _projection(fields, exclude)
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            _ndjson(chat_service.iter_user_memories(user_id, newest_first, projection)),
+            media_type="application/x-ndjson"
+        )
+    
+    try:
+        memories, next_cursor = chat_service.get_memories_page(
+            user_id, limit, cursor, newest_first, projection
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     return {
         "user_id": user_id,
         "memories": memories,
-        "count": len(memories)
+        "count": len(memories),
+        "total": chat_service.count_user_memories(user_id),
+        "next_cursor": next_cursor
     }
 
 @app.delete("/memory/{user_id}")
 async def clear_memory(user_id: str):
     """Clear user memory"""
-    cleared = chat_service.clear_user_data(user_id)
+    cleared = await chat_service.clear_user_data(user_id)
     return {
         "message": f"Cleared {cleared} memories" if cleared > 0 else "No memories found",
         "cleared": cleared
@@ -384,18 +497,23 @@ async def clear_memory(user_id: str):
 
 def verify_admin_key(admin_key: str = None):
     """Verify admin API key"""
-    import os
-    expected_key = os.getenv("ADMIN_API_KEY", "admin-key-2025")
-    if admin_key != expected_key:
+    if admin_key != ADMIN_API_KEY:
         raise HTTPException(status_code=403, detail="Invalid admin key")
 
+def verify_writer():
+    """Reject mutations that only the writer process can perform"""
+    if chat_service.store.read_only:
+        raise HTTPException(status_code=409, detail="Read replica - send this request to the writer process")
+
 @app.get("/admin/dashboard")
 async def get_admin_dashboard(admin_key: str = None):
     """Get admin dashboard stats"""
     verify_admin_key(admin_key)
     
     try:
-        stats = admin_service.get_dashboard_stats()
+        # The usage total is a Supabase round-trip - keep it off the event loop
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, admin_service.get_dashboard_stats)
         return stats
     except Exception as e:
         print(f"❌ Dashboard error: {e}")
@@ -405,18 +523,31 @@ async def get_admin_dashboard(admin_key: str = None):
 async def get_admin_users(
     admin_key: str = None,
     sort_by: str = "cost",
-    limit: Optional[int] = None
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
 ):
-    """Get list of all users with stats"""
+    """Get a page of users with stats, or stream them all as NDJSON"""
     verify_admin_key(admin_key)
     
+    if format == "ndjson":
+        return StreamingResponse(
+            _ndjson(admin_service.iter_users(sort_by=sort_by)),
+            media_type="application/x-ndjson"
+        )
+    
     try:
-        users = admin_service.get_users_list(sort_by=sort_by, limit=limit)
+        users, next_cursor = admin_service.get_users_page(
+            sort_by=sort_by, limit=limit, cursor=cursor
+        )
         return {
             "users": users,
             "count": len(users),
-            "sort_by": sort_by
+            "sort_by": sort_by,
+            "next_cursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Users list error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -437,6 +568,80 @@ async def get_admin_user_details(user_id: str, admin_key: str = None):
         print(f"❌ User details error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/admin/rebuild-index")
+async def rebuild_admin_index(
+    admin_key: str = None,
+    index_factory: str = INDEX_TYPE,
+    reembed_missing: bool = False
+):
+    """Rebuild the vector index from stored embeddings"""
+    verify_admin_key(admin_key)
+    verify_writer()
+    
+    try:
+        # Rebuilding reads every stored vector and trains new sub-indexes -
+        # keep it off the event loop so other requests are still served
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: admin_service.rebuild_index(
+            index_factory=index_factory,
+            reembed_missing=reembed_missing
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Rebuild index error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/import")
+async def import_memories(
+    request: Request,
+    admin_key: str = None,
+    user_id: Optional[str] = None,
+    checkpoint: Optional[str] = Query(None, pattern="^[A-Za-z0-9_-]{1,64}$")
+):
+    """
+    Bulk import conversations from an NDJSON request body
+    
+    The body is parsed as it streams in. With `checkpoint`, progress is
+    recorded server-side and re-sending the same file resumes after the
+    last durable batch.
+    """
+    verify_admin_key(admin_key)
+    verify_writer()
+    
+    checkpoint_path = None
+    if checkpoint:
+        os.makedirs(IMPORT_CHECKPOINT_DIR, exist_ok=True)
+        checkpoint_path = os.path.join(IMPORT_CHECKPOINT_DIR, f"{checkpoint}.json")
+    
+    importer = BulkImporter(chat_service.store, default_user_id=user_id)
+    return await importer.run(ndjson_lines(request.stream()), checkpoint_path)
+
+@app.post("/admin/conversations")
+async def write_conversation(request: ConversationWriteRequest, admin_key: str = None):
+    """Store a conversation turn on the writer (forwarded by reader workers)"""
+    verify_admin_key(admin_key)
+    verify_writer()
+    
+    memory_ids = await chat_service.store.submit_conversation_async(
+        user_id=request.user_id,
+        user_message=request.user_message,
+        llm_response=request.llm_response,
+        priority=request.priority,
+        provider=request.provider
+    )
+    return {"memory_ids": memory_ids}
+
+@app.delete("/admin/users/{user_id}")
+async def clear_admin_user_data(user_id: str, admin_key: str = None):
+    """Clear all data for a user (reader workers forward DELETE /memory here)"""
+    verify_admin_key(admin_key)
+    verify_writer()
+    
+    # Removal ends in an fsynced save - keep it off the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, admin_service.clear_user_data, user_id)
+
 if __name__ == "__main__":
     import uvicorn
     print("\n" + "="*60)
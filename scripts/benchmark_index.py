@@ -0,0 +1,160 @@
+"""
+Index Benchmark - recall / latency / RAM of the search path per index type
+Built with Kiro - choose INDEX_TYPE and INDEX_COMPRESSION from measurements
+
+Usage (from the repository root):
+    python -m scripts.benchmark_index --embeddings embeddings.npy --queries 200
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+import faiss
+import numpy as np
+
+from core.config import (
+    EMBEDDINGS_FILE, EMBEDDING_DIM, SIMILARITY_THRESHOLD, RERANK_MARGIN, RERANK_MAX_CANDIDATES
+)
+from storage.partitioned_index import PartitionedIndex
+
+DEFAULT_FACTORIES = [
+    "Flat", "SQfp16", "SQ8",
+    "HNSW32", "HNSW32,SQfp16", "HNSW32,SQ8",
+    "auto-ivfpq"
+]
+
+
+def load_vectors(path: str, max_vectors: int, seed: int) -> np.ndarray:
+    """
+    Load stored embeddings, skipping empty rows
+
+    Args:
+        path: Embedding matrix (.npy)
+        max_vectors: Random sample size cap
+        seed: Sampling seed
+
+    Returns:
+        Normalized float32 vectors, shape (n, dim)
+    """
+    matrix = np.load(path, mmap_mode='r')
+    rows = np.flatnonzero(np.asarray(matrix.any(axis=1)))
+    if len(rows) > max_vectors:
+        rows = np.sort(np.random.default_rng(seed).choice(rows, max_vectors, replace=False))
+
+    vectors = np.ascontiguousarray(matrix[rows], dtype='float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def range_hits(index: faiss.Index, query: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Scores and IDs of every vector at or above a threshold, as MemoryStore searches"""
+    lims, scores, ids = index.range_search(query, threshold)
+    return scores[lims[0]:lims[1]], ids[lims[0]:lims[1]]
+
+
+def rerank_exact(base: np.ndarray, query: np.ndarray, scores: np.ndarray, ids: np.ndarray,
+                 threshold: float, max_candidates: int) -> np.ndarray:
+    """Re-score candidates against the raw vectors, as MemoryStore._rerank_exact does"""
+    if len(ids) > max_candidates:
+        ids = ids[np.argpartition(-scores, max_candidates - 1)[:max_candidates]]
+    exact = base[ids] @ query
+    return ids[exact >= threshold]
+
+
+def set_recall(found: List[np.ndarray], truth: List[np.ndarray]) -> Tuple[float, float]:
+    """Fraction of the exact matches found, and of the results that are exact matches"""
+    relevant = sum(len(t) for t in truth)
+    returned = sum(len(f) for f in found)
+    correct = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    return (correct / relevant if relevant else 1.0), (correct / returned if returned else 1.0)
+
+
+def bench(index_factory: str, base: np.ndarray, queries: np.ndarray, truth: List[np.ndarray],
+          threshold: float, margin: float, max_candidates: int) -> dict:
+    """Build one index type and measure its search path against the exact matches"""
+    builder = PartitionedIndex(EMBEDDING_DIM, index_factory)
+    ids = np.arange(len(base), dtype='int64')
+
+    start = time.perf_counter()
+    index = builder.build_partition(index_factory, ids, base)
+    build_seconds = time.perf_counter() - start
+
+    # Compressed types are searched with a margin and re-ranked exactly
+    rerank = "SQ" in index_factory or "PQ" in index_factory
+    search_threshold = threshold - margin if rerank else threshold
+
+    latencies, found, candidates = [], [], []
+    for query in queries:
+        query = query.reshape(1, -1)
+
+        start = time.perf_counter()
+        scores, hits = range_hits(index, query, search_threshold)
+        candidates.append(len(hits))
+        if rerank:
+            hits = rerank_exact(base, query[0], scores, hits, threshold, max_candidates)
+        latencies.append(time.perf_counter() - start)
+        found.append(hits)
+
+    latencies_ms = np.array(latencies) * 1000
+    recall, precision = set_recall(found, truth)
+    return {
+        "index": index_factory,
+        "bytes_per_vector": len(faiss.serialize_index(index)) / len(base),
+        "build_s": build_seconds,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "candidates": float(np.mean(candidates)),
+        "recall": recall,
+        "precision": precision
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types on stored embeddings")
+    parser.add_argument("--embeddings", default=EMBEDDINGS_FILE, help="Embedding matrix (.npy)")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out query vectors")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Minimum cosine similarity of a match")
+    parser.add_argument("--margin", type=float, default=RERANK_MARGIN,
+                        help="Threshold widening for compressed types before exact re-rank")
+    parser.add_argument("--max-candidates", type=int, default=RERANK_MAX_CANDIDATES,
+                        help="Candidates re-ranked per query")
+    parser.add_argument("--max-vectors", type=int, default=200000, help="Sample cap for the base set")
+    parser.add_argument("--factories", nargs="+", default=DEFAULT_FACTORIES,
+                        help="index_factory descriptions; 'auto-ivfpq' sizes IVF-PQ like INDEX_TYPE=auto")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    vectors = load_vectors(args.embeddings, args.max_vectors + args.queries, args.seed)
+    if len(vectors) <= args.queries:
+        raise SystemExit(f"❌ Only {len(vectors)} stored vectors - not enough to benchmark")
+
+    # Hold queries out of the base set so no query finds itself
+    order = np.random.default_rng(args.seed).permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[order[:args.queries]])
+    base = np.ascontiguousarray(vectors[order[args.queries:]])
+
+    exact = faiss.IndexFlatIP(EMBEDDING_DIM)
+    exact.add(base)
+    truth = [range_hits(exact, query.reshape(1, -1), args.threshold)[1] for query in queries]
+    print(f"📊 {len(base)} base vectors, {len(queries)} queries, threshold {args.threshold} "
+          f"({np.mean([len(t) for t in truth]):.1f} exact matches per query)")
+
+    auto = PartitionedIndex(EMBEDDING_DIM, "auto", hnsw_min_vectors=0, ivfpq_min_vectors=0)
+    print(f"{'index':<20}{'bytes/vec':>10}{'build s':>9}{'p50 ms':>8}{'p95 ms':>8}"
+          f"{'cands':>8}{'recall':>8}{'precision':>10}")
+    for index_factory in args.factories:
+        if index_factory == "auto-ivfpq":
+            index_factory = auto.factory_for(len(base))
+        try:
+            row = bench(index_factory, base, queries, truth, args.threshold, args.margin, args.max_candidates)
+        except Exception as e:
+            print(f"⚠️ {index_factory}: {e}")
+            continue
+        print(f"{row['index']:<20}{row['bytes_per_vector']:>10.0f}{row['build_s']:>9.2f}"
+              f"{row['p50_ms']:>8.3f}{row['p95_ms']:>8.3f}{row['candidates']:>8.1f}"
+              f"{row['recall']:>8.3f}{row['precision']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
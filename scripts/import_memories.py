@@ -0,0 +1,45 @@
+"""
+Memory Import - load historical conversations from NDJSON
+Built with Kiro - offline onboarding without one request per chat
+
+Run with the API stopped (the store has a single writer), from the
+repository root:
+    python -m scripts.import_memories chats.ndjson --checkpoint chats.checkpoint.json
+
+Re-running with the same checkpoint resumes after the last durable batch.
+"""
+import argparse
+import asyncio
+from typing import List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from core.bulk_import import BulkImporter, file_lines
+from core.config import IMPORT_BATCH_SIZE
+from storage.memory_store import MemoryStore
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Bulk import conversations into the memory store")
+    parser.add_argument("path", help="NDJSON file, one conversation turn per line")
+    parser.add_argument("--checkpoint", help="Progress file for resuming (default: <path>.checkpoint.json)")
+    parser.add_argument("--user-id", help="user_id for records that do not carry one")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Memories per embedding batch")
+    args = parser.parse_args(argv)
+
+    store = MemoryStore()
+    try:
+        importer = BulkImporter(store, batch_size=args.batch_size, default_user_id=args.user_id)
+        summary = asyncio.run(importer.run(
+            file_lines(args.path), args.checkpoint or f"{args.path}.checkpoint.json"
+        ))
+    finally:
+        store.close()
+
+    if not summary["completed"]:
+        raise SystemExit(f"❌ Import incomplete - rerun to resume: {summary['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Embedding Matrix - memory-mapped raw vectors aligned by memory ID
+Built with Kiro - rebuild any index offline, without re-embedding
+"""
+import os
+import numpy as np
+from typing import Sequence
+
+
+class EmbeddingMatrix:
+    """
+    Float32 .npy matrix opened with mmap_mode
+
+    Row i holds the raw embedding of memory ID i. Rows of deleted memories
+    are zeroed, so the file is the single offline source for rebuilding any
+    FAISS index type. Capacity grows by doubling.
+
+    Opened read_only (mmap_mode='r'), rows written in place by another
+    process are visible through the shared page cache; a grown file
+    replaces the old one, so readers reopen to see rows beyond capacity.
+    """
+
+    def __init__(self, path: str, dim: int, initial_capacity: int = 1024, read_only: bool = False):
+        self.path = path
+        self.dim = dim
+        self.created = not os.path.exists(path)
+
+        if self.created and not read_only:
+            self.matrix = np.lib.format.open_memmap(
+                path, mode='w+', dtype='float32', shape=(initial_capacity, dim)
+            )
+        else:
+            self.matrix = np.load(path, mmap_mode='r' if read_only else 'r+')
+            if self.matrix.dtype != np.float32 or self.matrix.ndim != 2 or self.matrix.shape[1] != dim:
+                raise ValueError(
+                    f"{path} has shape {self.matrix.shape} / {self.matrix.dtype}, "
+                    f"expected (n, {dim}) float32"
+                )
+
+    @property
+    def capacity(self) -> int:
+        """Number of rows currently allocated"""
+        return self.matrix.shape[0]
+
+    def _grow(self, min_rows: int):
+        """Reallocate the file with at least min_rows rows"""
+        capacity = max(min_rows, self.capacity * 2)
+        tmp_path = f"{self.path}.tmp"
+
+        grown = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype='float32', shape=(capacity, self.dim)
+        )
+        grown[:self.capacity] = self.matrix
+        grown.flush()
+
+        # Swap in one assignment: concurrent readers keep the old mapping,
+        # which stays valid after its file is replaced
+        os.replace(tmp_path, self.path)
+        self.matrix = grown
+
+    def write(self, ids: Sequence[int], vectors: np.ndarray):
+        """
+        Store embeddings at their memory ID rows
+
+        Args:
+            ids: Memory IDs, shape (n,)
+            vectors: Embeddings, shape (n, dim)
+        """
+        ids = np.asarray(ids, dtype='int64')
+        if len(ids) == 0:
+            return
+
+        needed = int(ids.max()) + 1
+        if needed > self.capacity:
+            self._grow(needed)
+
+        self.matrix[ids] = vectors
+
+    def read(self, ids: Sequence[int]) -> np.ndarray:
+        """
+        Read embeddings for memory IDs
+
+        Args:
+            ids: Memory IDs, all below capacity
+
+        Returns:
+            Contiguous float32 array, shape (n, dim)
+        """
+        return np.ascontiguousarray(self.matrix[np.asarray(ids, dtype='int64')])
+
+    def clear(self, ids: Sequence[int]):
+        """Zero the rows of deleted memories"""
+        ids = np.asarray(ids, dtype='int64')
+        ids = ids[ids < self.capacity]
+        if len(ids):
+            self.matrix[ids] = 0.0
+
+    def flush(self):
+        """Flush dirty pages to disk"""
+        self.matrix.flush()
@@ -0,0 +1,309 @@
+"""
+Index Snapshots - published index generations for read-only worker processes
+Built with Kiro - N workers share one memory-mapped copy of the index
+"""
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+
+from core.config import SNAPSHOT_KEEP_GENERATIONS
+from storage.partitioned_index import PartitionedIndex
+from storage.rw_lock import PartitionLocks
+
+_CURRENT = "CURRENT"
+_PARTITIONS = "partitions"
+
+
+class ReadOnlyStoreError(RuntimeError):
+    """A mutation was attempted on a read replica"""
+
+
+def _manifest_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"manifest-{generation:08d}.json")
+
+
+def _write_atomic(path: str, data: str):
+    """Write a small file so readers see either the old or the new content"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _write_durable(path: str, data):
+    """Write a file and fsync it before it is referenced anywhere"""
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def current_generation(directory: str) -> Optional[int]:
+    """Latest published generation, or None before the first publish"""
+    try:
+        with open(os.path.join(directory, _CURRENT), 'r', encoding='utf-8') as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_manifest(directory: str, generation: int) -> Optional[Dict]:
+    """Manifest of a generation, or None if it has been pruned"""
+    try:
+        with open(_manifest_path(directory, generation), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotPublisher:
+    """
+    Publishes the writer's index as numbered, immutable generations
+
+    Each generation is a manifest mapping every user to a partition file,
+    plus the metadata changes (added memory IDs, cleared users) made since
+    the previous generation. Only partitions changed since the last publish
+    are written; unchanged users keep pointing at their existing file.
+    `CURRENT` is replaced last, so a reader never sees a generation whose
+    files or metadata rows are not yet on disk.
+
+    The last `keep` manifests, and every partition file they reference,
+    are retained so a reader a few generations behind can still catch up
+    incrementally.
+    """
+
+    def __init__(self, directory: str, keep: int = SNAPSHOT_KEEP_GENERATIONS):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self.partitions_dir = os.path.join(directory, _PARTITIONS)
+        os.makedirs(self.partitions_dir, exist_ok=True)
+
+        self._index: Optional[PartitionedIndex] = None
+        # (generation that stopped referencing it, file name)
+        self._garbage: "deque[Tuple[int, str]]" = deque()
+        self._lock = threading.Lock()
+
+        self.generation = current_generation(directory) or 0
+        self._staged = self.generation
+        manifest = read_manifest(directory, self.generation) if self.generation else None
+        self._next_file = manifest["next_file"] if manifest else 0
+        # Files of the current generation, so a restart's full rewrite retires them
+        self._files = manifest["partitions"] if manifest else {}
+        # Changes made before a restart or a failed publish never reached a
+        # manifest, so readers must reload metadata instead of replaying them
+        self._reload_metadata = True
+        self._sweep()
+
+    def _sweep(self):
+        """Delete partition files no retained manifest references (e.g. after a crash)"""
+        live = set()
+        for generation in range(max(1, self.generation - self.keep + 1), self.generation + 1):
+            manifest = read_manifest(self.directory, generation)
+            if manifest:
+                live.update(entry[0] for entry in manifest["partitions"].values())
+        for name in os.listdir(self.partitions_dir):
+            if name not in live:
+                os.remove(os.path.join(self.partitions_dir, name))
+        for name in os.listdir(self.directory):
+            if name.startswith("manifest-") and name.endswith(".json"):
+                if int(name[len("manifest-"):-len(".json")]) <= self.generation - self.keep:
+                    os.remove(os.path.join(self.directory, name))
+
+    def stage(self, index: PartitionedIndex, changes: List[Tuple[str, object, Optional[tuple]]]) -> Optional[Dict]:
+        """
+        Capture the partitions changed since the last publish
+
+        Must be called under the store lock, in the same critical section
+        that cut `changes`, and staged generations must be published in
+        order. Only references to the changed partitions are taken here, so
+        the store lock is held for a dictionary walk however much of the
+        index changed; `write` serializes them after the lock is released.
+
+        Args:
+            index: The writer's live index
+            changes: Metadata changes from MetadataStore.take_changes
+
+        Returns:
+            Manifest for write and publish, or None if nothing changed
+        """
+        dirty = index.take_dirty()
+        full = index is not self._index
+        if not full and not dirty and not changes:
+            return None
+
+        files: Dict[str, list] = {}
+        pending: Dict[str, Tuple[str, object]] = {}
+        replaced = []
+        for user_id, factory in index.partition_factories.items():
+            previous = self._files.get(user_id)
+            if not full and user_id not in dirty and previous is not None:
+                files[user_id] = previous
+                continue
+            name = f"{self._next_file:012d}.faiss"
+            self._next_file += 1
+            # The count is filled in by write, from what was serialized
+            pending[name] = (user_id, index.partitions[user_id])
+            files[user_id] = [name, 0, factory]
+
+        for user_id, entry in self._files.items():
+            if files.get(user_id) is not entry:
+                replaced.append(entry[0])
+
+        self._index = index
+        self._files = files
+        self._staged += 1
+        return {
+            "generation": self._staged,
+            "created": datetime.now().isoformat(),
+            "dim": index.dim,
+            "index_factory": index.index_factory,
+            "compression": index.compression,
+            "next_file": self._next_file,
+            "partitions": files,
+            "changes": [[op, key] for op, key, _ in changes if op in ("add", "clear_user")],
+            "reload_metadata": self._reload_metadata,
+            "replaced": replaced,
+            "pending": pending
+        }
+
+    def write(self, manifest: Dict, partition_locks: PartitionLocks):
+        """
+        Serialize, write and fsync a staged generation's new partition files
+
+        Called without the store lock; nothing references the files until
+        the generation is published. Each partition is copied under its own
+        lock held shared, so only writes to that one user wait, and only for
+        that one copy. Vectors added since the cut may be included - their
+        memories reach readers with the next generation, and searches skip
+        hits that have no metadata row yet.
+
+        Args:
+            manifest: Result of stage
+            partition_locks: The store's per-user partition locks
+        """
+        pending = manifest.pop("pending")
+        for name, (user_id, partition) in pending.items():
+            with partition_locks[user_id].read():
+                data = PartitionedIndex.serialize_partition(partition)
+                manifest["partitions"][user_id][1] = partition.ntotal
+            _write_durable(os.path.join(self.partitions_dir, name), data)
+        manifest["ntotal"] = sum(entry[1] for entry in manifest["partitions"].values())
+
+    def discard(self, manifest: Dict):
+        """
+        Drop a staged generation whose metadata could not be committed
+
+        The next stage rewrites every partition and asks readers to reload
+        metadata, since the dirty set this one consumed is gone.
+
+        Args:
+            manifest: Result of stage
+        """
+        with self._lock:
+            self._index = None
+            self._reload_metadata = True
+            self._staged = self.generation
+            # Files the discarded generation replaced are still current;
+            # retire them with the generation that does get published
+            self._garbage.extend((self.generation, name) for name in manifest["replaced"])
+
+    def publish(self, manifest: Dict):
+        """
+        Make a staged generation current, once its metadata rows are committed
+
+        Args:
+            manifest: Result of stage
+        """
+        with self._lock:
+            generation = manifest["generation"]
+            replaced = manifest.pop("replaced")
+            try:
+                _write_atomic(_manifest_path(self.directory, generation),
+                              json.dumps(manifest, separators=(',', ':')))
+                _write_atomic(os.path.join(self.directory, _CURRENT), str(generation))
+            except Exception:
+                self._index = None
+                self._reload_metadata = True
+                raise
+            self.generation = generation
+            self._reload_metadata = self._reload_metadata and not manifest["reload_metadata"]
+
+            # Retire what fell out of the retention window
+            self._garbage.extend((generation, name) for name in replaced)
+            oldest = generation - self.keep
+            while self._garbage and self._garbage[0][0] <= oldest:
+                _, name = self._garbage.popleft()
+                try:
+                    os.remove(os.path.join(self.partitions_dir, name))
+                except FileNotFoundError:
+                    pass
+            stale = _manifest_path(self.directory, oldest)
+            if oldest > 0 and os.path.exists(stale):
+                os.remove(stale)
+
+
+class SnapshotIndex(PartitionedIndex):
+    """
+    Read-only PartitionedIndex over one published generation
+
+    Partitions are opened with FAISS IO_FLAG_MMAP_IFC on first use, which
+    points their vectors, codes and HNSW graphs straight at the mapped file,
+    so they live in the shared page cache rather than in each worker's heap
+    and a worker only maps the users it actually serves. (Plain
+    IO_FLAG_MMAP only maps inverted lists; Flat, SQ and HNSW data would be
+    copied into every worker.)
+    Partitions whose file did not change are carried over from the
+    previous generation without being reopened.
+    """
+
+    def __init__(self, directory: str, manifest: Dict, previous: Optional["SnapshotIndex"] = None):
+        super().__init__(manifest["dim"], manifest["index_factory"], compression=manifest["compression"])
+        self.directory = directory
+        self.generation = manifest["generation"]
+        self._files = {user_id: entry[0] for user_id, entry in manifest["partitions"].items()}
+        self._counts = {user_id: entry[1] for user_id, entry in manifest["partitions"].items()}
+        self.partition_factories = {user_id: entry[2] for user_id, entry in manifest["partitions"].items()}
+        self._ntotal = manifest["ntotal"]
+        self._open_lock = threading.Lock()
+
+        if previous is not None:
+            for user_id, partition in previous.partitions.items():
+                if previous._files.get(user_id) == self._files.get(user_id):
+                    self.partitions[user_id] = partition
+
+    def _partition(self, user_id: str) -> Optional[faiss.Index]:
+        """Map a user's partition on first use"""
+        partition = self.partitions.get(user_id)
+        if partition is not None or user_id not in self._files:
+            return partition
+
+        with self._open_lock:
+            partition = self.partitions.get(user_id)
+            if partition is None:
+                path = os.path.join(self.directory, _PARTITIONS, self._files[user_id])
+                try:
+                    partition = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+                except RuntimeError as e:
+                    # Pruned because this worker fell far behind; the next swap catches up
+                    print(f"⚠️ Snapshot partition for '{user_id}' unavailable: {e}")
+                    return None
+                self._tune(partition)
+                self.partitions[user_id] = partition
+            return partition
+
+    def count(self, user_id: str) -> int:
+        """Number of vectors stored for a user, without mapping the partition"""
+        return self._counts.get(user_id, 0)
+
+
+    def _read_only(self, *args, **kwargs):
+        raise ReadOnlyStoreError("Snapshot indexes are read-only")
+
+    add = replace_partition = remove_ids = remove_user = _read_only
@@ -4,62 +4,408 @@ Built with Kiro - efficient vector storage and retrieval
 """
 import faiss
 import numpy as np
+import asyncio
+import base64
 import json
 import os
-from typing import List, Dict
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 
-from core.config import EMBEDDING_DIM, SIMILARITY_THRESHOLD
-from core.llm import get_embedding
+from core.config import (
+    EMBEDDING_DIM, SIMILARITY_THRESHOLD, MEMORY_FILE, METADATA_FILE, INDEX_FILE, EMBEDDINGS_FILE,
+    WAL_FILE, COMPACTION_INTERVAL_SECONDS, WRITE_BATCH_MAX_SIZE, WRITE_BATCH_MAX_LATENCY_MS,
+    SEARCH_THREADS, INDEX_TYPE, RERANK_EXACT, RERANK_MARGIN, RERANK_MAX_CANDIDATES,
+    SERVING_ROLE, SNAPSHOT_DIR, SNAPSHOT_PUBLISH_SECONDS
+)
+from core.chunker import conversation_chunk, split_segments
+from core.llm import forget_embeddings, get_embedding, get_embeddings, get_embedding_async
+from core.query_cache import query_cache
+from core.timing import timed_stage
+from storage.embedding_matrix import EmbeddingMatrix
+from storage.index_snapshot import SnapshotPublisher
+from storage.metadata_store import MetadataStore, PRIORITIES, decode_cursor, encode_cursor
+from storage.partitioned_index import PartitionedIndex
+from storage.rw_lock import PartitionLocks
+from storage.write_ahead_log import WriteAheadLog
+
+
+class WriteBatcher:
+    """
+    Group-commit pipeline for memory writes
+    
+    Queued submissions are drained into batches of up to max_batch entries,
+    waiting at most max_latency_ms after the first. Each batch gets one
+    embedding request, one index add per user, and one fsync; every
+    caller's future resolves with its memory IDs once the batch is durable.
+    A submission's entries are never split or interleaved with others, so
+    the segments of one conversation get consecutive IDs.
+    """
+    
+    def __init__(self, store: "MemoryStore", max_batch: int = WRITE_BATCH_MAX_SIZE,
+                 max_latency_ms: int = WRITE_BATCH_MAX_LATENCY_MS):
+        self.store = store
+        self.max_batch = max(1, max_batch)
+        self.max_latency = max_latency_ms / 1000
+        self._queue: "queue.Queue[Optional[Tuple[List[Dict], Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def submit(self, entries: List[Dict]) -> Future:
+        """
+        Queue memory entries for the next batch
+        
+        Args:
+            entries: Memory entries without IDs
+            
+        Returns:
+            Future resolving to their memory IDs, in order, once durable
+        """
+        future = Future()
+        self._queue.put((entries, future))
+        return future
+    
+    def _run(self):
+        """Drain the queue into batches until closed"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            batch = [item]
+            size = len(item[0])
+            stopping = False
+            deadline = time.monotonic() + self.max_latency
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+            
+            self._commit(batch)
+            if stopping:
+                return
+    
+    def _commit(self, batch: List[Tuple[List[Dict], Future]]):
+        """
+        Embed, index and durably log one batch
+        
+        If embedding fails, each submission is retried on its own, so one
+        bad input (e.g. over the model's token limit) only fails its own
+        caller. Failures after that point fail the whole batch.
+        """
+        entries = [entry for submitted, _ in batch for entry in submitted]
+        try:
+            vectors = np.array(get_embeddings([e["chunk_text"] for e in entries]), dtype='float32')
+        except Exception as e:
+            if len(batch) > 1:
+                print(f"⚠️ Batch embedding failed ({len(entries)} memories), retrying each submission: {e}")
+                for item in batch:
+                    self._commit([item])
+                return
+            print(f"⚠️ Batch write failed ({len(entries)} memories): {e}")
+            batch[0][1].set_exception(e)
+            return
+        
+        try:
+            memory_ids = self.store.add_memories(entries, vectors)
+            self.store.sync()
+        except Exception as e:
+            print(f"⚠️ Batch write failed ({len(entries)} memories): {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        start = 0
+        for submitted, future in batch:
+            future.set_result(memory_ids[start:start + len(submitted)])
+            start += len(submitted)
+    
+    def close(self):
+        """Commit everything queued so far and stop the writer"""
+        self._queue.put(None)
+        self._thread.join()
 
 
 class MemoryStore:
-    """Handles vector storage and retrieval with local persistence"""
+    """
+    Handles vector storage and retrieval with local persistence
+    
+    In the "writer" serving role every snapshot also publishes an index
+    generation for read-only worker processes (see ReplicaMemoryStore),
+    and snapshots run every SNAPSHOT_PUBLISH_SECONDS so they stay fresh.
+    
+    Mutations are serialized by the store lock. Searches never take it:
+    they hold their user's partition lock shared, and only writes that
+    change that partition in place take it exclusively.
+    """
     
-    def __init__(self):
+    read_only = False
+    
+    def __init__(self, serving_role: str = SERVING_ROLE):
         self.index = None
-        self.memory_store = []
+        self.embeddings = None
+        self.metadata = None
+        self.next_id = 0
+        self._lock = threading.RLock()
+        self._partition_locks = PartitionLocks()
+        self._wal = None
+        self._closed = threading.Event()
+        self._search_pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="faiss-search")
+        self._migration_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-migration")
+        self._migrating = set()
+        self._snapshot_lock = threading.Lock()
+        self._publisher = SnapshotPublisher(SNAPSHOT_DIR) if serving_role == "writer" else None
         self.load()
+        self._writer = WriteBatcher(self)
+        
+        if self._publisher:
+            # Readers need a generation before they can serve
+            self.snapshot()
+        
+        # Fold the log into a snapshot in the background
+        self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+        self._compactor.start()
     
     def load(self):
         """Load existing data from local disk"""
-        # Load FAISS index
-        try:
-            if os.path.exists('faiss_index.bin'):
-                self.index = faiss.read_index('faiss_index.bin')
-                print(f"✅ Loaded {self.index.ntotal} vectors")
-            else:
-                self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
-                print("✅ Created new index")
-        except Exception as e:
-            print(f"⚠️ Creating new index: {e}")
-            self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
+        # Load metadata first - the index is partitioned by its user_ids
+        self.metadata = MetadataStore(METADATA_FILE)
+        if self.metadata.created and os.path.exists(MEMORY_FILE):
+            self._migrate_json_store()
+        print(f"✅ Loaded {len(self.metadata)} memories")
+        self.next_id = self.metadata.max_id + 1
+        
+        # Load raw embeddings - the index is derived from them
+        self.embeddings = EmbeddingMatrix(EMBEDDINGS_FILE, EMBEDDING_DIM)
+        if self.embeddings.created and os.path.exists(INDEX_FILE):
+            self._migrate_legacy_index()
+        
+        # Replay mutations logged after the snapshot
+        self._wal = WriteAheadLog(WAL_FILE)
+        self._replay_wal()
         
-        # Load memory store
+        self.rebuild_index()
+    
+    def _replay_wal(self):
+        """Apply write-ahead log records on top of the loaded snapshot"""
+        replayed = 0
+        for record in self._wal.replay():
+            op = record.get("op")
+            if op == "add":
+                memory = record["memory"]
+                if self.metadata.contains(memory["id"]):
+                    continue  # Already folded into the snapshot
+                vector = np.frombuffer(base64.b64decode(record["vector"]), dtype='float32')
+                self.embeddings.write([memory["id"]], vector.reshape(1, -1))
+                self.metadata.add(memory)
+            elif op == "clear_user":
+                self.embeddings.clear(self.metadata.remove_user(record["user_id"]))
+            replayed += 1
+        
+        self.next_id = max(self.next_id, self.metadata.max_id + 1)
+        if replayed:
+            print(f"✅ Replayed {replayed} log records")
+    
+    def _migrate_json_store(self):
+        """Import a pre-SQLite memory_store.json snapshot, then set it aside"""
         try:
-            if os.path.exists('memory_store.json'):
-                with open('memory_store.json', 'r') as f:
-                    self.memory_store = json.load(f)
-                print(f"✅ Loaded {len(self.memory_store)} memories")
+            with open(MEMORY_FILE, 'r') as f:
+                memories = json.load(f)
+            
+            # Legacy memories predate stable IDs - their list position was the ID
+            for position, memory in enumerate(memories):
+                memory.setdefault("id", position)
+                self.metadata.add(memory)
+            self.metadata.apply_changes(self.metadata.take_changes())
+            
+            os.replace(MEMORY_FILE, f"{MEMORY_FILE}.migrated")
+            print(f"✅ Migrated {len(memories)} memories from {MEMORY_FILE}")
         except Exception as e:
-            print(f"⚠️ Memory load failed: {e}")
-            self.memory_store = []
+            print(f"⚠️ Memory migration failed: {e}")
     
-    def save(self):
-        """Save data to local disk"""
+    def _migrate_legacy_index(self):
+        """Copy vectors out of a pre-embedding-file faiss_index.bin"""
         try:
-            # Save FAISS index
-            faiss.write_index(self.index, 'faiss_index.bin')
+            legacy = PartitionedIndex.read(INDEX_FILE, EMBEDDING_DIM, self.metadata.owner_of)
+            for _, ids, vectors in legacy.iter_vectors():
+                self.embeddings.write(ids, vectors)
+            self.embeddings.flush()
+            print(f"✅ Migrated {legacy.ntotal} vectors from {INDEX_FILE}")
+        except Exception as e:
+            print(f"⚠️ Legacy index migration failed: {e}")
+    
+    def rebuild_index(self, index_factory: str = INDEX_TYPE, reembed_missing: bool = False) -> int:
+        """
+        Rebuild the FAISS index from the persisted embedding matrix
+        
+        Makes no embedding calls unless reembed_missing is set, so it is safe
+        for index type changes and for repairing a vector/memory count
+        mismatch. Trained types (IVF-PQ) are trained on the stored vectors.
+        
+        Args:
+            index_factory: FAISS index_factory description for each partition,
+                or "auto" to pick Flat / HNSW / IVF-PQ by partition size
+            reembed_missing: Batch re-embed memories with no stored vector
+            
+        Returns:
+            Number of vectors indexed
+        """
+        with self._lock:
+            ids_by_user = self.metadata.ids_by_user()
             
-            # Save memory store
-            with open('memory_store.json', 'w') as f:
-                json.dump(self.memory_store, f, indent=2)
+            if reembed_missing:
+                missing_ids = []
+                for ids in ids_by_user.values():
+                    missing_ids.extend(ids[~self._read_vectors(ids).any(axis=1)].tolist())
+                if missing_ids:
+                    self._reembed(missing_ids)
             
-            print("✅ Saved to disk")
+            # One user's vectors in memory at a time, so peak RAM is the new
+            # index plus a single partition rather than a second full copy
+            index = PartitionedIndex(EMBEDDING_DIM, index_factory)
+            missing_ids = []
+            for user_id, ids in ids_by_user.items():
+                vectors = self._read_vectors(ids)
                 
+                # Rows stored before normalization moved to insert time are fixed up once
+                norms = np.linalg.norm(vectors, axis=1)
+                present = norms > 0
+                stale = present & (np.abs(norms - 1) > 1e-4)
+                if stale.any():
+                    faiss.normalize_L2(vectors)
+                    self.embeddings.write(ids[stale], vectors[stale])
+                
+                missing_ids.extend(ids[~present].tolist())
+                if present.any():
+                    index.add(user_id, ids[present], vectors[present])
+            self.index = index
+            query_cache.clear()
+        
+        if missing_ids:
+            print(f"⚠️ {len(missing_ids)} memories have no stored embedding")
+        print(f"✅ Indexed {index.ntotal} vectors in {len(index.partitions)} partitions ({index_factory})")
+        return index.ntotal
+    
+    def _read_vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Read stored vectors; rows never written (or out of range) are all-zero"""
+        vectors = np.zeros((len(ids), EMBEDDING_DIM), dtype='float32')
+        stored = ids < self.embeddings.capacity
+        vectors[stored] = self.embeddings.read(ids[stored])
+        return vectors
+    
+    def _reembed(self, memory_ids: List[int]):
+        """Embed stored chunk text for memories missing a vector, in batches"""
+        memories = self.metadata.get_many(memory_ids)
+        memory_ids = [memory["id"] for memory in memories]
+        texts = [memory.get("chunk_text") or "" for memory in memories]
+        
+        print(f"🔄 Re-embedding {len(texts)} memories...")
+        vectors = np.array(get_embeddings(texts), dtype='float32')
+        self.embeddings.write(memory_ids, vectors)
+        self.embeddings.flush()
+    
+    def sync(self):
+        """Make logged mutations durable with a single fsync"""
+        self._wal.sync()
+    
+    def save(self):
+        """Make logged mutations durable, logging instead of raising on failure"""
+        try:
+            self.sync()
         except Exception as e:
             print(f"⚠️ Save failed: {e}")
     
+    def snapshot(self):
+        """
+        Fold the write-ahead log into the metadata database and embedding file
+        
+        A writer then publishes the index as of the same cut, once the
+        metadata rows it references are committed.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                self._wal.rotate()
+                changes = self.metadata.take_changes()
+                manifest = self._publisher.stage(self.index, changes) if self._publisher else None
+            
+            try:
+                # Partition files are serialized and written outside the
+                # lock; searches and writes carry on while they reach the disk
+                if manifest:
+                    self._publisher.write(manifest, self._partition_locks)
+                
+                # Flush embeddings before the metadata that references them
+                self.embeddings.flush()
+                
+                # Only rows changed since the last snapshot are written
+                self.metadata.apply_changes(changes)
+            except Exception:
+                # Nothing was committed - retry the cut with the next snapshot,
+                # and keep the rotated log so a crash before then replays it
+                self.metadata.restore_changes(changes)
+                if manifest:
+                    self._publisher.discard(manifest)
+                raise
+            
+            # Only now are the rotated log's records all in the snapshot
+            self._wal.finish_compaction()
+            if manifest:
+                self._publisher.publish(manifest)
+                print(f"📸 Published index generation {manifest['generation']}")
+            print(f"✅ Snapshot saved ({len(changes)} changes, {len(self.metadata)} memories)")
+    
+    def _compaction_loop(self):
+        """Periodically snapshot while the log has records (or, for a writer, the index changed)"""
+        interval = SNAPSHOT_PUBLISH_SECONDS if self._publisher else COMPACTION_INTERVAL_SECONDS
+        while not self._closed.wait(interval):
+            if not self._wal.has_records() and not (self._publisher and self.index.has_changes()):
+                continue
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"⚠️ Compaction failed: {e}")
+    
+    def close(self):
+        """Drain queued writes, stop compaction and write a final snapshot"""
+        self._writer.close()
+        self._search_pool.shutdown(wait=True)
+        self._migration_pool.shutdown(wait=False, cancel_futures=True)
+        self._closed.set()
+        try:
+            self.snapshot()
+        except Exception as e:
+            print(f"⚠️ Final snapshot failed: {e}")
+        self._wal.close()
+        self.metadata.close()
+    
+    @staticmethod
+    def _build_entry(user_id: str, user_msg: str, llm_response: str,
+                     chunk_text: str, chunk_type: str, priority: str, provider: str) -> Dict:
+        """Create a memory entry; its ID is assigned when it is added"""
+        return {
+            "user_id": user_id,
+            "user_message": user_msg,
+            "llm_response": llm_response,
+            "chunk_text": chunk_text,
+            "chunk_type": chunk_type,
+            "priority": priority,
+            "provider": provider,
+            "timestamp": datetime.now().isoformat(),
+            "combined_text": chunk_text
+        }
+    
     def add_memory(self, user_id: str, user_msg: str, llm_response: str,
                    chunk_text: str, chunk_type: str, priority: str, provider: str):
         """
@@ -77,23 +423,184 @@ class MemoryStore:
         # Generate embedding
         embedding = get_embedding(chunk_text, user_id=user_id)
         
-        # Create memory entry
-        memory_entry = {
-            "user_id": user_id,
-            "user_message": user_msg,
-            "llm_response": llm_response,
-            "chunk_text": chunk_text,
-            "chunk_type": chunk_type,
-            "priority": priority,
-            "provider": provider,
-            "timestamp": datetime.now().isoformat(),
-            "combined_text": chunk_text
-        }
+        memory_entry = self._build_entry(
+            user_id, user_msg, llm_response, chunk_text, chunk_type, priority, provider
+        )
+        self.add_memories([memory_entry], np.array([embedding]).astype('float32'))
+    
+    def submit_memory(self, user_id: str, user_msg: str, llm_response: str,
+                      chunk_text: str, chunk_type: str, priority: str, provider: str) -> Future:
+        """
+        Queue a memory chunk for the group-commit writer
+        
+        Takes the same arguments as add_memory.
+        
+        Returns:
+            Future resolving to [memory ID] once it is durable on disk
+        """
+        memory_entry = self._build_entry(
+            user_id, user_msg, llm_response, chunk_text, chunk_type, priority, provider
+        )
+        return self._writer.submit([memory_entry])
+    
+    async def submit_memory_async(self, user_id: str, user_msg: str, llm_response: str,
+                                  chunk_text: str, chunk_type: str, priority: str,
+                                  provider: str) -> int:
+        """
+        Queue a memory chunk and await its durable write
+        
+        Takes the same arguments as add_memory.
+        
+        Returns:
+            Memory ID
+        """
+        memory_ids = await asyncio.wrap_future(self.submit_memory(
+            user_id, user_msg, llm_response, chunk_text, chunk_type, priority, provider
+        ))
+        return memory_ids[0]
+    
+    @classmethod
+    def conversation_entries(cls, user_id: str, user_message: str, llm_response: str,
+                             priority: str = "high", provider: str = "openai") -> List[Dict]:
+        """
+        Split a conversation turn into segment entries
         
-        # Add to FAISS
-        embedding_array = np.array([embedding]).astype('float32')
-        self.index.add(embedding_array)
-        self.memory_store.append(memory_entry)
+        The turn's text is stored once, on the first segment; every segment
+        keeps only its character offsets into conversation_chunk(...), and
+        later segments carry a "segment" number that add_memories turns
+        into a conversation_id pointing at the first.
+        
+        Args:
+            user_id: User identifier
+            user_message: User's message
+            llm_response: LLM's response
+            priority: Priority level (high, medium, low)
+            provider: LLM provider used
+            
+        Returns:
+            Memory entries, one per segment, to be added together
+        """
+        text = conversation_chunk(user_message, llm_response)
+        entries = []
+        for segment, (start, end) in enumerate(split_segments(text)):
+            entry = cls._build_entry(
+                user_id,
+                user_message if segment == 0 else None,
+                llm_response if segment == 0 else None,
+                text[start:end], "conversation", priority, provider
+            )
+            entry["offsets"] = [start, end]
+            if segment:
+                entry["segment"] = segment
+            entries.append(entry)
+        return entries
+    
+    async def submit_conversation_async(self, user_id: str, user_message: str, llm_response: str,
+                                        priority: str = "high", provider: str = "openai") -> List[int]:
+        """
+        Chunk a conversation turn and await the durable write of its segments
+        
+        All segments are embedded in the same batch request.
+        
+        Returns:
+            Memory IDs of the segments, first segment first
+        """
+        entries = self.conversation_entries(user_id, user_message, llm_response, priority, provider)
+        return await asyncio.wrap_future(self._writer.submit(entries))
+    
+    def add_memories(self, entries: List[Dict], vectors: np.ndarray) -> List[int]:
+        """
+        Add a batch of memory entries with precomputed embeddings
+        
+        Args:
+            entries: Memory entries without IDs; the segments of a
+                conversation (see conversation_entries) must be consecutive
+            vectors: Embeddings, shape (n, dim)
+            
+        Returns:
+            Assigned memory IDs, in entry order
+        """
+        # Normalize once here so inner-product scores are cosine similarities
+        vectors = np.array(vectors, dtype='float32')
+        faiss.normalize_L2(vectors)
+        
+        with self._lock:
+            memory_ids = list(range(self.next_id, self.next_id + len(entries)))
+            self.next_id += len(entries)
+            
+            rows_by_user: Dict[str, List[int]] = {}
+            for row, (memory_id, entry) in enumerate(zip(memory_ids, entries)):
+                memory_entry = {"id": memory_id, **entry}
+                segment = memory_entry.pop("segment", 0)
+                if segment:
+                    memory_entry["conversation_id"] = memory_id - segment
+                rows_by_user.setdefault(memory_entry["user_id"], []).append(row)
+                self.metadata.add(memory_entry)
+                self._wal.append({
+                    "op": "add",
+                    "memory": memory_entry,
+                    "vector": base64.b64encode(vectors[row].tobytes()).decode('ascii')
+                })
+            
+            # Raw vectors first, so a search that finds a new ID can re-rank it
+            self.embeddings.write(memory_ids, vectors)
+            
+            # One vectorised add per user partition, keyed by memory ID
+            id_array = np.array(memory_ids, dtype='int64')
+            for user_id, rows in rows_by_user.items():
+                with self._partition_locks[user_id].write():
+                    self.index.add(user_id, id_array[rows], vectors[rows])
+            
+            # After the add, so a search that saw the old generation cannot cache
+            for user_id in rows_by_user:
+                query_cache.invalidate(user_id)
+            
+            outgrown = {}
+            for user_id in rows_by_user:
+                target = self.index.needs_migration(user_id)
+                if target and user_id not in self._migrating:
+                    self._migrating.add(user_id)
+                    outgrown[user_id] = target
+        
+        for user_id, target in outgrown.items():
+            self._migration_pool.submit(self._migrate_partition, user_id, target)
+        
+        return memory_ids
+    
+    def _migrate_partition(self, user_id: str, index_factory: str):
+        """
+        Rebuild one user's partition as a larger index type
+        
+        The new sub-index is built and trained from the embedding matrix
+        without holding the store lock; vectors added meanwhile are copied in
+        before the swap, and the swap is dropped if the partition was cleared
+        or the whole index rebuilt in the meantime.
+        """
+        try:
+            with self._lock:
+                index = self.index
+                current = index.partitions.get(user_id)
+                ids = index.ids(user_id)
+                vectors = self.embeddings.read(ids)
+            
+            print(f"🔄 Migrating {len(ids)} vectors for '{user_id}' to {index_factory}...")
+            partition = index.build_partition(index_factory, ids, vectors)
+            
+            with self._lock:
+                if self.index is not index or index.partitions.get(user_id) is not current:
+                    return
+                added = np.setdiff1d(index.ids(user_id), ids)
+                if len(added):
+                    partition.add_with_ids(self.embeddings.read(added), added)
+                with self._partition_locks[user_id].write():
+                    index.replace_partition(user_id, partition, index_factory)
+                query_cache.invalidate(user_id)
+            print(f"✅ Migrated '{user_id}' to {index_factory}")
+        except Exception as e:
+            print(f"⚠️ Partition migration failed for '{user_id}': {e}")
+        finally:
+            with self._lock:
+                self._migrating.discard(user_id)
     
     def retrieve(self, user_id: str, query: str, top_k: int = 5) -> List[str]:
         """
@@ -107,55 +614,185 @@ class MemoryStore:
         Returns:
             List of relevant text chunks
         """
-        if self.index.ntotal == 0:
-            print("⚠️ Retrieve: Index is empty")
+        return [result["text"] for result in self.retrieve_scored(user_id, query, top_k)]
+    
+    async def retrieve_async(self, user_id: str, query: str, top_k: int = 5) -> List[str]:
+        """
+        Retrieve relevant contexts without blocking the event loop
+        
+        Args:
+            user_id: User identifier
+            query: Search query
+            top_k: Number of results to return
+            
+        Returns:
+            List of relevant text chunks
+        """
+        return [result["text"] for result in await self.retrieve_scored_async(user_id, query, top_k)]
+    
+    def retrieve_scored(self, user_id: str, query: str, top_k: int = 5) -> List[Dict]:
+        """
+        Retrieve relevant memories with their scores and metadata
+        
+        Args:
+            user_id: User identifier
+            query: Search query
+            top_k: Number of results to return
+            
+        Returns:
+            Up to top_k results ordered by priority, then similarity; each has
+            id, text, score, priority, chunk_type and timestamp
+        """
+        if self.index.count(user_id) == 0:
+            print(f"⚠️ Retrieve: No memories for user '{user_id}'")
             return []
         
+        cached = query_cache.get(user_id, query, top_k)
+        if cached is not None:
+            return cached
+        generation = query_cache.generation(user_id)
+        
         print(f"🔍 Retrieving for user '{user_id}', query: '{query[:50]}...'")
         
         # Get query embedding
         query_embedding = get_embedding(query, user_id=user_id)
+        return self._search_cached(user_id, query, query_embedding, top_k, generation)
+    
+    async def retrieve_scored_async(self, user_id: str, query: str, top_k: int = 5,
+                                    timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Retrieve scored memories without blocking the event loop
+        
+        The query is embedded with the async client and the FAISS search runs
+        on the bounded search thread pool. Repeated or near-identical queries
+        are answered from the query cache.
+        
+        Args:
+            user_id: User identifier
+            query: Search query
+            top_k: Number of results to return
+            timings: If given, receives "embed" and "search" stage times in ms
+            
+        Returns:
+            Same structured results as retrieve_scored
+        """
+        if self.index.count(user_id) == 0:
+            print(f"⚠️ Retrieve: No memories for user '{user_id}'")
+            return []
+        
+        cached = query_cache.get(user_id, query, top_k)
+        if cached is not None:
+            return cached
+        generation = query_cache.generation(user_id)
+        
+        print(f"🔍 Retrieving for user '{user_id}', query: '{query[:50]}...'")
+        
+        with timed_stage(timings, "embed"):
+            query_embedding = await get_embedding_async(query, user_id=user_id)
+        
+        loop = asyncio.get_running_loop()
+        with timed_stage(timings, "search"):
+            return await loop.run_in_executor(
+                self._search_pool, self._search_cached, user_id, query, query_embedding, top_k, generation
+            )
+    
+    def _search_cached(self, user_id: str, query: str, query_embedding: List[float],
+                       top_k: int, generation: Tuple[int, int]) -> List[Dict]:
+        """Answer from a cached near-identical query, else search and cache"""
         query_array = np.array([query_embedding]).astype('float32')
+        faiss.normalize_L2(query_array)
         
-        # Search
-        search_k = min(top_k * 2, self.index.ntotal)
-        distances, indices = self.index.search(query_array, search_k)
+        cached = query_cache.get_similar(user_id, query_array[0], top_k)
+        if cached is not None:
+            return cached
         
-        print(f"🔍 Searched {search_k} vectors, examining results...")
+        # Fewer than top_k results only prove there are no more matches when
+        # the partition's range search is exhaustive
+        exhaustive = self.index.is_exhaustive(user_id)
+        results = self._search(user_id, query_array[0], top_k)
+        query_cache.put(user_id, query, query_array[0], top_k, results, generation, exhaustive)
+        return results
+    
+    def _search(self, user_id: str, query_embedding: List[float], top_k: int) -> List[Dict]:
+        """Search the user's partition and order hits by priority, then similarity"""
+        query_array = np.array([query_embedding]).astype('float32')
+        faiss.normalize_L2(query_array)
         
-        # Organize by priority
-        results = {"high": [], "medium": [], "low": []}
-        user_memories_found = 0
+        # Writers mutate partitions in place, so exclude writes to this
+        # user's partition only - other users' searches and writes proceed
+        index = self.index
+        with self._partition_locks[user_id].read():
+            user_count = index.count(user_id)
+            rerank = RERANK_EXACT and index.is_compressed(user_id)
+            
+            # FAISS applies the similarity threshold itself: every qualifying
+            # hit on Flat partitions, and those the wider range search reaches
+            # on HNSW/IVF ones. Compressed scores are approximate, so widen by
+            # a margin and re-score exactly against the raw vectors.
+            threshold = SIMILARITY_THRESHOLD - RERANK_MARGIN if rerank else SIMILARITY_THRESHOLD
+            similarities, indices = index.range_search(user_id, query_array, threshold)
         
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.memory_store) and idx >= 0:
-                memory = self.memory_store[idx]
-                similarity = 1 - (distance / 2)
-                
-                # Filter by user_id
-                if memory.get("user_id") != user_id:
-                    continue
-                
-                # Filter by similarity threshold
-                if similarity < SIMILARITY_THRESHOLD:
-                    continue
-                
-                chunk_text = memory.get("chunk_text", memory.get("combined_text", ""))
-                priority = memory.get("priority", "medium")
-                
-                user_memories_found += 1
-                item = {"text": chunk_text, "similarity": similarity}
-                results[priority].append(item)
+        # A published partition can run ahead of a reader's metadata by the
+        # writes made while it was serialized; those arrive next generation
+        known = self.metadata.known(indices)
+        if not known.all():
+            similarities, indices = similarities[known], indices[known]
+        
+        if rerank:
+            similarities, indices = self._rerank_exact(query_array[0], similarities, indices)
+        
+        print(f"🔍 Searched {user_count} user vectors, examining results...")
+        priorities = self.metadata.priorities(indices)
+        
+        print(f"✅ Found {len(indices)} matches")
         
-        print(f"✅ Found {user_memories_found} matches")
+        # Order by priority, then similarity, from the hot columns alone
+        rank = {priority: position for position, priority in enumerate(PRIORITIES)}
+        ranked = sorted(
+            zip(indices.tolist(), similarities.tolist(), priorities),
+            key=lambda hit: (rank[hit[2]], -hit[1])
+        )[:top_k]
+        
+        # Text is only loaded for the memories actually returned
+        memories = {
+            memory["id"]: memory
+            for memory in self.metadata.get_many(
+                (hit[0] for hit in ranked), fields=("chunk_text", "chunk_type", "timestamp")
+            )
+        }
+        return [
+            {
+                "id": memory_id,
+                "text": memories[memory_id].get("chunk_text") or "",
+                "score": similarity,
+                "priority": priority,
+                "chunk_type": memories[memory_id].get("chunk_type"),
+                "timestamp": memories[memory_id].get("timestamp")
+            }
+            for memory_id, similarity, priority in ranked
+            if memory_id in memories
+        ]
+    
+    def _rerank_exact(self, query: np.ndarray, scores: np.ndarray,
+                      ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-score compressed-index candidates with the stored float32 vectors
         
-        # Sort each priority group by similarity
-        for priority in ["high", "medium", "low"]:
-            results[priority].sort(key=lambda x: x["similarity"], reverse=True)
+        Args:
+            query: Normalized query embedding, shape (dim,)
+            scores: Approximate candidate scores
+            ids: Candidate memory IDs
+            
+        Returns:
+            Tuple of (exact scores, ids) at or above the similarity threshold
+        """
+        if len(ids) > RERANK_MAX_CANDIDATES:
+            best = np.argpartition(-scores, RERANK_MAX_CANDIDATES - 1)[:RERANK_MAX_CANDIDATES]
+            ids = ids[best]
         
-        # Combine results
-        all_results = results["high"] + results["medium"] + results["low"]
-        return [item["text"] for item in all_results[:top_k]]
+        exact = self.embeddings.read(ids) @ query
+        keep = exact >= SIMILARITY_THRESHOLD
+        return exact[keep], ids[keep]
     
     def clear_user_memory(self, user_id: str) -> int:
         """
@@ -167,25 +804,53 @@ class MemoryStore:
         Returns:
             Number of memories cleared
         """
-        initial = len(self.memory_store)
-        self.memory_store = [m for m in self.memory_store if m.get("user_id") != user_id]
-        cleared = initial - len(self.memory_store)
+        # Read the embedded texts before taking the lock; only memories
+        # added in the meantime are read under it
+        read_ids = self.metadata.user_ids(user_id)
+        texts = self._chunk_texts(read_ids)
         
-        if cleared > 0:
-            # Rebuild index
-            self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
-            for memory in self.memory_store:
-                try:
-                    text = memory.get("chunk_text", memory.get("combined_text", ""))
-                    embedding = get_embedding(text)
-                    self.index.add(np.array([embedding]).astype('float32'))
-                except Exception as e:
-                    print(f"⚠️ Re-index warning: {e}")
+        with self._lock:
+            removed_ids = self.metadata.user_ids(user_id)
+            cleared = len(removed_ids)
             
+            if cleared > 0:
+                texts += self._chunk_texts(np.setdiff1d(removed_ids, read_ids))
+                
+                # Vectors are keyed by stable IDs, so no other user's entries move
+                with self._partition_locks[user_id].write():
+                    self.index.remove_ids(user_id, removed_ids)
+                self.embeddings.clear(removed_ids)
+                self.metadata.remove_user(user_id)
+                self._wal.append({"op": "clear_user", "user_id": user_id})
+                query_cache.invalidate(user_id)
+        
+        if cleared > 0:
             self.save()
         
+        # Cached vectors of the user's memories and queries go with them
+        forget_embeddings(texts, user_id)
         return cleared
     
+    def _chunk_texts(self, memory_ids: np.ndarray) -> List[str]:
+        """Embedded text of memories (segments resolved from their turn)"""
+        return [
+            memory.get("chunk_text") or ""
+            for memory in self.metadata.get_many(memory_ids.tolist(), fields=("chunk_text",))
+        ]
+    
+    async def clear_user_memory_async(self, user_id: str) -> int:
+        """
+        Clear all memories for a user without blocking the event loop
+        
+        The log fsync (or, on a read replica, the request to the writer)
+        runs on a worker thread.
+        
+        Returns:
+            Number of memories cleared
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.clear_user_memory, user_id)
+    
     def get_user_memories(self, user_id: str) -> List[Dict]:
         """
         Get all memories for a user
@@ -196,21 +861,88 @@ class MemoryStore:
         Returns:
             List of memory dictionaries
         """
-        return [m for m in self.memory_store if m.get("user_id") == user_id]
+        return self.metadata.get_many(self.metadata.user_ids(user_id))
+    
+    def count_user_memories(self, user_id: str) -> int:
+        """Number of memories stored for a user"""
+        return self.metadata.memory_count(user_id)
+    
+    def get_recent_memories(self, user_id: str, limit: int = 10,
+                            oldest_first: bool = False) -> List[Dict]:
+        """
+        Get a user's memories at one end of their timeline
+        
+        Args:
+            user_id: User identifier
+            limit: Maximum number of memories
+            oldest_first: Take the oldest instead of the newest
+            
+        Returns:
+            Memory dictionaries, newest first (oldest first if requested)
+        """
+        ids, _ = self.metadata.user_ids_page(user_id, limit, newest_first=not oldest_first)
+        return self.metadata.get_many(ids)
+    
+    def get_memories_page(self, user_id: str, limit: int = 100, cursor: Optional[str] = None,
+                          newest_first: bool = False,
+                          fields: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get one page of a user's memories in timeline order
+        
+        Args:
+            user_id: User identifier
+            limit: Page size
+            cursor: next_cursor from the previous page
+            newest_first: Walk the timeline backwards
+            fields: Keys to return (plus "id"); None returns everything
+            
+        Returns:
+            Tuple of (memory dictionaries, cursor for the next page - None on the last)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and (len(after) != 2 or not all(isinstance(v, int) for v in after)):
+            raise ValueError("Invalid cursor")
+        
+        ids, next_key = self.metadata.user_ids_page(user_id, limit, after, newest_first)
+        memories = self.metadata.get_many(ids, fields)
+        return memories, encode_cursor(next_key) if next_key else None
+    
+    def iter_user_memories(self, user_id: str, newest_first: bool = False,
+                           fields: Optional[List[str]] = None,
+                           page_size: int = 500) -> Iterator[Dict]:
+        """
+        Yield all of a user's memories, one page in memory at a time
+        
+        Args:
+            user_id: User identifier
+            newest_first: Walk the timeline backwards
+            fields: Keys to return (plus "id"); None returns everything
+            page_size: Memories loaded per page
+            
+        Yields:
+            Memory dictionaries in timeline order
+        """
+        cursor = None
+        while True:
+            memories, cursor = self.get_memories_page(user_id, page_size, cursor, newest_first, fields)
+            yield from memories
+            if cursor is None:
+                return
     
     def get_stats(self) -> Dict:
         """
-        Get storage statistics
+        Get storage statistics from counters kept up to date on every write
         
         Returns:
             Dictionary with stats
         """
-        # Count unique users
-        unique_users = set(m.get("user_id") for m in self.memory_store if m.get("user_id"))
-        
         return {
-            "total_memories": len(self.memory_store),
+            "total_memories": len(self.metadata),
             "total_vectors": self.index.ntotal,
-            "total_users": len(unique_users),
+            "total_users": self.metadata.user_count(),
+            **self.metadata.usage_today(),
             "storage_type": "Local"
         }
@@ -0,0 +1,639 @@
+"""
+Metadata Store - columnar memory metadata with text in SQLite
+Built with Kiro - a few bytes of RAM per memory instead of a dict of strings
+"""
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.chunker import conversation_chunk
+
+PRIORITIES = ["high", "medium", "low"]
+_PRIORITY_CODES = {priority: code for code, priority in enumerate(PRIORITIES)}
+
+_EPOCH = datetime(1970, 1, 1)
+_TEXT_FIELDS = ("user_id", "user_message", "llm_response", "chunk_text",
+                "chunk_type", "priority", "provider", "timestamp")
+_SQL_BATCH = 900
+
+MEMORY_FIELDS = ("id",) + _TEXT_FIELDS + ("combined_text", "offsets", "conversation_id")
+
+
+def timestamp_to_micros(timestamp: Optional[str]) -> int:
+    """Sortable int64 for an ISO timestamp (0 if missing or unparseable)"""
+    if not timestamp:
+        return 0
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return 0
+    if moment.tzinfo is not None:
+        moment = moment.replace(tzinfo=None) + (moment.utcoffset() or timedelta(0))
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def micros_to_timestamp(micros: int) -> Optional[str]:
+    """ISO timestamp for a value from timestamp_to_micros"""
+    if micros == 0:
+        return None
+    return (_EPOCH + timedelta(microseconds=int(micros))).isoformat()
+
+
+def encode_cursor(key: Sequence) -> str:
+    """Opaque, URL-safe pagination cursor for a sort key"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii').rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode a cursor from encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+class _Interner:
+    """Bidirectional string <-> small integer code table"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class MetadataStore:
+    """
+    Memory metadata split into hot columns and cold text
+
+    User, chunk type, priority and timestamp live in numpy arrays indexed by
+    memory ID, with user IDs and chunk types interned to integer codes. The
+    message, response and chunk text live in a SQLite table and are only
+    read when a memory is returned.
+
+    A secondary index maps each user to their memory IDs ordered by
+    (timestamp, id), maintained on every add and removal, so per-user
+    lookups, counts and "most recent" queries cost O(result) rather than a
+    pass over every memory.
+
+    Today's usage (memories stored and users active) is counted per user as
+    memories are added and removed, and saved with each snapshot so a
+    restart on the same day resumes the counters. `max_id` is a high-water
+    mark saved the same way, so IDs of cleared memories are never reused.
+
+    Changes since the last snapshot are kept in memory; `take_changes` cuts
+    them (alongside the write-ahead log rotation) and `apply_changes` writes
+    them in one transaction.
+
+    Opened read_only, the database is never written and `refresh` brings
+    the columns up to date with changes another process has committed.
+    """
+
+    def __init__(self, path: str, initial_capacity: int = 1024, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.created = not os.path.exists(path)
+        self._lock = threading.RLock()
+        self._db_lock = threading.Lock()
+
+        self._users = _Interner()
+        self._types = _Interner()
+        self._user_codes = np.full(initial_capacity, -1, dtype='int32')
+        self._type_codes = np.full(initial_capacity, -1, dtype='int16')
+        self._priority_codes = np.full(initial_capacity, _PRIORITY_CODES["medium"], dtype='int8')
+        self._timestamps = np.zeros(initial_capacity, dtype='int64')
+        self._count = 0
+        self.max_id = -1
+        # Bumped whenever a user's memories change, so callers can cache per-user stats
+        self.version = 0
+
+        # user code -> memory IDs ordered by (timestamp, id)
+        self._user_index: Dict[int, array] = {}
+        self._user_count = 0
+
+        # user code -> memories timestamped today
+        self._today: Dict[int, int] = {}
+        self._stored_today = 0
+        self._set_day(date.today())
+
+        # Rows not yet written to SQLite, and the ordered ops that produced them
+        self._pending_rows: Dict[int, tuple] = {}
+        self._changes: List[Tuple[str, object]] = []
+
+        if read_only:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self._load_columns()
+            self._load_usage()
+            return
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Snapshots drop the write-ahead log once committed, so commits must be durable
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            "id INTEGER PRIMARY KEY, user_id TEXT, user_message TEXT, llm_response TEXT, "
+            "chunk_text TEXT, chunk_type TEXT, priority TEXT, provider TEXT, timestamp TEXT, "
+            "extra TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS memories_user ON memories (user_id, id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._load_columns()
+        self._load_usage()
+
+    def _load_columns(self):
+        """Read the hot columns for every stored memory"""
+        rows = self._db.execute(
+            "SELECT id, user_id, chunk_type, priority, timestamp FROM memories"
+        ).fetchall()
+        for memory_id, user_id, chunk_type, priority, timestamp in rows:
+            self._set_columns(memory_id, user_id, chunk_type, priority, timestamp)
+            self._user_index.setdefault(self._user_codes[memory_id], array('q')).append(memory_id)
+
+        # Rows come back in arbitrary order - sort each user's IDs once
+        for code, ids in self._user_index.items():
+            ids = np.array(ids, dtype='int64')
+            ordered = ids[np.lexsort((ids, self._timestamps[ids]))]
+            self._user_index[code] = array('q', ordered.tolist())
+        self._user_count = sum(1 for code in self._user_index if self._users.values[code])
+
+    def _load_usage(self):
+        """Restore today's counters and the ID high-water mark from the last snapshot"""
+        self._restore_usage(self._db.execute("SELECT value FROM stats WHERE key = 'today'").fetchone())
+
+        # Cleared rows are gone, but their IDs must never be handed out again
+        saved = self._db.execute("SELECT value FROM stats WHERE key = 'max_id'").fetchone()
+        if saved is not None:
+            self.max_id = max(self.max_id, int(saved[0]))
+
+    def _restore_usage(self, row: Optional[tuple]):
+        if row is None:
+            return
+        saved = json.loads(row[0])
+        if saved.get("day") != self._day.isoformat():
+            return
+        for user_id, count in saved.get("users", {}).items():
+            self._today[self._users.code(user_id)] = count
+            self._stored_today += count
+
+    def _set_day(self, day: date):
+        """Start counting usage for a new day"""
+        self._day = day
+        self._day_start = timestamp_to_micros(datetime.combine(day, datetime.min.time()).isoformat())
+        self._day_end = self._day_start + 86400 * 1_000_000
+        self._today.clear()
+        self._stored_today = 0
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self._day:
+            self._set_day(today)
+
+    def _grow(self, min_size: int):
+        """Double column capacity until memory ID min_size - 1 fits"""
+        capacity = len(self._user_codes)
+        while capacity < min_size:
+            capacity *= 2
+        extra = capacity - len(self._user_codes)
+        self._user_codes = np.concatenate([self._user_codes, np.full(extra, -1, dtype='int32')])
+        self._type_codes = np.concatenate([self._type_codes, np.full(extra, -1, dtype='int16')])
+        self._priority_codes = np.concatenate(
+            [self._priority_codes, np.full(extra, _PRIORITY_CODES["medium"], dtype='int8')]
+        )
+        self._timestamps = np.concatenate([self._timestamps, np.zeros(extra, dtype='int64')])
+
+    def _set_columns(self, memory_id: int, user_id: Optional[str], chunk_type: Optional[str],
+                     priority: Optional[str], timestamp: Optional[str]):
+        if memory_id >= len(self._user_codes):
+            self._grow(memory_id + 1)
+        if self._user_codes[memory_id] < 0:
+            self._count += 1
+
+        self._user_codes[memory_id] = self._users.code(user_id or "")
+        self._type_codes[memory_id] = self._types.code(chunk_type or "")
+        self._priority_codes[memory_id] = _PRIORITY_CODES.get(priority, _PRIORITY_CODES["medium"])
+        self._timestamps[memory_id] = timestamp_to_micros(timestamp)
+        self.max_id = max(self.max_id, memory_id)
+
+    @staticmethod
+    def _to_row(memory: Dict) -> tuple:
+        extra = {
+            key: value for key, value in memory.items()
+            if key not in _TEXT_FIELDS and key not in ("id", "combined_text")
+        }
+        values = [memory.get(field) for field in _TEXT_FIELDS]
+        if "offsets" in memory:
+            # Conversation segments are sliced from the turn's text on read
+            values[_TEXT_FIELDS.index("chunk_text")] = None
+        return (memory["id"], *values, json.dumps(extra) if extra else None)
+
+    @staticmethod
+    def _from_row(row: tuple, columns: Sequence[str] = _TEXT_FIELDS) -> Dict:
+        """Memory dict from (id, *columns, extra)"""
+        memory = {"id": row[0]}
+        memory.update(zip(columns, row[1:-1]))
+        if row[-1]:
+            memory.update(json.loads(row[-1]))
+        # Kept for API compatibility; it always equalled chunk_text
+        if "chunk_text" in memory:
+            memory["combined_text"] = memory["chunk_text"]
+        return memory
+
+    def _index_add(self, memory_id: int):
+        """Insert a memory ID into its user's (timestamp, id) ordered list"""
+        self.version += 1
+        code = int(self._user_codes[memory_id])
+        ids = self._user_index.get(code)
+        if ids is None:
+            ids = self._user_index[code] = array('q')
+            if self._users.values[code]:
+                self._user_count += 1
+        key = (int(self._timestamps[memory_id]), memory_id)
+        if not ids or (int(self._timestamps[ids[-1]]), ids[-1]) <= key:
+            ids.append(memory_id)  # The common case: memories arrive in time order
+        else:
+            position = bisect.bisect_right(ids, key, key=lambda i: (int(self._timestamps[i]), i))
+            ids.insert(position, memory_id)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def user_count(self) -> int:
+        """Number of users with at least one memory"""
+        return self._user_count
+
+    def usage_today(self) -> Dict[str, int]:
+        """Memories stored today and users who stored them"""
+        with self._lock:
+            self._roll_day()
+            return {
+                "memories_stored_today": self._stored_today,
+                "active_users_today": len(self._today)
+            }
+
+    def memory_count(self, user_id: str) -> int:
+        """Number of memories stored for a user"""
+        code = self._users.codes.get(user_id)
+        return len(self._user_index.get(code, ())) if code is not None else 0
+
+    def contains(self, memory_id: int) -> bool:
+        """Whether a memory ID is live"""
+        return 0 <= memory_id < len(self._user_codes) and self._user_codes[memory_id] >= 0
+
+    def known(self, ids: np.ndarray) -> np.ndarray:
+        """Boolean mask of which memory IDs are live"""
+        codes = self._user_codes
+        in_range = ids < len(codes)
+        mask = np.zeros(len(ids), dtype=bool)
+        mask[in_range] = codes[ids[in_range]] >= 0
+        return mask
+
+    def add(self, memory: Dict):
+        """
+        Add a memory with an assigned "id"
+
+        Args:
+            memory: Memory entry as built by MemoryStore
+        """
+        with self._lock:
+            self._set_columns(
+                memory["id"], memory.get("user_id"), memory.get("chunk_type"),
+                memory.get("priority"), memory.get("timestamp")
+            )
+            self._index_add(memory["id"])
+
+            self._roll_day()
+            if self._day_start <= self._timestamps[memory["id"]] < self._day_end:
+                code = int(self._user_codes[memory["id"]])
+                self._today[code] = self._today.get(code, 0) + 1
+                self._stored_today += 1
+
+            self._pending_rows[memory["id"]] = self._to_row(memory)
+            self._changes.append(("add", memory["id"]))
+
+    def remove_user(self, user_id: str) -> np.ndarray:
+        """
+        Remove every memory of a user
+
+        Returns:
+            Removed memory IDs
+        """
+        with self._lock:
+            removed = self._drop_user(user_id)
+            for memory_id in removed.tolist():
+                self._pending_rows.pop(memory_id, None)
+            self._changes.append(("clear_user", user_id))
+            return removed
+
+    def _drop_user(self, user_id: str) -> np.ndarray:
+        """Remove a user's memories from the columns and counters"""
+        self.version += 1
+        removed = self.user_ids(user_id)
+        code = self._users.codes.get(user_id)
+        if self._user_index.pop(code, None) is not None and user_id:
+            self._user_count -= 1
+        self._stored_today -= self._today.pop(code, 0)
+        self._user_codes[removed] = -1
+        self._count -= len(removed)
+        return removed
+
+    def refresh(self, changes: Sequence[Tuple[str, object]]):
+        """
+        Apply changes another process has already committed to SQLite
+
+        Used by read replicas. Replaying a change the columns already
+        reflect (e.g. one loaded at open) is harmless.
+
+        Args:
+            changes: Ordered ("add", memory ID) / ("clear_user", user_id) pairs
+        """
+        added = [key for op, key in changes if op == "add"]
+        rows = {}
+        with self._db_lock:
+            for start in range(0, len(added), _SQL_BATCH):
+                batch = added[start:start + _SQL_BATCH]
+                for row in self._db.execute(
+                    f"SELECT id, user_id, chunk_type, priority, timestamp FROM memories "
+                    f"WHERE id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    rows[row[0]] = row
+            saved = self._db.execute("SELECT value FROM stats WHERE key = 'today'").fetchone()
+
+        with self._lock:
+            for op, key in changes:
+                if op == "add" and key in rows and not self.contains(key):
+                    self._set_columns(*rows[key])
+                    self._index_add(key)
+                elif op == "clear_user":
+                    self._drop_user(key)
+
+            # The writer's counters as of its last snapshot
+            self._set_day(date.today())
+            self._restore_usage(saved)
+
+    def user_ids(self, user_id: str) -> np.ndarray:
+        """Live memory IDs of a user, oldest first"""
+        with self._lock:
+            ids = self._user_index.get(self._users.codes.get(user_id))
+            if not ids:
+                return np.empty(0, dtype='int64')
+            return np.array(ids, dtype='int64')
+
+    def ids_by_user(self) -> Dict[str, np.ndarray]:
+        """Live memory IDs grouped by user, oldest first"""
+        with self._lock:
+            return {
+                self._users.values[code]: np.array(ids, dtype='int64')
+                for code, ids in self._user_index.items()
+                if ids
+            }
+
+    def user_ids_page(self, user_id: str, limit: int, after: Optional[Sequence[int]] = None,
+                      newest_first: bool = False) -> Tuple[np.ndarray, Optional[Tuple[int, int]]]:
+        """
+        One page of a user's timeline from the secondary index
+
+        Args:
+            user_id: User identifier
+            limit: Page size
+            after: Sort key (timestamp, id) of the previous page's last memory
+            newest_first: Walk the timeline backwards
+
+        Returns:
+            Tuple of (memory IDs, sort key to resume after - None on the last page)
+        """
+        with self._lock:
+            ids = self._user_index.get(self._users.codes.get(user_id))
+            if not ids:
+                return np.empty(0, dtype='int64'), None
+
+            sort_key = lambda i: (int(self._timestamps[i]), i)
+            if newest_first:
+                end = len(ids) if after is None else bisect.bisect_left(ids, tuple(after), key=sort_key)
+                start = max(0, end - limit)
+                page = ids[start:end][::-1]
+                more = start > 0
+            else:
+                start = 0 if after is None else bisect.bisect_right(ids, tuple(after), key=sort_key)
+                page = ids[start:start + limit]
+                more = start + limit < len(ids)
+
+            page = np.array(page, dtype='int64')
+            next_key = sort_key(int(page[-1])) if more and len(page) else None
+            return page, next_key
+
+    def iter_user_stats(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        Yield (user_id, memory_count, last_active_micros) per user
+
+        Holds the lock per user rather than for the whole walk.
+        """
+        with self._lock:
+            codes = list(self._user_index)
+        for code in codes:
+            with self._lock:
+                ids = self._user_index.get(code)
+                if not ids or not self._users.values[code]:
+                    continue
+                stats = (self._users.values[code], len(ids), int(self._timestamps[ids[-1]]))
+            yield stats
+
+    def timestamp_of(self, memory_id: int) -> Optional[str]:
+        """Normalized ISO timestamp of a memory, from the hot columns"""
+        if not self.contains(memory_id):
+            return None
+        return micros_to_timestamp(self._timestamps[memory_id])
+
+    def owner_of(self, memory_id: int) -> Optional[str]:
+        """Return the user_id owning a memory ID, if any"""
+        if not self.contains(memory_id):
+            return None
+        return self._users.values[self._user_codes[memory_id]]
+
+    def priorities(self, ids: np.ndarray) -> List[str]:
+        """Priority names for memory IDs"""
+        return [PRIORITIES[code] for code in self._priority_codes[ids]]
+
+    def get_many(self, ids: Iterable[int], fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Load memories, in the order given; unknown IDs are skipped
+
+        Args:
+            ids: Memory IDs
+            fields: Keys to return (plus "id"); None returns everything.
+                Text columns that are not requested are not read.
+
+        Returns:
+            Memory dictionaries
+        """
+        ids = [int(memory_id) for memory_id in ids]
+        if fields is None:
+            columns = _TEXT_FIELDS
+        else:
+            wanted = set(fields)
+            if "combined_text" in wanted:
+                wanted.add("chunk_text")
+            columns = tuple(field for field in _TEXT_FIELDS if field in wanted)
+
+        rows: Dict[int, tuple] = {}
+        with self._lock:
+            live = [memory_id for memory_id in ids if self.contains(memory_id)]
+            stored = []
+            for memory_id in live:
+                row = self._pending_rows.get(memory_id)
+                if row is not None:
+                    rows[memory_id] = row
+                else:
+                    stored.append(memory_id)
+
+        memories = {memory_id: self._from_row(row) for memory_id, row in rows.items()}
+        select = ", ".join(("id",) + columns + ("extra",))
+        with self._db_lock:
+            for start in range(0, len(stored), _SQL_BATCH):
+                batch = stored[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for row in self._db.execute(
+                    f"SELECT {select} FROM memories WHERE id IN ({placeholders})", batch
+                ):
+                    memories[row[0]] = self._from_row(row, columns)
+
+        if fields is None or "chunk_text" in columns:
+            self._resolve_segments(memories)
+
+        if fields is not None:
+            keep = set(fields) | {"id"}
+            memories = {
+                memory_id: {key: value for key, value in memory.items() if key in keep}
+                for memory_id, memory in memories.items()
+            }
+        return [memories[memory_id] for memory_id in live if memory_id in memories]
+
+    def _resolve_segments(self, memories: Dict[int, Dict]):
+        """Fill chunk_text of conversation segments from their turn's stored text"""
+        segments = [
+            memory for memory in memories.values()
+            if memory.get("chunk_text") is None and memory.get("offsets")
+        ]
+        if not segments:
+            return
+
+        heads = {memory.get("conversation_id", memory["id"]) for memory in segments}
+        texts: Dict[int, str] = {}
+        stored = []
+        with self._lock:
+            for head in heads:
+                row = self._pending_rows.get(head)
+                if row is not None:
+                    texts[head] = conversation_chunk(row[2], row[3])
+                else:
+                    stored.append(head)
+
+        head_list = sorted(stored)
+        with self._db_lock:
+            for start in range(0, len(head_list), _SQL_BATCH):
+                batch = head_list[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for head, user_message, llm_response in self._db.execute(
+                    f"SELECT id, user_message, llm_response FROM memories WHERE id IN ({placeholders})",
+                    batch
+                ):
+                    texts[head] = conversation_chunk(user_message, llm_response)
+
+        for memory in segments:
+            text = texts.get(memory.get("conversation_id", memory["id"]))
+            if text is not None:
+                start, end = memory["offsets"]
+                memory["chunk_text"] = memory["combined_text"] = text[start:end]
+
+    def get(self, memory_id: int) -> Optional[Dict]:
+        """Load a single memory"""
+        memories = self.get_many([memory_id])
+        return memories[0] if memories else None
+
+    def take_changes(self) -> List[Tuple[str, object, Optional[tuple]]]:
+        """
+        Cut the changes made since the previous cut
+
+        Returns:
+            Ordered (op, key, row) changes for apply_changes
+        """
+        with self._lock:
+            changes, self._changes = self._changes, []
+            cut = [
+                (op, key, self._pending_rows.get(key) if op == "add" else None)
+                for op, key in changes
+            ]
+            if cut:
+                # Counters as of this cut, so they match the rows written with them
+                usage = {
+                    "day": self._day.isoformat(),
+                    "users": {self._users.values[code]: count for code, count in self._today.items()}
+                }
+                cut.append(("stats", "today", json.dumps(usage)))
+                cut.append(("stats", "max_id", str(self.max_id)))
+            return cut
+
+    def restore_changes(self, changes: List[Tuple[str, object, Optional[tuple]]]):
+        """
+        Put back a cut whose apply_changes failed, ahead of newer changes
+
+        Rows are re-read from the pending rows at the next cut, so changes
+        made since (e.g. a later clear) still win.
+        """
+        with self._lock:
+            self._changes[:0] = [(op, key) for op, key, _ in changes if op != "stats"]
+
+    def apply_changes(self, changes: List[Tuple[str, object, Optional[tuple]]]):
+        """Write a cut of changes to SQLite in one transaction"""
+        if not changes:
+            return
+
+        with self._db_lock:
+            with self._db:
+                for op, key, row in changes:
+                    if op == "add" and row is not None:
+                        self._db.execute(
+                            f"INSERT OR REPLACE INTO memories (id, {', '.join(_TEXT_FIELDS)}, extra) "
+                            f"VALUES ({','.join('?' * (len(_TEXT_FIELDS) + 2))})",
+                            row
+                        )
+                    elif op == "clear_user":
+                        self._db.execute("DELETE FROM memories WHERE user_id = ?", (key,))
+                    elif op == "stats":
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)", (key, row)
+                        )
+
+        # Written rows are now served from SQLite
+        with self._lock:
+            for op, key, row in changes:
+                if op == "add" and row is not None and self._pending_rows.get(key) is row:
+                    del self._pending_rows[key]
+
+    def close(self):
+        """Close the database"""
+        with self._db_lock:
+            self._db.close()
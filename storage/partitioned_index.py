@@ -0,0 +1,512 @@
+"""
+Partitioned Index - per-user FAISS sub-indexes
+Built with Kiro - search cost scales with the caller's memories, not the corpus
+"""
+import math
+import faiss
+import numpy as np
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+from core.config import (
+    INDEX_TYPE, HNSW_MIN_VECTORS, IVFPQ_MIN_VECTORS, HNSW_M, HNSW_EF_SEARCH, IVFPQ_M, IVF_NPROBE,
+    HNSW_RANGE_EF_SEARCH, IVF_RANGE_NPROBE, INDEX_COMPRESSION
+)
+
+# Sub-index families, smallest/most exact first; "auto" only ever moves up
+_FAMILY_RANK = {"Flat": 0, "HNSW": 1, "IVF": 2}
+
+# Vector encodings per compression setting, as (Flat-tier, HNSW-tier) factory
+# suffixes. PQ needs a few thousand training vectors, so small partitions use
+# SQ8. HNSW over PQ codes only supports L2, so with "pq" the middle tier is
+# IVF-PQ instead (None).
+_ENCODINGS = {
+    "none": ("Flat", "Flat"),
+    "fp16": ("SQfp16", "SQfp16"),
+    "sq8": ("SQ8", "SQ8"),
+    "pq": ("SQ8", None),
+}
+
+
+class PartitionedIndex:
+    """
+    One ID-mapped FAISS sub-index per user
+
+    Every vector carries the ID of the memory it belongs to, so a search only
+    touches the calling user's partition and hits map straight back to memory
+    entries without any user_id post-filtering.
+
+    Vectors are expected to be L2-normalized and every sub-index uses the
+    inner-product metric, so scores are cosine similarities.
+
+    Sub-indexes are built from a FAISS index_factory description ("Flat",
+    "HNSW32", "IVF1024,PQ96", ...); untrained types are trained on the
+    vectors they are built from. With "auto" each partition gets a type
+    for its size: exact Flat for small partitions, HNSW once brute force
+    gets slow, and IVF-PQ once raw float vectors no longer fit comfortably
+    in RAM. The compression setting swaps the float vectors kept by the
+    Flat and HNSW tiers for fp16 (2x) or SQ8 (4x) codes; "pq" uses SQ8 for
+    Flat and moves straight to IVF-PQ (64x) where HNSW would start.
+
+    Partitions too small to train their type (fewer vectors than IVF lists
+    or PQ centroids) are built with the Flat-tier encoding instead and
+    migrated once they have grown enough.
+
+    Types that cannot score by inner product (e.g. "HNSW32,PQ96", which
+    FAISS only builds for L2) are rejected with ValueError.
+    """
+
+    def __init__(self, dim: int, index_factory: str = INDEX_TYPE,
+                 hnsw_min_vectors: int = HNSW_MIN_VECTORS,
+                 ivfpq_min_vectors: int = IVFPQ_MIN_VECTORS,
+                 ef_search: int = HNSW_EF_SEARCH, nprobe: int = IVF_NPROBE,
+                 compression: str = INDEX_COMPRESSION,
+                 range_ef_search: int = HNSW_RANGE_EF_SEARCH, range_nprobe: int = IVF_RANGE_NPROBE):
+        if compression not in _ENCODINGS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {list(_ENCODINGS)}")
+        if index_factory != "auto":
+            self._new_index(dim, index_factory)  # Fail at startup, not on the first add
+
+        self.dim = dim
+        self.index_factory = index_factory
+        self.compression = compression
+        self.hnsw_min_vectors = hnsw_min_vectors
+        self.ivfpq_min_vectors = ivfpq_min_vectors
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.range_ef_search = range_ef_search
+        self.range_nprobe = range_nprobe
+        self.partitions: Dict[str, faiss.IndexIDMap2] = {}
+        self.partition_factories: Dict[str, str] = {}
+        self._training_minimums: Dict[str, int] = {}
+        self._ntotal = 0
+        # Users whose partition changed since the last take_dirty
+        self._dirty: Set[str] = set()
+
+    @property
+    def ntotal(self) -> int:
+        """Total number of vectors across all partitions"""
+        return self._ntotal
+
+    def _partition(self, user_id: str) -> Optional[faiss.Index]:
+        """A user's sub-index, if they have one"""
+        return self.partitions.get(user_id)
+
+    def count(self, user_id: str) -> int:
+        """Number of vectors stored for a user"""
+        partition = self._partition(user_id)
+        return partition.ntotal if partition is not None else 0
+
+    def ids(self, user_id: str) -> np.ndarray:
+        """Memory IDs stored in a user's partition"""
+        partition = self._partition(user_id)
+        if partition is None:
+            return np.empty(0, dtype='int64')
+        return faiss.vector_to_array(partition.id_map).astype('int64')
+
+    def factory_for(self, n: int) -> str:
+        """
+        Pick the index_factory description for a partition of n vectors
+
+        Args:
+            n: Partition size
+
+        Returns:
+            Configured factory, or the size-based choice in "auto" mode
+        """
+        flat_encoding, hnsw_encoding = _ENCODINGS[self.compression]
+        if self.index_factory != "auto":
+            index_factory = self.index_factory
+        elif n < self.hnsw_min_vectors:
+            return flat_encoding
+        elif n < self.ivfpq_min_vectors and hnsw_encoding is not None:
+            return f"HNSW{HNSW_M}" if hnsw_encoding == "Flat" else f"HNSW{HNSW_M},{hnsw_encoding}"
+        else:
+            # ~4*sqrt(n) inverted lists, rounded to a power of two
+            nlist = 1 << max(4, round(math.log2(4 * math.sqrt(n))))
+            index_factory = f"IVF{nlist},PQ{IVFPQ_M}"
+
+        # k-means cannot train more centroids than it has points, so a
+        # partition too small for the trained type starts out Flat
+        if n < self.min_training_vectors(index_factory):
+            return flat_encoding
+        return index_factory
+
+    def min_training_vectors(self, index_factory: str) -> int:
+        """
+        Smallest partition an index type can be trained on
+
+        Args:
+            index_factory: FAISS index_factory description
+
+        Returns:
+            Number of IVF lists or PQ centroids, whichever is larger; 0 for
+            types that train on any number of vectors
+        """
+        minimum = self._training_minimums.get(index_factory)
+        if minimum is None:
+            inner = self._new_index(self.dim, index_factory)
+            ivf = faiss.try_extract_index_ivf(inner)
+            minimum = ivf.nlist if ivf is not None else 0
+            pq = getattr(faiss.downcast_index(ivf if ivf is not None else inner), "pq", None)
+            if pq is not None:
+                minimum = max(minimum, 1 << pq.nbits)
+            self._training_minimums[index_factory] = minimum
+        return minimum
+
+    @staticmethod
+    def _family(index_factory: str) -> str:
+        for family in ("HNSW", "IVF"):
+            if index_factory.startswith(family):
+                return family
+        return "Flat"
+
+    def needs_migration(self, user_id: str) -> Optional[str]:
+        """
+        Check whether a partition has outgrown its index type
+
+        In "auto" mode this only moves to a larger family so a partition
+        hovering around a threshold is not rebuilt back and forth. With a
+        fixed trained type it moves a partition that started out Flat to the
+        configured type once it has enough vectors to train it.
+
+        Returns:
+            Target index_factory description, or None
+        """
+        if user_id not in self.partitions:
+            return None
+
+        current = self.partition_factories[user_id]
+        target = self.factory_for(self.count(user_id))
+        if self.index_factory != "auto":
+            return target if target == self.index_factory != current else None
+        if _FAMILY_RANK[self._family(target)] > _FAMILY_RANK[self._family(current)]:
+            return target
+        return None
+
+    def is_exhaustive(self, user_id: str) -> bool:
+        """Whether range_search on a partition is guaranteed to find every qualifying vector"""
+        return self._family(self.partition_factories.get(user_id, "Flat")) == "Flat"
+
+    def is_compressed(self, user_id: str) -> bool:
+        """Whether a partition stores lossy codes, so its scores are approximate"""
+        index_factory = self.partition_factories.get(user_id, "Flat")
+        return "SQ" in index_factory or "PQ" in index_factory
+
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+        """
+        Retune query-time accuracy/latency on every partition
+
+        Args:
+            ef_search: HNSW candidate list size
+            nprobe: Number of IVF lists visited per query
+        """
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if nprobe is not None:
+            self.nprobe = nprobe
+        for partition in self.partitions.values():
+            self._tune(partition)
+
+    def _tune(self, partition: faiss.IndexIDMap2):
+        """Apply the current search parameters to a sub-index"""
+        inner = faiss.downcast_index(partition.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = self.ef_search
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+
+    def build_partition(self, index_factory: str, ids: np.ndarray,
+                        vectors: np.ndarray) -> faiss.IndexIDMap2:
+        """
+        Build a trained, populated sub-index without registering it
+
+        Args:
+            index_factory: FAISS index_factory description
+            ids: Memory IDs, shape (n,)
+            vectors: Embeddings, shape (n, dim)
+
+        Returns:
+            ID-mapped sub-index
+
+        Raises:
+            ValueError: If the type does not support inner-product search
+        """
+        inner = self._new_index(self.dim, index_factory)
+        self._disable_polysemous_training(inner)
+
+        partition = faiss.IndexIDMap2(inner)
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if not partition.is_trained:
+            partition.train(self._training_sample(vectors))
+        partition.add_with_ids(vectors, np.ascontiguousarray(ids, dtype='int64'))
+        self._tune(partition)
+        return partition
+
+    @staticmethod
+    def _new_index(dim: int, index_factory: str) -> faiss.Index:
+        """Create an empty inner-product index, rejecting types that ignore the metric"""
+        index = faiss.index_factory(dim, index_factory, faiss.METRIC_INNER_PRODUCT)
+        if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            # Scores would be L2 distances, breaking thresholds and ordering
+            raise ValueError(f"Index type '{index_factory}' does not support inner-product search")
+        return index
+
+    @staticmethod
+    def _disable_polysemous_training(index: faiss.Index):
+        """
+        Skip polysemous training on PQ-based indexes
+
+        It only serves Hamming pre-filtering, which we never enable, and it
+        dominates PQ training time.
+        """
+        ivf = faiss.try_extract_index_ivf(index)
+        candidates = [faiss.downcast_index(ivf)] if ivf is not None else []
+        inner = faiss.downcast_index(index)
+        candidates.append(inner)
+        if isinstance(inner, faiss.IndexHNSW):
+            candidates.append(faiss.downcast_index(inner.storage))
+
+        for candidate in candidates:
+            if hasattr(candidate, "do_polysemous_training"):
+                candidate.do_polysemous_training = False
+
+    @staticmethod
+    def _training_sample(vectors: np.ndarray, max_rows: int = 256 * 1024) -> np.ndarray:
+        """Bound training cost on very large partitions with a random sample"""
+        if len(vectors) <= max_rows:
+            return vectors
+        rows = np.random.default_rng(0).choice(len(vectors), max_rows, replace=False)
+        return np.ascontiguousarray(vectors[np.sort(rows)])
+
+    def replace_partition(self, user_id: str, partition: faiss.IndexIDMap2, index_factory: str):
+        """
+        Swap in a rebuilt sub-index for a user
+
+        Args:
+            user_id: User identifier
+            partition: Sub-index from build_partition
+            index_factory: Description it was built from
+        """
+        self._ntotal += partition.ntotal - self.count(user_id)
+        self.partitions[user_id] = partition
+        self.partition_factories[user_id] = index_factory
+        self._dirty.add(user_id)
+
+    def add(self, user_id: str, ids: np.ndarray, vectors: np.ndarray):
+        """
+        Add vectors to a user's partition
+
+        Args:
+            user_id: User identifier
+            ids: Memory IDs, shape (n,)
+            vectors: Embeddings, shape (n, dim)
+        """
+        partition = self.partitions.get(user_id)
+        if partition is None:
+            index_factory = self.factory_for(len(ids))
+            self.replace_partition(user_id, self.build_partition(index_factory, ids, vectors), index_factory)
+            return
+
+        partition.add_with_ids(
+            np.ascontiguousarray(vectors, dtype='float32'),
+            np.ascontiguousarray(ids, dtype='int64')
+        )
+        self._ntotal += len(ids)
+        self._dirty.add(user_id)
+
+    def search(self, user_id: str, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search a single user's partition
+
+        Args:
+            user_id: User identifier
+            query: Query embedding, shape (1, dim)
+            k: Number of neighbours
+
+        Returns:
+            Tuple of (scores, ids) for the first query row, best first
+        """
+        partition = self._partition(user_id)
+        if partition is None or partition.ntotal == 0 or k <= 0:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64')
+
+        k = min(k, partition.ntotal)
+        scores, ids = partition.search(np.ascontiguousarray(query, dtype='float32'), k)
+        return scores[0], ids[0]
+
+    def range_search(self, user_id: str, query: np.ndarray,
+                     threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the vectors in a user's partition scoring above a threshold
+
+        Exhaustive on Flat partitions. HNSW and IVF only score the vectors
+        their graph walk or probed lists reach, so they search with the
+        larger range_ef_search / range_nprobe, and can still miss a few.
+
+        Args:
+            user_id: User identifier
+            query: Normalized query embedding, shape (1, dim)
+            threshold: Minimum cosine similarity
+
+        Returns:
+            Tuple of (scores, ids) for the first query row, unordered
+        """
+        partition = self._partition(user_id)
+        if partition is None or partition.ntotal == 0:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64')
+
+        query = np.ascontiguousarray(query, dtype='float32')
+        params = self._range_params(partition.index)
+        if params is None:
+            lims, scores, ids = partition.range_search(query, threshold)
+            return scores[lims[0]:lims[1]], ids[lims[0]:lims[1]]
+
+        # The ID map wrapper does not forward search parameters, so search
+        # the sub-index and translate its row numbers here
+        lims, scores, rows = partition.index.range_search(query, threshold, params=params)
+        id_map = faiss.rev_swig_ptr(partition.id_map.data(), partition.id_map.size())
+        return scores[lims[0]:lims[1]], id_map[rows[lims[0]:lims[1]]].astype('int64')
+
+    def _range_params(self, index: faiss.Index) -> Optional[faiss.SearchParameters]:
+        """Wider search parameters for range queries on approximate sub-indexes"""
+        inner = faiss.downcast_index(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=max(self.ef_search, self.range_ef_search))
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is not None:
+            return faiss.SearchParametersIVF(nprobe=min(ivf.nlist, max(self.nprobe, self.range_nprobe)))
+        return None
+
+    def remove_ids(self, user_id: str, ids: np.ndarray) -> int:
+        """
+        Remove specific memory IDs from a user's partition
+
+        Args:
+            user_id: User identifier
+            ids: Memory IDs to remove
+
+        Returns:
+            Number of vectors removed
+        """
+        partition = self.partitions.get(user_id)
+        if partition is None or len(ids) == 0:
+            return 0
+
+        # Dropping a whole partition works for every type, including HNSW
+        if np.isin(self.ids(user_id), ids).all():
+            return self.remove_user(user_id)
+
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype='int64'))
+        removed = partition.remove_ids(selector)
+        self._ntotal -= removed
+        self._dirty.add(user_id)
+        if partition.ntotal == 0:
+            self.remove_user(user_id)
+        return removed
+
+    def remove_user(self, user_id: str) -> int:
+        """
+        Drop a user's partition
+
+        Returns:
+            Number of vectors removed
+        """
+        partition = self.partitions.pop(user_id, None)
+        self.partition_factories.pop(user_id, None)
+        if partition is None:
+            return 0
+
+        self._dirty.add(user_id)
+        self._ntotal -= partition.ntotal
+        return partition.ntotal
+
+    def has_changes(self) -> bool:
+        """Whether any partition changed since the last take_dirty"""
+        return bool(self._dirty)
+
+    def take_dirty(self) -> Set[str]:
+        """Users whose partition was added to, rebuilt or removed since the last call"""
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    @staticmethod
+    def serialize_partition(partition: faiss.IndexIDMap2) -> np.ndarray:
+        """
+        Serialize a sub-index for read-only serving
+
+        It is serialized as a plain IndexIDMap: readers only search, so they
+        skip IndexIDMap2's reverse ID table, which would otherwise be
+        rebuilt in every worker's heap. The caller must keep writers off the
+        partition (its partition lock, held shared) while it is copied.
+
+        Args:
+            partition: A sub-index from `partitions`
+
+        Returns:
+            Index file contents (uint8)
+        """
+        shared = faiss.IndexIDMap(faiss.IndexFlatIP(partition.d))
+        shared.index = partition.index
+        shared.ntotal = partition.ntotal
+        shared.is_trained = partition.is_trained
+        faiss.copy_array_to_vector(faiss.vector_to_array(partition.id_map), shared.id_map)
+        return faiss.serialize_index(shared)
+
+    def iter_vectors(self) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Yield (user_id, ids, vectors) per partition
+
+        Only valid for sub-index types that support reconstruct (e.g. Flat).
+        """
+        for user_id, partition in self.partitions.items():
+            if partition.ntotal == 0:
+                continue
+            ids = faiss.vector_to_array(partition.id_map).astype('int64')
+            yield user_id, ids, partition.index.reconstruct_n(0, partition.ntotal)
+
+    @classmethod
+    def read(cls, path: str, dim: int,
+             owner_of: Callable[[int], Optional[str]]) -> "PartitionedIndex":
+        """
+        Read a legacy FAISS file and split it into per-user partitions
+
+        Accepts both a merged ID-mapped flat index and the original global
+        IndexFlatL2, whose vector positions are memory IDs.
+
+        Args:
+            path: Source file
+            dim: Embedding dimension
+            owner_of: Maps a memory ID to its user_id (None if unknown)
+
+        Returns:
+            Populated PartitionedIndex
+        """
+        index = faiss.read_index(path)
+        partitioned = cls(dim, "Flat")
+        if index.ntotal == 0:
+            return partitioned
+
+        if hasattr(index, "id_map"):
+            ids = faiss.vector_to_array(index.id_map).astype('int64')
+            vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        else:
+            ids = np.arange(index.ntotal, dtype='int64')
+            vectors = index.reconstruct_n(0, index.ntotal)
+
+        rows_by_user: Dict[str, list] = {}
+        orphans = 0
+        for row, memory_id in enumerate(ids):
+            owner = owner_of(int(memory_id))
+            if owner is None:
+                orphans += 1
+                continue
+            rows_by_user.setdefault(owner, []).append(row)
+
+        for user_id, rows in rows_by_user.items():
+            partitioned.add(user_id, ids[rows], vectors[rows])
+
+        if orphans:
+            print(f"⚠️ Dropped {orphans} vectors with no matching memory")
+
+        return partitioned
@@ -0,0 +1,200 @@
+"""
+Replica Store - read-only MemoryStore for multi-process serving
+Built with Kiro - readers scale out, one writer owns every mutation
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import quote
+
+import httpx
+
+from core.config import (
+    EMBEDDING_DIM, METADATA_FILE, EMBEDDINGS_FILE, SEARCH_THREADS, SNAPSHOT_DIR,
+    SNAPSHOT_POLL_SECONDS, WRITER_URL, ADMIN_API_KEY
+)
+from core.llm import forget_embeddings
+from core.query_cache import query_cache
+from storage.embedding_matrix import EmbeddingMatrix
+from storage.index_snapshot import ReadOnlyStoreError, SnapshotIndex, current_generation, read_manifest
+from storage.memory_store import MemoryStore
+from storage.metadata_store import MetadataStore
+from storage.rw_lock import PartitionLocks
+
+
+class ReplicaMemoryStore(MemoryStore):
+    """
+    MemoryStore serving the writer's published snapshots, read-only
+
+    The index partitions are memory-mapped from the current generation,
+    the embedding file is mapped read-only and metadata is read from the
+    writer's SQLite database, so any number of worker processes share one
+    copy of the data through the page cache. A watcher thread polls for new
+    generations and swaps them in: unchanged partitions stay mapped and
+    metadata is caught up by replaying each generation's changes.
+
+    Conversation writes and user clears are forwarded to the writer over
+    HTTP and become visible here with the next published generation.
+    Other mutations (direct adds, rebuilds, imports) must be sent to the
+    writer and raise ReadOnlyStoreError.
+    """
+
+    read_only = True
+
+    def __init__(self, directory: str = SNAPSHOT_DIR, writer_url: str = WRITER_URL):
+        # No write-ahead log, write batcher or compaction - the writer owns those
+        self.directory = directory
+        self.writer_url = writer_url.rstrip("/")
+        self.index = None
+        self.embeddings = None
+        self.metadata = None
+        self.generation = None
+        self._retired = None
+        self._lock = threading.RLock()
+        self._partition_locks = PartitionLocks()  # Never written - snapshots are immutable
+        self._closed = threading.Event()
+        self._search_pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="faiss-search")
+        self._client = httpx.Client(timeout=30)
+        self.load()
+
+        self._watcher = threading.Thread(target=self._watch_loop, daemon=True)
+        self._watcher.start()
+
+    def load(self):
+        """Open the current generation, waiting for the writer's first publish"""
+        generation = current_generation(self.directory)
+        if generation is None:
+            print(f"⏳ Waiting for the writer to publish a snapshot in {self.directory}/...")
+            while generation is None and not self._closed.wait(SNAPSHOT_POLL_SECONDS):
+                generation = current_generation(self.directory)
+
+        manifest = read_manifest(self.directory, generation)
+        self.metadata = MetadataStore(METADATA_FILE, read_only=True)
+        self.embeddings = EmbeddingMatrix(EMBEDDINGS_FILE, EMBEDDING_DIM, read_only=True)
+        self.index = SnapshotIndex(self.directory, manifest)
+        self.generation = generation
+        print(f"✅ Serving generation {generation}: {self.index.ntotal} vectors, {len(self.metadata)} memories")
+
+    def refresh(self) -> bool:
+        """
+        Swap in the latest published generation, if there is a newer one
+
+        Returns:
+            Whether a new generation was swapped in
+        """
+        generation = current_generation(self.directory)
+        if generation is None or generation == self.generation:
+            return False
+
+        manifest = read_manifest(self.directory, generation)
+        if manifest is None:
+            return False  # Pruned already - pick up the next one
+
+        # Replay every generation since ours; reload if one is gone or asks for it
+        changes = []
+        for between in range(self.generation + 1, generation + 1):
+            published = manifest if between == generation else read_manifest(self.directory, between)
+            if published is None or published["reload_metadata"]:
+                changes = None
+                break
+            changes.extend(published["changes"])
+
+        if changes is None:
+            metadata = MetadataStore(METADATA_FILE, read_only=True)
+        else:
+            metadata = self.metadata
+            metadata.refresh(changes)
+        embeddings = EmbeddingMatrix(EMBEDDINGS_FILE, EMBEDDING_DIM, read_only=True)
+        index = SnapshotIndex(self.directory, manifest, previous=self.index)
+
+        with self._lock:
+            if metadata is not self.metadata:
+                # Closed one swap later, once searches that fetched it are done
+                if self._retired is not None:
+                    self._retired.close()
+                self._retired = self.metadata
+            self.metadata = metadata
+            self.embeddings = embeddings
+            self.index = index
+            self.generation = generation
+            query_cache.clear()
+        return True
+
+    def _watch_loop(self):
+        """Poll for new generations until closed"""
+        while not self._closed.wait(SNAPSHOT_POLL_SECONDS):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Snapshot refresh failed: {e}")
+
+    def close(self):
+        """Stop the watcher and release the mapped snapshot"""
+        self._closed.set()
+        self._search_pool.shutdown(wait=True)
+        self._client.close()
+        if self._retired is not None:
+            self._retired.close()
+        if self.metadata is not None:
+            self.metadata.close()
+
+    def _forward(self, method: str, path: str, **kwargs) -> Dict:
+        """Send a write to the writer process"""
+        response = self._client.request(
+            method, f"{self.writer_url}{path}", params={"admin_key": ADMIN_API_KEY}, **kwargs
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def submit_conversation_async(self, user_id: str, user_message: str, llm_response: str,
+                                        priority: str = "high", provider: str = "openai") -> List[int]:
+        """
+        Forward a conversation turn to the writer and await its durable write
+
+        Returns:
+            Memory IDs of the segments, first segment first
+        """
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, lambda: self._forward(
+            "POST", "/admin/conversations",
+            json={
+                "user_id": user_id,
+                "user_message": user_message,
+                "llm_response": llm_response,
+                "priority": priority,
+                "provider": provider
+            }
+        ))
+        return response["memory_ids"]
+
+    def clear_user_memory(self, user_id: str) -> int:
+        """
+        Clear all memories for a user on the writer
+
+        Blocks on the request; async handlers use clear_user_memory_async.
+
+        Returns:
+            Number of memories cleared
+        """
+        # The writer purges the shared disk cache; this worker's memory tier
+        # is dropped here, from the texts as of the generation being served
+        texts = self._chunk_texts(self.metadata.user_ids(user_id))
+        cleared = self._forward("DELETE", f"/admin/users/{quote(user_id, safe='')}")["memories_cleared"]
+        query_cache.invalidate(user_id)
+        forget_embeddings(texts, user_id)
+        return cleared
+
+    def _read_only(self, *args, **kwargs):
+        raise ReadOnlyStoreError(f"Read replica - send writes to the writer at {self.writer_url}")
+
+    add_memory = add_memories = submit_memory = submit_memory_async = _read_only
+    rebuild_index = snapshot = sync = save = _read_only
+
+    def get_stats(self) -> Dict:
+        """Storage statistics as of the generation being served"""
+        return {
+            **super().get_stats(),
+            "serving_role": "reader",
+            "snapshot_generation": self.generation
+        }
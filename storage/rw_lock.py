@@ -0,0 +1,69 @@
+"""
+Read-Write Locks - many concurrent searches, one writer per partition
+Built with Kiro - searches only wait for writes to the partition they read
+"""
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class ReadWriteLock:
+    """
+    Shared/exclusive lock; not reentrant
+
+    Any number of readers hold it together, a writer holds it alone.
+    A waiting writer blocks new readers, so a steady stream of searches
+    cannot starve writes.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock shared"""
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock exclusively"""
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class PartitionLocks:
+    """One ReadWriteLock per user partition, created on first use"""
+
+    def __init__(self):
+        self._locks: Dict[str, ReadWriteLock] = {}
+        self._guard = threading.Lock()
+
+    def __getitem__(self, user_id: str) -> ReadWriteLock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(user_id, ReadWriteLock())
+        return lock
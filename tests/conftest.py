@@ -0,0 +1,15 @@
+"""
+Shared test setup
+Built with Kiro - storage tests run against throwaway directories
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    # Storage paths (and the global embedding cache) are relative to the
+    # working directory - keep anything created at import out of the tree
+    os.chdir(tempfile.mkdtemp(prefix="memory-layer-tests-"))
@@ -0,0 +1,54 @@
+"""
+Admin User Listing Tests - cursor pages over one sorted snapshot
+Built with Kiro - O(page) user listing
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from core.config import EMBEDDING_DIM
+
+
+@pytest.fixture
+def admin(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from core.admin_service import AdminService
+    from storage.memory_store import MemoryStore
+    store = MemoryStore(serving_role="standalone")
+    for n, user_id in enumerate(["u0", "u1", "u2", "u3", "u4"]):
+        entries = [
+            store._build_entry(user_id, "m", "r", f"{user_id} {i}", "conversation", "high", "test")
+            for i in range(n + 1)
+        ]
+        store.add_memories(entries, np.random.default_rng(n).random((n + 1, EMBEDDING_DIM), dtype='float32'))
+    yield AdminService(SimpleNamespace(store=store))
+    store.close()
+
+
+@pytest.mark.parametrize("sort_by", ["memories", "last_active", "user_id"])
+def test_pages_match_the_full_listing(admin, sort_by):
+    everyone = [user["user_id"] for user in admin.iter_users(sort_by)]
+    paged, cursor = [], None
+    while True:
+        users, cursor = admin.get_users_page(sort_by, limit=2, cursor=cursor)
+        paged.extend(user["user_id"] for user in users)
+        if cursor is None:
+            break
+
+    assert paged == everyone
+    assert sorted(everyone) == ["u0", "u1", "u2", "u3", "u4"]
+    if sort_by == "memories":
+        assert everyone == ["u4", "u3", "u2", "u1", "u0"]
+
+
+def test_listing_is_resorted_after_changes(admin, monkeypatch):
+    monkeypatch.setattr("core.admin_service.USER_LIST_CACHE_SECONDS", 0)
+    assert admin.get_users_page("memories", limit=1)[0][0]["user_id"] == "u4"
+    admin.store.clear_user_memory("u4")
+    assert admin.get_users_page("memories", limit=1)[0][0]["user_id"] == "u3"
+
+
+def test_malformed_cursor_is_rejected(admin):
+    with pytest.raises(ValueError):
+        admin.get_users_page("memories", cursor="not-a-cursor")
@@ -0,0 +1,67 @@
+"""
+JWT Cache Tests - verified tokens are reused until they expire
+Built with Kiro - a cached token is never honoured past its exp
+"""
+import time
+
+import jwt
+import pytest
+
+import core.auth as auth
+from core.auth import VerifiedTokenCache
+
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = VerifiedTokenCache(max_entries=10, max_ttl=300)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    monkeypatch.setattr(auth, "SUPABASE_JWT_SECRET", SECRET)
+    return cache
+
+
+def _token(**claims):
+    return jwt.encode({
+        "sub": "alice", "iss": auth.SUPABASE_JWT_ISSUER, "aud": auth.SUPABASE_JWT_AUDIENCE,
+        "exp": int(time.time()) + 3600, **claims
+    }, SECRET, algorithm="HS256")
+
+
+def test_second_verification_is_a_cache_hit(cache, monkeypatch):
+    token = _token()
+    decode = jwt.decode
+    decoded = []
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: decoded.append(1) or decode(*a, **kw))
+
+    first = auth.verify_bearer_token(f"Bearer {token}")
+    second = auth.verify_bearer_token(f"Bearer {token}")
+
+    assert first == second and first["sub"] == "alice"
+    assert len(decoded) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_expire_at_the_token_exp(cache, monkeypatch):
+    now = time.time()
+    cache.put("token", {"sub": "alice", "exp": now + 60})
+    assert cache.get("token")["sub"] == "alice"
+
+    monkeypatch.setattr(auth.time, "time", lambda: now + 61)
+    assert cache.get("token") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_max_ttl(cache, monkeypatch):
+    now = time.time()
+    cache.put("token", {"sub": "alice", "exp": now + 3600})
+
+    monkeypatch.setattr(auth.time, "time", lambda: now + 301)
+    assert cache.get("token") is None
+
+
+def test_lru_is_bounded(cache):
+    for i in range(11):
+        cache.put(f"token{i}", {"sub": str(i)})
+    assert cache.get("token0") is None
+    assert cache.get("token10")["sub"] == "10"
@@ -0,0 +1,58 @@
+"""
+Chunker Tests - segment boundaries and reassembly from the stored turn
+Built with Kiro - every segment must read back exactly as it was embedded
+"""
+import numpy as np
+import pytest
+
+from core.chunker import conversation_chunk, split_segments
+from core.config import EMBEDDING_DIM
+
+LONG_RESPONSE = " ".join(f"word{i}" for i in range(600))
+
+
+def test_short_text_is_one_segment():
+    assert split_segments("User: hi\nAssistant: hello", max_tokens=400) == [(0, 25)]
+
+
+def test_segments_cover_text_with_overlap_on_word_breaks():
+    text = conversation_chunk("Tell me everything", LONG_RESPONSE)
+    segments = split_segments(text, max_tokens=100, overlap_tokens=20)
+
+    assert len(segments) > 1
+    assert segments[0][0] == 0 and segments[-1][1] == len(text)
+    for (start, end), (next_start, next_end) in zip(segments, segments[1:]):
+        assert end - start <= 300
+        assert start < next_start < end < next_end  # Neighbours overlap
+        assert text[end - 1] == " " and text[next_start - 1] == " "
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from storage.memory_store import MemoryStore
+    store = MemoryStore(serving_role="standalone")
+    yield store
+    store.close()
+
+
+def test_segments_are_reassembled_from_the_stored_turn(store):
+    entries = store.conversation_entries("alice", "Tell me everything", LONG_RESPONSE)
+    vectors = np.random.default_rng(0).random((len(entries), EMBEDDING_DIM), dtype='float32')
+    head, *rest = store.add_memories(entries, vectors)
+    assert rest
+
+    def check():
+        memories = store.get_user_memories("alice")
+        assert [memory["id"] for memory in memories] == [head, *rest]
+        assert memories[0]["user_message"] == "Tell me everything"
+        assert "conversation_id" not in memories[0]
+        for memory, entry in zip(memories, entries):
+            assert memory["chunk_text"] == entry["chunk_text"]
+        for memory in memories[1:]:
+            assert memory["conversation_id"] == head
+            assert memory["user_message"] is None and memory["llm_response"] is None
+
+    check()  # Sliced from the pending row
+    store.snapshot()
+    check()  # Sliced from the stored row
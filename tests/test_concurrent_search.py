@@ -0,0 +1,84 @@
+"""
+Concurrent Search Tests - searches only wait for writes to their partition
+Built with Kiro - read-write partition locks
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from core.config import EMBEDDING_DIM
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from storage.memory_store import MemoryStore
+    store = MemoryStore(serving_role="standalone")
+    yield store
+    store.close()
+
+
+def _add(store, user_id: str, vectors: np.ndarray) -> list:
+    entries = [
+        store._build_entry(user_id, f"m{i}", "ok", f"{user_id} {i}", "conversation", "high", "test")
+        for i in range(len(vectors))
+    ]
+    return store.add_memories(entries, vectors)
+
+
+def _vectors(n: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random((n, EMBEDDING_DIM), dtype='float32')
+
+
+def test_search_does_not_take_the_store_lock(store):
+    vectors = _vectors(20, 0)
+    _add(store, "alice", vectors)
+
+    with ThreadPoolExecutor(max_workers=1) as pool, store._lock:
+        results = pool.submit(store._search, "alice", vectors[3].tolist(), 1).result(timeout=5)
+    assert results[0]["text"] == "alice 3"
+
+
+def test_search_only_waits_for_its_own_partition(store):
+    _add(store, "alice", _vectors(5, 1))
+    bob = _vectors(5, 2)
+    _add(store, "bob", bob)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with store._partition_locks["alice"].write():
+            blocked = pool.submit(store._search, "alice", bob[0].tolist(), 1)
+            assert pool.submit(store._search, "bob", bob[0].tolist(), 1).result(timeout=5)
+            assert not blocked.done()
+        assert blocked.result(timeout=5) is not None
+
+
+def test_searches_race_adds_and_clears(store):
+    vectors = _vectors(50, 3)
+    _add(store, "alice", vectors)
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                for result in store._search("alice", vectors[0].tolist(), 5):
+                    assert result["text"].startswith("alice")
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    # Enough adds to grow the embedding file several times under the searches
+    for round_ in range(20):
+        _add(store, "alice", _vectors(200, round_))
+        if round_ % 5 == 4:
+            store.clear_user_memory("alice")
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
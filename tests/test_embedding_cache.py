@@ -0,0 +1,79 @@
+"""
+Embedding Cache Tests - bounded disk tier and per-user purges
+Built with Kiro - deleting a user must not leave their vectors behind
+"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+from core.config import EMBEDDING_DIM, EMBEDDING_MODEL
+from core.embedding_cache import EmbeddingCache, embedding_cache
+
+
+def _disk_keys(path) -> set:
+    with sqlite3.connect(path) as db:
+        return {row[0] for row in db.execute("SELECT key FROM embeddings")}
+
+
+def test_disk_tier_keeps_the_newest_rows(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path, max_entries=2, max_disk_entries=3)
+    for i in range(5):
+        cache.put(f"k{i}", [float(i)])
+    cache.put("k2", [2.0])  # Rewriting a row makes it the newest
+
+    assert _disk_keys(path) == {"k2", "k3", "k4"}
+    assert cache.get("k4") == [4.0]
+    assert cache.get("k0") is None
+
+
+def test_purge_drops_keys_and_a_users_entries_from_both_tiers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path, max_entries=10, max_disk_entries=100)
+    cache.put_many({"memory": [1.0], "shared": [2.0]})
+    cache.put("query", [3.0], user_id="alice")
+    cache.put("other", [4.0], user_id="bob")
+
+    assert cache.purge(["memory"], user_id="alice") == 2
+    assert cache.get("memory") is None and cache.get("query") is None
+    assert cache.get("shared") == [2.0] and cache.get("other") == [4.0]
+    assert _disk_keys(path) == {"shared", "other"}
+
+
+def test_tables_from_before_user_tracking_are_upgraded(tmp_path):
+    path = str(tmp_path / "cache.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        db.execute("INSERT INTO embeddings VALUES ('old', ?)", (np.ones(1, dtype='float32').tobytes(),))
+
+    cache = EmbeddingCache(path, max_entries=10)
+    assert cache.get("old") == [1.0]
+    cache.put("new", [2.0], user_id="alice")
+    assert cache.purge([], user_id="alice") == 1
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from storage.memory_store import MemoryStore
+    store = MemoryStore(serving_role="standalone")
+    yield store
+    store.close()
+
+
+def test_clearing_a_user_purges_their_cached_embeddings(store):
+    entries = store.conversation_entries("alice", "hi", " ".join(["word"] * 1000))
+    entries.append(store._build_entry("bob", "q", "a", "bob's memory", "conversation", "high", "test"))
+    store.add_memories(entries, np.random.default_rng(0).random((len(entries), EMBEDDING_DIM)))
+
+    keys = {entry["user_id"] + str(i): embedding_cache.key(EMBEDDING_MODEL, entry["chunk_text"])
+            for i, entry in enumerate(entries)}
+    embedding_cache.put_many({key: [1.0] for key in keys.values()})
+    embedding_cache.put(embedding_cache.key(EMBEDDING_MODEL, "alice's query"), [2.0], user_id="alice")
+
+    store.clear_user_memory("alice")
+
+    for name, key in keys.items():
+        assert (embedding_cache.get(key) is None) == name.startswith("alice")
+    assert embedding_cache.get(embedding_cache.key(EMBEDDING_MODEL, "alice's query")) is None
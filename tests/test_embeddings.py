@@ -0,0 +1,74 @@
+"""
+Embedding Batch Tests - sub-batching, retries and ordering
+Built with Kiro - a flaky sub-batch must not cost the ones that succeeded
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import core.llm as llm
+from core.embedding_cache import EmbeddingCache
+
+
+class FakeEmbeddings:
+    """Embeds "t<n>" as [n, 1]; fails the requests listed in fail_calls"""
+
+    def __init__(self, fail_calls=()):
+        self.requests = []
+        self.fail_calls = set(fail_calls)
+
+    def create(self, model, input):
+        self.requests.append(list(input))
+        if len(self.requests) in self.fail_calls:
+            raise ConnectionError("connection reset")
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[float(text[1:]), 1.0])
+            for i, text in reversed(list(enumerate(input)))  # Any order, by index
+        ])
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm, "embedding_cache", EmbeddingCache(str(tmp_path / "cache.db"), 100))
+    monkeypatch.setattr(llm.time, "sleep", lambda seconds: None)
+    return SimpleNamespace(embeddings=FakeEmbeddings())
+
+
+def _texts(n):
+    # 30 characters each, so 11 estimated tokens
+    return [f"t{i}".ljust(30) for i in range(n)]
+
+
+def test_requests_stay_within_the_token_budget(client):
+    vectors = llm.get_embeddings(_texts(5), client=client, max_items=100, max_tokens=25)
+
+    assert [len(request) for request in client.embeddings.requests] == [2, 2, 1]
+    assert [vector[0] for vector in vectors] == [0, 1, 2, 3, 4]
+
+
+def test_failed_sub_batch_is_retried_alone(client):
+    client.embeddings.fail_calls = {2}
+    vectors = llm.get_embeddings(_texts(4), client=client, max_items=2, max_tokens=1000, max_retries=2)
+
+    requests = client.embeddings.requests
+    assert len(requests) == 3
+    assert requests[1] == requests[2] and requests[0] not in requests[1:]
+    assert [vector[0] for vector in vectors] == [0, 1, 2, 3]
+
+
+def test_retries_give_up_after_max_retries(client):
+    client.embeddings.fail_calls = {1, 2}
+    with pytest.raises(ConnectionError):
+        llm.get_embeddings(_texts(2), client=client, max_retries=1)
+    assert len(client.embeddings.requests) == 2
+
+
+def test_order_is_kept_across_cache_hits_duplicates_and_sub_batches(client):
+    llm.get_embeddings(["t7", "t3"], client=client)
+    client.embeddings.requests.clear()
+
+    texts = ["t5", "t7", "t1", "t5", "t3", "t9", "t2"]
+    vectors = llm.get_embeddings(texts, client=client, max_items=2, max_tokens=1000)
+
+    assert [vector[0] for vector in vectors] == [5, 7, 1, 5, 3, 9, 2]
+    assert client.embeddings.requests == [["t5", "t1"], ["t9", "t2"]]
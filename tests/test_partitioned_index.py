@@ -0,0 +1,75 @@
+"""
+Partitioned Index Tests - tier selection and metric checks
+Built with Kiro - every tier must score by inner product
+"""
+import faiss
+import numpy as np
+import pytest
+
+from storage.partitioned_index import PartitionedIndex
+
+DIM = 192  # PQ96 needs a multiple of 96
+
+
+@pytest.mark.parametrize("compression", ["none", "fp16", "sq8", "pq"])
+def test_auto_tiers_score_by_inner_product(compression):
+    index = PartitionedIndex(DIM, "auto", hnsw_min_vectors=100, ivfpq_min_vectors=100000,
+                             compression=compression)
+    for n in (10, 1000, 200000):
+        assert index._new_index(DIM, index.factory_for(n)).metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def test_pq_skips_hnsw():
+    index = PartitionedIndex(DIM, "auto", hnsw_min_vectors=100, compression="pq")
+    assert index.factory_for(10) == "SQ8"
+    assert index.factory_for(1000).startswith("IVF")
+
+
+def test_l2_only_types_are_rejected():
+    with pytest.raises(ValueError):
+        PartitionedIndex(DIM, "HNSW32,PQ16")
+
+    index = PartitionedIndex(DIM, "auto")
+    vectors = np.random.default_rng(0).random((10, DIM), dtype='float32')
+    with pytest.raises(ValueError):
+        index.build_partition("HNSW32,PQ16", np.arange(10), vectors)
+
+
+def test_trained_type_starts_flat_until_it_can_train():
+    index = PartitionedIndex(DIM, "IVF64,PQ96")
+    rng = np.random.default_rng(0)
+    vectors = rng.random((300, DIM), dtype='float32')
+    faiss.normalize_L2(vectors)
+
+    index.add("alice", np.arange(10), vectors[:10])
+    assert index.partition_factories["alice"] == "Flat"
+    assert index.needs_migration("alice") is None
+
+    index.add("alice", np.arange(10, 300), vectors[10:])
+    target = index.needs_migration("alice")
+    assert target == "IVF64,PQ96"
+    index.replace_partition("alice", index.build_partition(target, index.ids("alice"), vectors), target)
+    assert index.needs_migration("alice") is None
+
+
+@pytest.mark.parametrize("index_factory", ["HNSW32", "IVF64,Flat"])
+def test_range_search_on_approximate_tiers_finds_nearly_every_hit(index_factory):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((10, DIM)).astype('float32')
+    vectors = centers[rng.integers(0, 10, 5000)] + 0.6 * rng.standard_normal((5000, DIM)).astype('float32')
+    faiss.normalize_L2(vectors)
+    query = centers[:1] + 0.6 * rng.standard_normal((1, DIM)).astype('float32')
+    faiss.normalize_L2(query)
+
+    exact = PartitionedIndex(DIM, "Flat")
+    exact.add("alice", np.arange(5000) + 100, vectors)
+    _, expected = exact.range_search("alice", query, 0.55)
+
+    index = PartitionedIndex(DIM, index_factory)
+    index.add("alice", np.arange(5000) + 100, vectors)
+    assert not index.is_exhaustive("alice") and exact.is_exhaustive("alice")
+    _, found = index.range_search("alice", query, 0.55)
+
+    assert len(expected) > 300
+    assert set(found.tolist()) <= set(expected.tolist())
+    assert len(found) >= 0.98 * len(expected)
@@ -0,0 +1,66 @@
+"""
+Query Cache Tests - writes invalidate only the writer's cached results
+Built with Kiro - a search that raced a write must not cache stale hits
+"""
+import numpy as np
+import pytest
+
+from core.config import EMBEDDING_DIM
+from core.query_cache import query_cache
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from storage.memory_store import MemoryStore
+    store = MemoryStore(serving_role="standalone")
+    query_cache.clear()
+    yield store
+    store.close()
+
+
+def _add(store, user_id: str, vector: np.ndarray):
+    entry = store._build_entry(user_id, "q", "a", f"{user_id} memory", "conversation", "high", "test")
+    store.add_memories([entry], vector[None, :])
+
+
+def _search(store, user_id: str, vector: np.ndarray):
+    generation = query_cache.generation(user_id)
+    return store._search_cached(user_id, "what do I like", vector.tolist(), 5, generation)
+
+
+def test_write_invalidates_only_that_users_entries(store):
+    vector = np.ones(EMBEDDING_DIM, dtype='float32')
+    _add(store, "alice", vector)
+    _add(store, "bob", vector)
+    assert len(_search(store, "alice", vector)) == 1
+    assert len(_search(store, "bob", vector)) == 1
+    assert query_cache.get("alice", "What do I  like", 5) is not None
+
+    _add(store, "alice", vector)
+    assert query_cache.get("alice", "what do I like", 5) is None
+    assert query_cache.get("bob", "what do I like", 5) is not None
+    assert len(_search(store, "alice", vector)) == 2
+
+
+def test_search_that_raced_a_write_is_not_cached(store):
+    vector = np.ones(EMBEDDING_DIM, dtype='float32')
+    _add(store, "alice", vector)
+
+    generation = query_cache.generation("alice")
+    results = store._search("alice", vector.tolist(), 5)
+    _add(store, "alice", vector)
+    query_cache.put("alice", "what do I like", None, 5, results, generation)
+
+    assert query_cache.get("alice", "what do I like", 5) is None
+
+
+def test_short_results_from_approximate_search_do_not_answer_larger_top_k(store):
+    results = [{"id": 1, "text": "a", "score": 0.9}]
+    generation = query_cache.generation("alice")
+    query_cache.put("alice", "exact", None, 5, results, generation)
+    query_cache.put("alice", "approximate", None, 5, results, generation, exhaustive=False)
+
+    assert query_cache.get("alice", "exact", 10) == results
+    assert query_cache.get("alice", "approximate", 10) is None
+    assert query_cache.get("alice", "approximate", 3) == results
@@ -0,0 +1,126 @@
+"""
+Rate Limiter Tests - batched usage flushes through increment_usage
+Built with Kiro - no increment is lost between workers or failed flushes
+"""
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import core.rate_limiter as rate_limiter_module
+from core.rate_limiter import RateLimiter
+
+
+class FakeSupabase:
+    """Applies increment_usage deltas to an in-memory usage_tracking table"""
+
+    def __init__(self):
+        self.calls = []
+        self.rows = {}
+        self.tiers = {}
+        self.fail = False
+
+    def table(self, name):
+        assert name == "users"
+        query = SimpleNamespace()
+        query.select = lambda columns: query
+        query.in_ = lambda column, ids: SimpleNamespace(execute=lambda: self._users(ids))
+        return query
+
+    def _users(self, ids):
+        self.calls.append(("users", list(ids)))
+        return SimpleNamespace(data=[{"id": i, "tier": self.tiers[i]} for i in ids if i in self.tiers])
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return SimpleNamespace(execute=lambda: self._execute(name, params))
+
+    def _execute(self, name, params):
+        assert name == "increment_usage"
+        if self.fail:
+            raise ConnectionError("timeout")
+        data = []
+        for delta in params["deltas"]:
+            key = (delta["user_id"], delta["date"])
+            self.rows[key] = self.rows.get(key, 0) + delta.get("api_calls", 0)
+            data.append({"user_id": delta["user_id"], "date": delta["date"], "api_calls": self.rows[key]})
+        return SimpleNamespace(data=data)
+
+
+@pytest.fixture
+def limiter():
+    limiter = RateLimiter()
+    limiter.supabase = FakeSupabase()
+    return limiter
+
+
+def test_flush_merges_increments_per_user_and_day(limiter):
+    today = date.today().isoformat()
+    limiter.increment_usage("alice", "save_prompt")
+    limiter.increment_usage("alice", "save_prompt")
+    limiter.increment_usage("alice", "context")
+    limiter.increment_usage("bob", "context")
+    limiter.increment_usage(f"{RateLimiter.ANONYMOUS_PREFIX}10.0.0.1")
+
+    assert limiter.flush() == 2
+    (name, params), = limiter.supabase.calls
+    deltas = {delta["user_id"]: delta for delta in params["deltas"]}
+    assert deltas["alice"] == {
+        "user_id": "alice", "date": today, "api_calls": 3, "save_prompt_calls": 2, "context_calls": 1
+    }
+    assert deltas["bob"]["api_calls"] == 1
+    assert limiter.flush() == 0  # Nothing left pending
+
+
+def test_flush_adopts_totals_from_other_workers(limiter):
+    today = date.today().isoformat()
+    limiter.supabase.rows[("alice", today)] = 40  # Another worker's flushed calls
+    limiter._used[("alice", today)] = 0
+    limiter.increment_usage("alice")
+
+    limiter.flush()
+    assert limiter._get_used("alice", today) == 41
+
+
+def test_failed_flush_keeps_increments_for_the_next_one(limiter):
+    limiter.increment_usage("alice", "context")
+    limiter.supabase.fail = True
+    assert limiter.flush() == 0
+
+    limiter.increment_usage("alice", "context")
+    limiter.supabase.fail = False
+    assert limiter.flush() == 1
+    delta, = limiter.supabase.calls[-1][1]["deltas"]
+    assert delta["api_calls"] == 2 and delta["context_calls"] == 2
+
+
+def test_expired_tier_is_served_while_the_flusher_reloads_it(limiter):
+    limiter.supabase.tiers["alice"] = "pro"
+    assert limiter._get_tier("alice") == "pro"
+
+    limiter.supabase.tiers["alice"] = "enterprise"
+    limiter._tiers["alice"] = ("pro", time.monotonic() - 1)
+    calls = len(limiter.supabase.calls)
+    assert limiter._get_tier("alice") == "pro"
+    assert len(limiter.supabase.calls) == calls  # No round-trip on the request path
+
+    limiter._refresh_tiers()
+    assert limiter._get_tier("alice") == "enterprise"
+
+
+def test_prune_forgets_idle_users_and_caps_anonymous_callers(limiter, monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "RATE_LIMIT_MAX_ANONYMOUS", 2)
+    today = date.today().isoformat()
+    limiter._used[("carol", "2000-01-01")] = 5
+    for user_id in ("alice", "bob", "ip:1", "ip:2", "ip:3"):
+        limiter._tiers[user_id] = ("free", time.monotonic() + 300)
+        limiter._used[(user_id, today)] = 1
+        limiter._last_seen[user_id] = time.monotonic()
+    limiter._last_seen["alice"] -= 10000
+    limiter._last_seen["ip:1"] -= 10000
+    limiter.increment_usage("bob")
+
+    limiter._prune()
+    assert set(limiter._used) == {("bob", today), ("ip:2", today), ("ip:3", today)}
+    assert "alice" not in limiter._tiers and "bob" in limiter._tiers
@@ -0,0 +1,168 @@
+"""
+Snapshot Recovery Tests - a failed snapshot must not lose memories
+Built with Kiro - WAL + snapshot crash safety
+"""
+import numpy as np
+import pytest
+
+from core.config import EMBEDDING_DIM
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    """Run each test in an empty storage directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _open_store():
+    from storage.memory_store import MemoryStore
+    return MemoryStore(serving_role="standalone")
+
+
+def _add(store, user_id: str, texts: list) -> list:
+    entries = [
+        store._build_entry(user_id, text, "ok", text, "conversation", "high", "test")
+        for text in texts
+    ]
+    vectors = np.random.default_rng(len(texts)).random((len(texts), EMBEDDING_DIM), dtype='float32')
+    return store.add_memories(entries, vectors)
+
+
+def _fail_once(monkeypatch, store):
+    apply_changes = store.metadata.apply_changes
+    calls = []
+
+    def flaky(changes):
+        calls.append(changes)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return apply_changes(changes)
+
+    monkeypatch.setattr(store.metadata, "apply_changes", flaky)
+
+
+def _texts(store, user_id: str) -> list:
+    return sorted(memory["chunk_text"] for memory in store.get_user_memories(user_id))
+
+
+def test_failed_snapshot_is_retried_by_the_next_one(store_dir, monkeypatch):
+    store = _open_store()
+    _add(store, "alice", ["a1", "a2", "a3"])
+    _fail_once(monkeypatch, store)
+    with pytest.raises(OSError):
+        store.snapshot()
+
+    _add(store, "alice", ["a4", "a5"])
+    store.snapshot()
+    store.close()
+
+    store = _open_store()
+    try:
+        assert _texts(store, "alice") == ["a1", "a2", "a3", "a4", "a5"]
+        assert store.count_user_memories("alice") == 5
+    finally:
+        store.close()
+
+
+def test_failed_snapshot_keeps_its_log_for_replay(store_dir, monkeypatch):
+    store = _open_store()
+    _add(store, "alice", ["a1", "a2", "a3"])
+    _fail_once(monkeypatch, store)
+    with pytest.raises(OSError):
+        store.snapshot()
+    _add(store, "alice", ["a4", "a5"])
+
+    # Crash: nothing else reaches the database, only the logs survive
+    store._closed.set()
+    store._writer.close()
+    store._wal.close()
+    store.metadata.close()
+
+    store = _open_store()
+    try:
+        assert _texts(store, "alice") == ["a1", "a2", "a3", "a4", "a5"]
+    finally:
+        store.close()
+
+
+def test_restored_changes_respect_a_later_clear(store_dir, monkeypatch):
+    store = _open_store()
+    _add(store, "alice", ["a1", "a2"])
+    _add(store, "bob", ["b1"])
+    _fail_once(monkeypatch, store)
+    with pytest.raises(OSError):
+        store.snapshot()
+
+    store.clear_user_memory("alice")
+    store.snapshot()
+    store.close()
+
+    store = _open_store()
+    try:
+        assert _texts(store, "alice") == []
+        assert _texts(store, "bob") == ["b1"]
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("crash", [False, True])
+def test_ids_of_cleared_memories_are_not_reused(store_dir, crash):
+    store = _open_store()
+    _add(store, "alice", ["a1"])
+    top = _add(store, "bob", ["b1", "b2"])
+    store.snapshot()
+    store.clear_user_memory("bob")
+    if crash:
+        # Only the log records the clear
+        store._closed.set()
+        store._writer.close()
+        store._wal.close()
+        store.metadata.close()
+    else:
+        store.close()
+
+    store = _open_store()
+    try:
+        assert min(_add(store, "carol", ["c1"])) > max(top)
+    finally:
+        store.close()
+
+
+def test_reader_skips_writes_published_ahead_of_their_metadata(store_dir):
+    from storage.memory_store import MemoryStore
+    from storage.replica_store import ReplicaMemoryStore
+
+    writer = MemoryStore(serving_role="writer")
+    query = np.ones(EMBEDDING_DIM, dtype='float32')
+
+    def add(count):
+        entries = [writer._build_entry("alice", "m", "r", f"a{i}", "conversation", "high", "test")
+                   for i in range(count)]
+        writer.add_memories(entries, np.tile(query, (count, 1)))
+
+    add(2)
+    writer.snapshot()
+    reader = ReplicaMemoryStore()
+    try:
+        # Lands after the metadata cut, before the partition is serialized
+        write = writer._publisher.write
+
+        def racing_write(manifest, partition_locks):
+            add(3)
+            write(manifest, partition_locks)
+
+        writer._publisher.write = racing_write
+        add(1)
+        writer.snapshot()
+        writer._publisher.write = write
+
+        reader.refresh()
+        assert len(reader._search("alice", query, 10)) == 3
+
+        writer.snapshot()
+        reader.refresh()
+        assert len(reader._search("alice", query, 10)) == 6
+    finally:
+        reader.close()
+        writer.close()
@@ -0,0 +1,47 @@
+"""
+Write Batcher Tests - one bad submission must not fail its batch
+Built with Kiro - group commit isolation
+"""
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from core.config import EMBEDDING_DIM
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import storage.memory_store as memory_store
+
+    def get_embeddings(texts, user_id=None):
+        if "bad" in texts:
+            raise ValueError("input rejected")
+        return np.random.default_rng(len(texts)).random((len(texts), EMBEDDING_DIM)).tolist()
+
+    monkeypatch.setattr(memory_store, "get_embeddings", get_embeddings)
+    store = memory_store.MemoryStore(serving_role="standalone")
+    yield store
+    store.close()
+
+
+def _submission(store, user_id: str, texts: list):
+    entries = [store._build_entry(user_id, t, "ok", t, "conversation", "high", "test") for t in texts]
+    return entries, Future()
+
+
+def test_bad_submission_fails_alone(store):
+    batch = [
+        _submission(store, "alice", ["a1", "a2"]),
+        _submission(store, "bob", ["bad"]),
+        _submission(store, "carol", ["c1"])
+    ]
+    store._writer._commit(batch)
+
+    alice, bob, carol = (future for _, future in batch)
+    assert isinstance(bob.exception(timeout=1), ValueError)
+    assert carol.result(timeout=1) == [alice.result(timeout=1)[-1] + 1]
+    assert [m["chunk_text"] for m in store.get_user_memories("alice")] == ["a1", "a2"]
+    assert store.count_user_memories("bob") == 0
+    assert store.count_user_memories("carol") == 1